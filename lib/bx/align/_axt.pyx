@@ -0,0 +1,82 @@
+"""
+Pyrex extension to speed up scanning `AXT` files in `axt.py`.
+"""
+
+import numpy
+
+cimport numpy
+
+
+cdef inline bint is_space(unsigned char c):
+    return c == 32 or c == 9 or c == 13
+
+
+cdef inline long long parse_int(const unsigned char[:] buf, Py_ssize_t i, Py_ssize_t j) except? -1:
+    cdef long long v = 0
+    if i == j:
+        raise ValueError("bad axt-block header: empty field")
+    while i < j:
+        if buf[i] < 48 or buf[i] > 57:
+            raise ValueError("bad axt-block header: %s is not an integer" % bytes(buf[i:j]).decode())
+        v = v * 10 + (buf[i] - 48)
+        i += 1
+    return v
+
+
+def scan_headers(const unsigned char[:] buf, Py_ssize_t start=0, Py_ssize_t end=-1):
+    """
+    Find the header lines of the AXT blocks that start in `buf[start:end]`
+    (a header is a line starting with a digit, sequence lines never do).
+    If `start` is not at the beginning of a line scanning begins at the
+    next line.
+
+    Returns `(offsets, chroms1, starts1, ends1, chroms2, starts2, ends2,
+    strands)`, with the offset of each header in `buf` and its coordinates
+    as written in the file (origin-1, inclusive, and for a second species
+    on the minus strand counted from the sequence end).
+    """
+    cdef Py_ssize_t n = buf.shape[0], i, eol, k
+    cdef Py_ssize_t field_start[8]
+    cdef Py_ssize_t field_end[8]
+    cdef int nfields
+    if end < 0 or end > n:
+        end = n
+    if start > 0 and buf[start - 1] != 10:
+        while start < n and buf[start] != 10:
+            start += 1
+        start += 1
+    offsets = []
+    chroms1 = []
+    chroms2 = []
+    strands = []
+    coords = []
+    i = start
+    while i < end:
+        eol = i
+        while eol < n and buf[eol] != 10:
+            eol += 1
+        if 48 <= buf[i] <= 57:
+            # split the first 8 fields
+            nfields = 0
+            k = i
+            while nfields < 8:
+                while k < eol and is_space(buf[k]):
+                    k += 1
+                if k == eol:
+                    break
+                field_start[nfields] = k
+                while k < eol and not is_space(buf[k]):
+                    k += 1
+                field_end[nfields] = k
+                nfields += 1
+            if nfields < 8:
+                raise ValueError("bad axt-block header: %s" % bytes(buf[i:eol]).decode())
+            offsets.append(i)
+            chroms1.append(bytes(buf[field_start[1]:field_end[1]]).decode())
+            chroms2.append(bytes(buf[field_start[4]:field_end[4]]).decode())
+            strands.append(chr(buf[field_start[7]]))
+            coords.append((parse_int(buf, field_start[2], field_end[2]), parse_int(buf, field_start[3], field_end[3]),
+                           parse_int(buf, field_start[5], field_end[5]), parse_int(buf, field_start[6], field_end[6])))
+        i = eol + 1
+    c = numpy.array(coords, dtype=numpy.int64).reshape(-1, 4)
+    return numpy.array(offsets, dtype=numpy.int64), chroms1, c[:, 0], c[:, 1], chroms2, c[:, 2], c[:, 3], strands
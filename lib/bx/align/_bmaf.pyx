@@ -0,0 +1,122 @@
+"""
+Pyrex extension to speed up reading blocks of binary MAF files in `bmaf.py`.
+"""
+
+import weakref
+
+from cpython.bytes cimport (
+    PyBytes_AS_STRING,
+    PyBytes_FromStringAndSize,
+)
+
+from bx.align.core import Component
+
+
+# Must match the format described in `bx.align.bmaf`
+cdef enum:
+    FLAG_TEXT = 0x01
+    FLAG_PACKED = 0x02
+    FLAG_QUALITY = 0x04
+    FLAG_SYNTENY = 0x08
+    RECORD_SIZE = 16
+    SYNTENY_SIZE = 10
+
+cdef const char *FOUR_BIT_ALPHABET = b"-ACGTNacgtn"
+
+
+cdef inline unsigned int read_uint32(const unsigned char *p) noexcept:
+    return p[0] | (p[1] << 8) | (p[2] << 16) | (<unsigned int> p[3] << 24)
+
+
+def decode_components(const unsigned char[:] buf, Py_ssize_t pos, Py_ssize_t text_size, list srcs, alignment,
+                      bint parse_e_rows=False):
+    """
+    Add to `alignment` the components of a binary MAF block, whose
+    coordinate table starts at `pos` in `buf` and has one record for each
+    of `srcs`. Returns the number of components that have text.
+    """
+    cdef Py_ssize_t ncomponents = len(srcs), n = buf.shape[0], packed_size = (text_size + 1) // 2
+    cdef Py_ssize_t npacked = 0, nraw = 0, i, j, end, quality_size
+    cdef const unsigned char *data
+    cdef const unsigned char *record
+    cdef const unsigned char *row
+    cdef char *out
+    cdef unsigned char flags
+    cdef unsigned char table[16]
+    if ncomponents == 0:
+        return 0
+    if pos < 0 or pos + ncomponents * RECORD_SIZE > n:
+        raise Exception("Truncated binary MAF block")
+    data = &buf[0]
+    for i in range(16):
+        table[i] = FOUR_BIT_ALPHABET[i] if i < 11 else 0
+    for i in range(ncomponents):
+        flags = data[pos + i * RECORD_SIZE + 2]
+        if flags & FLAG_PACKED:
+            npacked += 1
+        elif flags & FLAG_TEXT:
+            nraw += 1
+    record = data + pos
+    pos += ncomponents * RECORD_SIZE
+    end = pos + npacked * packed_size + nraw * text_size
+    if end > n:
+        raise Exception("Truncated binary MAF block")
+    # Unpack all packed rows into one string, and take the raw rows as one
+    # string, components get slices of these
+    packed_bytes = PyBytes_FromStringAndSize(NULL, npacked * text_size)
+    out = PyBytes_AS_STRING(packed_bytes)
+    row = data + pos
+    for i in range(npacked):
+        for j in range(text_size):
+            if j & 1:
+                out[j] = table[row[j >> 1] & 0x0F]
+            else:
+                out[j] = table[row[j >> 1] >> 4]
+        row += packed_size
+        out += text_size
+    packed = packed_bytes.decode("ascii")
+    raw = bytes(buf[pos + npacked * packed_size : end]).decode("ascii")
+    pos = end
+    cdef Py_ssize_t packed_pos = 0, raw_pos = 0
+    alignment_ref = weakref.ref(alignment)
+    components = alignment.components
+    for i in range(ncomponents):
+        flags = record[2]
+        if record[0] == b"e":
+            if parse_e_rows:
+                component = Component(srcs[i], read_uint32(record + 4), read_uint32(record + 8), chr(record[1]),
+                                      read_uint32(record + 12), None)
+                component.empty = True
+                component.synteny_empty = chr(record[3])
+                component._alignment = alignment_ref
+                components.append(component)
+            record += RECORD_SIZE
+            continue
+        text = None
+        if flags & FLAG_PACKED:
+            text = packed[packed_pos:packed_pos + text_size]
+            packed_pos += text_size
+        elif flags & FLAG_TEXT:
+            text = raw[raw_pos:raw_pos + text_size]
+            raw_pos += text_size
+        component = Component(srcs[i], read_uint32(record + 4), read_uint32(record + 8), chr(record[1]),
+                              read_uint32(record + 12), text)
+        if flags & FLAG_QUALITY:
+            if pos + 4 > n:
+                raise Exception("Truncated binary MAF block")
+            quality_size = read_uint32(data + pos)
+            pos += 4
+            if pos + quality_size > n:
+                raise Exception("Truncated binary MAF block")
+            component.quality = bytes(buf[pos:pos + quality_size]).decode("ascii")
+            pos += quality_size
+        if flags & FLAG_SYNTENY:
+            if pos + SYNTENY_SIZE > n:
+                raise Exception("Truncated binary MAF block")
+            component.synteny_left = (chr(data[pos]), read_uint32(data + pos + 1))
+            component.synteny_right = (chr(data[pos + 5]), read_uint32(data + pos + 6))
+            pos += SYNTENY_SIZE
+        component._alignment = alignment_ref
+        components.append(component)
+        record += RECORD_SIZE
+    return npacked + nraw
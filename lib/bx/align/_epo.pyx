@@ -2,6 +2,8 @@
 
 import gzip
 import logging
+import mmap
+import os
 from collections import namedtuple
 
 import numpy
@@ -26,99 +28,257 @@ cdef inline int min2( int a, int b ):
     return a
 
 
-def rem_dash(p, q):
-    """remove dash columns and shift match intervals to the left. both iterables
-    are read on the same direction left-to-right.
-    """
+def parse_cigar(cigar):
+    """decode an EPO cigar string into run-length arrays.
+
+    runs are written as an optional length followed by M (match) or D
+    (deletion), a missing (or zero) length meaning 1. For example 4MD4M2DM
+    gives lengths [4, 1, 4, 2, 1] and ops [M, D, M, D, M].
+
+    @param cigar: the cigar string
+    @return: (lengths, ops) arrays of int64 and of the uint8 codes of 'M' or 'D'"""
+
+    cdef bytes data = cigar.encode("ascii")
+    cdef const unsigned char[:] buf = data
+    cdef Py_ssize_t i, k = 0, n = buf.shape[0]
+    cdef long long l = 0
+    cdef unsigned char c
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] lengths = numpy.empty(n, dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.uint8_t, ndim=1] ops = numpy.empty(n, dtype=numpy.uint8)
+
+    for i in range(n):
+        c = buf[i]
+        if 48 <= c <= 57:
+            l = l * 10 + (c - 48)
+        elif c == 77 or c == 68:
+            lengths[k] = l if l > 0 else 1
+            ops[k] = c
+            k += 1
+            l = 0
+        else:
+            l = 0
+    return lengths[:k].copy(), ops[:k].copy()
 
-    def myp(l):
-        if l: return l.pop(0)
 
-    def adv(queue, i, d):
-        # shifted interval
-        shi = i[0]-d, i[1]-d
-        assert shi[0] >= 0
-        if queue and queue[-1][1] == shi[0]:
-            # join to the preceeding one
-            queue[-1] = (queue[-1][0], shi[1])
-        else:
-            queue.append( shi )
-        return queue
-
-    p_card = sum( map(lambda i: p[i][1] - p[i][0], range(len(p))) )
-    q_card = sum( map(lambda i: q[i][1] - q[i][0], range(len(q))) )
-
-    P, Q = [], []
-    dash = 0 # dash (on both cigars) count so far
-    a, b = p.pop(0), q.pop(0)
-    #while p or q:
-    while a and b:
-        assert dash <= min(a[0], b[0])
-        i = max(a[0], b[0]) - min(a[1], b[1])
+cdef inline Py_ssize_t adv(numpy.int64_t[:, :] queue, Py_ssize_t n, numpy.int64_t s, numpy.int64_t e, numpy.int64_t d):
+    # append the interval (s, e) shifted by d to the first n entries of queue,
+    # joining it to the preceeding one if they touch. return the new length
+    assert s - d >= 0
+    if n > 0 and queue[n - 1, 1] == s - d:
+        queue[n - 1, 1] = e - d
+        return n
+    queue[n, 0] = s - d
+    queue[n, 1] = e - d
+    return n + 1
+
+
+def rem_dash_array(numpy.int64_t[:, :] p, numpy.int64_t[:, :] q):
+    """L{rem_dash} on (N, 2) int64 arrays of match intervals.
+
+    @return: (P, Q) arrays of the shifted intervals"""
+
+    cdef Py_ssize_t np_ = p.shape[0], nq = q.shape[0], ip = 0, iq = 0, nP = 0, nQ = 0, j
+    cdef numpy.int64_t dash = 0, i, rest = 0
+    assert np_ > 0 and nq > 0
+    cdef numpy.ndarray[numpy.int64_t, ndim=2] P = numpy.empty((np_, 2), dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.int64_t, ndim=2] Q = numpy.empty((nq, 2), dtype=numpy.int64)
+    cdef numpy.int64_t[:, :] Pv = P, Qv = Q
+
+    while ip < np_ and iq < nq:
+        assert dash <= min(p[ip, 0], q[iq, 0])
+        i = max(p[ip, 0], q[iq, 0]) - min(p[ip, 1], q[iq, 1])
         if i >= 0: # no intersection
-            if a[1] <= b[0]:
-                if p:
-                    i = min(i, p[0][0] - a[1])
-                P = adv(P, a, dash)
-                a = myp(p)
+            if p[ip, 1] <= q[iq, 0]:
+                if ip + 1 < np_:
+                    i = min(i, p[ip + 1, 0] - p[ip, 1])
+                nP = adv(Pv, nP, p[ip, 0], p[ip, 1], dash)
+                ip += 1
             else:
-                if q:
-                    i = min(i, q[0][0] - b[1])
-                Q = adv(Q, b, dash)
-                b = myp(q)
+                if iq + 1 < nq:
+                    i = min(i, q[iq + 1, 0] - q[iq, 1])
+                nQ = adv(Qv, nQ, q[iq, 0], q[iq, 1], dash)
+                iq += 1
             dash += i
         else: # intersection
-            if a[1] >= b[1]:
-                Q = adv(Q, b, dash); b = myp(q)
-            elif a[1] < b[1]:
-                P = adv(P, a, dash); a = myp(p)
-        #if not a or not b: # no more matchings
-        #    break
-    assert (not p) or (not q), "one or both should be empty: p=%s, q=%s" % (str(p), str(q))
-
-    if a: P = adv(P, a, dash)
-    if b: Q = adv(Q, b, dash)
+            if p[ip, 1] >= q[iq, 1]:
+                nQ = adv(Qv, nQ, q[iq, 0], q[iq, 1], dash)
+                iq += 1
+            else:
+                nP = adv(Pv, nP, p[ip, 0], p[ip, 1], dash)
+                ip += 1
+
+    if ip < np_:
+        nP = adv(Pv, nP, p[ip, 0], p[ip, 1], dash)
+        ip += 1
+    if iq < nq:
+        nQ = adv(Qv, nQ, q[iq, 0], q[iq, 1], dash)
+        iq += 1
+
+    # just extend the last inteval by the remaining bases (in q or p)
+    if iq < nq:
+        for j in range(iq, nq):
+            rest += q[j, 1] - q[j, 0]
+        Qv[nQ - 1, 1] += rest
+    else:
+        for j in range(ip, np_):
+            rest += p[j, 1] - p[j, 0]
+        Pv[nP - 1, 1] += rest
+    return P[:nP], Q[:nQ]
 
-    # remaining intervals (in q or p)
-    r, R = p, P
-    if q: r, R = q, Q
-    # just extend the last inteval by the remaining bases
-    R[-1] = (R[-1][0], R[-1][1] + sum( map(lambda i: i[1]-i[0], r) ))
 
-    P_card = sum( map(lambda i: P[i][1] - P[i][0], range(len(P))) )
-    Q_card = sum( map(lambda i: Q[i][1] - Q[i][0], range(len(Q))) )
+def rem_dash(p, q):
+    """remove dash columns and shift match intervals to the left. both iterables
+    are read on the same direction left-to-right.
+    """
 
-    assert p_card == P_card, "%d != %d" % (p_card, P_card)
-    assert q_card == Q_card, "%d != %d" % (q_card, Q_card)
+    P, Q = rem_dash_array(numpy.array(p, dtype=numpy.int64).reshape(-1, 2),
+                          numpy.array(q, dtype=numpy.int64).reshape(-1, 2))
+
+    assert numpy.sum(P[:, 1] - P[:, 0]) == sum(i[1] - i[0] for i in p)
+    assert numpy.sum(Q[:, 1] - Q[:, 0]) == sum(i[1] - i[0] for i in q)
+
+    return [tuple(i) for i in P.tolist()], [tuple(i) for i in Q.tolist()]
+
+
+def chain_blocks(numpy.int64_t[:, :] A, numpy.int64_t[:, :] B):
+    """the (S, T, Q) arrays of a chain between two sequences whose match
+    intervals (on the alignment columns, without dash columns, see
+    L{rem_dash_array}) are A and B"""
+
+    cdef Py_ssize_t nA = A.shape[0], nB = B.shape[0], ia = 0, ib = 0, k = 0
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] S = numpy.empty(nA + nB, dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] T = numpy.empty(nA + nB - 1, dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] Q = numpy.empty(nA + nB - 1, dtype=numpy.int64)
+
+    # intervals are 0-base, halfo-open => lengths = coordinate difference
+    while ia + 1 < nA or ib + 1 < nB:
+        if A[ia, 1] < B[ib, 1]:
+            if ia + 1 >= nA:
+                raise IndexError("no more match intervals on the first sequence")
+            T[k] = 0
+            Q[k] = A[ia + 1, 0] - A[ia, 1]
+            S[k] = min(A[ia, 1], B[ib, 1]) - max(A[ia, 0], B[ib, 0])
+            ia += 1
+        elif B[ib, 1] < A[ia, 1]:
+            if ib + 1 >= nB:
+                raise IndexError("no more match intervals on the second sequence")
+            Q[k] = 0
+            T[k] = B[ib + 1, 0] - B[ib, 1]
+            S[k] = min(A[ia, 1], B[ib, 1]) - max(A[ia, 0], B[ib, 0])
+            ib += 1
+        elif ia + 1 < nA and ib + 1 < nB:
+            assert 1 > 2, "there are dash columns"
+        else:
+            break
+        k += 1
+    S[k] = min(A[ia, 1], B[ib, 1]) - max(A[ia, 0], B[ib, 0])
+    return S[:k + 1].copy(), T[:k].copy(), Q[:k].copy()
+
+
+cdef inline Py_ssize_t skip_spaces(const unsigned char[:] buf, Py_ssize_t i, Py_ssize_t n):
+    while i < n and (buf[i] == 32 or buf[i] == 9 or buf[i] == 13):
+        i += 1
+    return i
+
+
+def parse_chain_buffer(const unsigned char[:] buf):
+    """parse the text of a whole .chain file into flat arrays.
+
+    @param buf: contents of the chain file (bytes, mmap, ...)
+    @return: (headers, offsets, S, T, Q) where headers is the list of chain
+        header lines, and the ungapped blocks of chain i are
+        S[offsets[i]:offsets[i+1]] (and the same for T and Q)"""
+
+    cdef Py_ssize_t n = buf.shape[0], i = 0, eol, nblocks = 0, capacity = 1024, k
+    cdef int nvals
+    cdef long long vals[3]
+    cdef bint in_chain = False
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] S = numpy.empty(capacity, dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] T = numpy.empty(capacity, dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.int64_t, ndim=1] Q = numpy.empty(capacity, dtype=numpy.int64)
+    headers = []
+    offsets = []
+
+    while i < n:
+        eol = i
+        while eol < n and buf[eol] != 10:
+            eol += 1
+        i = skip_spaces(buf, i, eol)
+        if i == eol or buf[i] == 35:
+            # blank or comment line
+            i = eol + 1
+            continue
+        if buf[i] == 99:
+            # a 'chain' header line
+            if in_chain:
+                raise ValueError("last matching block expected (found %s)" % bytes(buf[i:eol]).decode())
+            headers.append(bytes(buf[i:eol]).decode())
+            offsets.append(nblocks)
+            in_chain = True
+            i = eol + 1
+            continue
+        if not in_chain:
+            raise ValueError("chain header expected (found %s)" % bytes(buf[i:eol]).decode())
+        nvals = 0
+        while i < eol:
+            if nvals == 3 or buf[i] < 48 or buf[i] > 57:
+                raise ValueError("malformed alignment data line (found %s)" % bytes(buf[i:eol]).decode())
+            vals[nvals] = 0
+            while i < eol and 48 <= buf[i] <= 57:
+                vals[nvals] = vals[nvals] * 10 + (buf[i] - 48)
+                i += 1
+            nvals += 1
+            i = skip_spaces(buf, i, eol)
+        if nvals == 1:
+            vals[1] = 0
+            vals[2] = 0
+            in_chain = False
+        elif nvals != 3:
+            raise ValueError("malformed alignment data line (found %s)" % bytes(buf[i:eol]).decode())
+        if nblocks == capacity:
+            capacity *= 2
+            S = numpy.resize(S, capacity)
+            T = numpy.resize(T, capacity)
+            Q = numpy.resize(Q, capacity)
+        S[nblocks] = vals[0]
+        T[nblocks] = vals[1]
+        Q[nblocks] = vals[2]
+        nblocks += 1
+        i = eol + 1
+    if in_chain:
+        raise ValueError("last matching block expected (found end of file)")
+    offsets.append(nblocks)
+    return headers, numpy.array(offsets, dtype=numpy.int64), S[:nblocks].copy(), T[:nblocks].copy(), Q[:nblocks].copy()
+
+
+def read_chain_file(fname):
+    """parse a (possibly gzipped) .chain file with L{parse_chain_buffer}"""
+
+    if fname.endswith(".gz"):
+        with gzip.open(fname, "rb") as fd:
+            return parse_chain_buffer(fd.read())
+    with open(fname, "rb") as fd:
+        if os.fstat(fd.fileno()).st_size == 0:
+            return parse_chain_buffer(b"")
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse_chain_buffer(mm)
+        finally:
+            mm.close()
 
-    return P, Q
 
 def fastLoadChain(fname, hf):
+    headers, offsets, S, T, Q = read_chain_file(fname)
     data = []
-    open_f = (fname.endswith(".gz") and gzip.open or open)
-    with open_f(fname, "rt") as fd:
-        while True:
-            line = fd.readline()
-            if line == "":
-                break
-            hd = hf(line)
-            N = []
-            line = fd.readline().split()
-            while len(line) == 3:
-                N.append( (int(line[0]), int(line[1]), int(line[2])) )
-                line = fd.readline().split()
-            if len(line) != 1:
-                raise ValueError("last matching block expected (found %s)" % str(line))
-            N.append( (int(line[0]), 0, 0) )
-            s, t, q = zip( *N )
-            data.append( (hd,
-                numpy.array(s, dtype=int),
-                numpy.array(t, dtype=int),
-                numpy.array(q, dtype=int)) )
-            assert hd.tEnd - hd.tStart == sum(s) + sum(t)
-            assert hd.qEnd - hd.qStart == sum(s) + sum(q)
-            fd.readline() # a blank line
-        log.info("parsed %d elements from %s" % (len(data), fname))
+    for i in range(len(headers)):
+        hd = hf(headers[i])
+        s = S[offsets[i]:offsets[i + 1]]
+        t = T[offsets[i]:offsets[i + 1]]
+        q = Q[offsets[i]:offsets[i + 1]]
+        data.append( (hd, s, t, q) )
+        assert hd.tEnd - hd.tStart == s.sum() + t.sum()
+        assert hd.qEnd - hd.qStart == s.sum() + q.sum()
+    log.info("parsed %d elements from %s" % (len(data), fname))
     return data
 
 
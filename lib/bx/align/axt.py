@@ -5,30 +5,90 @@ alignments.
 .. _AXT: http://genome.ucsc.edu/goldenPath/help/axt.html
 """
 
+import mmap
+import multiprocessing
+import os
+from io import TextIOWrapper
+
 from bx import interval_index_file
 from bx.align import (
     Alignment,
     Component,
     src_split,
 )
+from bx.align._axt import scan_headers
 
 # Tools for dealing with pairwise alignments in AXT format
 
 
-class MultiIndexed:
+class AXTIndexedAccess(interval_index_file.AbstractIndexedAccess):
+    """
+    Indexed access to an AXT file, using an index written by `build_index`.
+
+    AXT files compressed with BGZF (ending in ".gz") are also supported, their
+    index holds BGZF virtual offsets.
+    """
+
+    def __init__(
+        self,
+        data_filename,
+        index_filename=None,
+        keep_open=False,
+        use_cache=False,
+        species1=None,
+        species2=None,
+        species_to_lengths=None,
+        support_ids=False,
+    ):
+        # nota bene: (self.species1 = species1 or "species1") is incorrect if species1=""
+        if species1 is None:
+            species1 = "species1"
+        if species2 is None:
+            species2 = "species2"
+        self.species1 = species1
+        self.species2 = species2
+        self.species_to_lengths = species_to_lengths
+        self.support_ids = support_ids  # for extra text at end of axt header lines
+        super().__init__(
+            data_filename,
+            index_filename,
+            keep_open,
+            use_cache,
+            species1=species1,
+            species2=species2,
+            species_to_lengths=species_to_lengths,
+            support_ids=support_ids,
+        )
+
+    def read_at_current_offset(self, file, **kwargs):
+        """
+        Read the AXT block at the current position in `file` and return an
+        instance of `Alignment`.
+        """
+        return read_next_axt(file, **kwargs)
+
+    def open_data(self):
+        if self.data_filename.endswith(".gz"):
+            return BGZFTextFile(self.data_filename)
+        return TextIOWrapper(super().open_data(), encoding="ascii")
+
+
+class AXTMultiIndexedAccess(interval_index_file.AbstractMultiIndexedAccess):
+    """
+    Indexed access to multiple AXT files.
+    """
+
+    indexed_access_class = AXTIndexedAccess
+
+
+class MultiIndexed(AXTMultiIndexedAccess):
     """Similar to 'indexed' but wraps more than one axt_file"""
 
     def __init__(self, axt_filenames, keep_open=False):
-        self.indexes = [Indexed(axt_file, axt_file + ".index") for axt_file in axt_filenames]
-
-    def get(self, src, start, end):
-        blocks = []
-        for index in self.indexes:
-            blocks += index.get(src, start, end)
-        return blocks
+        super().__init__(axt_filenames, keep_open=keep_open)
 
 
-class Indexed:
+class Indexed(AXTIndexedAccess):
     """Indexed access to a axt using overlap queries, requires an index file"""
 
     def __init__(
@@ -41,39 +101,43 @@ class Indexed:
         species_to_lengths=None,
         support_ids=False,
     ):
-        if index_filename is None:
-            index_filename = axt_filename + ".index"
-        self.indexes = interval_index_file.Indexes(filename=index_filename)
         self.axt_filename = axt_filename
-        # nota bene: (self.species1 = species1 or "species1") is incorrect if species1=""
-        self.species1 = species1
-        if self.species1 is None:
-            self.species1 = "species1"
-        self.species2 = species2
-        if self.species2 is None:
-            self.species2 = "species2"
-        self.species_to_lengths = species_to_lengths
-        self.support_ids = support_ids  # for extra text at end of axt header lines
-        if keep_open:
-            self.f = open(axt_filename)
-        else:
-            self.f = None
-
-    def get(self, src, start, end):
-        intersections = self.indexes.find(src, start, end)
-        return (self.get_axt_at_offset(val) for start, end, val in intersections)
+        super().__init__(
+            axt_filename,
+            index_filename,
+            keep_open,
+            species1=species1,
+            species2=species2,
+            species_to_lengths=species_to_lengths,
+            support_ids=support_ids,
+        )
 
     def get_axt_at_offset(self, offset):
-        if self.f:
-            self.f.seek(offset)
-            return read_next_axt(self.f, self.species1, self.species2, self.species_to_lengths, self.support_ids)
-        else:
-            f = open(self.axt_filename)
-            try:
-                f.seek(offset)
-                return read_next_axt(f, self.species1, self.species2, self.species_to_lengths, self.support_ids)
-            finally:
-                f.close()
+        return self.get_at_offset(offset)
+
+
+class BGZFTextFile:
+    """
+    Line oriented text access to a BGZF compressed file. Positions from `tell`
+    (and in indexes) are BGZF virtual offsets.
+    """
+
+    def __init__(self, filename):
+        from bx.misc.bgzf import BGZFFile
+
+        self.file = BGZFFile(filename, "r")
+
+    def readline(self):
+        return self.file.readline().decode("ascii")
+
+    def seek(self, offset, whence=0):
+        self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
 
 
 class Reader:
@@ -165,6 +229,99 @@ class Writer:
 # when second species is on minus strand, start and stop are counted from sequence end
 
 
+def build_index(filename, species1=None, species2=None, species_to_lengths=None, processes=1):
+    """
+    Index the blocks of the AXT file `filename` by the position of both
+    components, as named by `read_next_axt` for `species1` and `species2`.
+    Returns an `interval_index_file.Indexes` that `AXTIndexedAccess` can use
+    once written to a file.
+
+    Blocks where the second species is on the minus strand can only be
+    indexed for it when its sequence lengths are given in
+    `species_to_lengths` (as for `Alignment`), they are indexed for the first
+    species only otherwise.
+
+    Plain files are memory mapped and, if `processes` is more than 1, scanned
+    in that many pieces in parallel. Files ending in ".gz" are read as BGZF
+    and indexed by virtual offset.
+    """
+    if filename.endswith(".gz"):
+        headers = scan_bgzf_headers(filename)
+    else:
+        size = os.path.getsize(filename)
+        if processes > 1 and size > 0:
+            step = size // processes + 1
+            with multiprocessing.Pool(processes) as pool:
+                pieces = pool.map(scan_file_headers, [(filename, i, i + step) for i in range(0, size, step)])
+            headers = [[v for piece in pieces for v in piece[k]] for k in range(8)]
+        else:
+            headers = scan_file_headers((filename, 0, -1))
+    if species1 is None:
+        species1 = "species1"
+    if species2 is None:
+        species2 = "species2"
+    indexes = interval_index_file.Indexes()
+    lengths = Alignment(species_to_lengths=species_to_lengths)
+    sizes = {}
+    for offset, chrom1, start1, end1, chrom2, start2, end2, strand in zip(*headers):
+        src1 = chrom1 if species1 == "" else species1 + "." + chrom1
+        src2 = chrom2 if species2 == "" else species2 + "." + chrom2
+        # axt intervals are origin-1 and inclusive on both ends
+        size = src_size(lengths, src1, sizes)
+        indexes.add(src1, int(start1) - 1, int(end1), int(offset), max=size or interval_index_file.DEFAULT_MAX)
+        size = src_size(lengths, src2, sizes)
+        if strand == "-":
+            if size is None:
+                continue
+            start2, end2 = size - int(end2) + 1, size - int(start2) + 1
+        indexes.add(src2, int(start2) - 1, int(end2), int(offset), max=size or interval_index_file.DEFAULT_MAX)
+    return indexes
+
+
+def scan_file_headers(task):
+    """`scan_headers` over a piece of a plain file, `task` is (filename, start, end)"""
+    filename, start, end = task
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return scan_headers(b"")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return scan_headers(mm, start, end)
+        finally:
+            mm.close()
+
+
+def scan_bgzf_headers(filename):
+    """`scan_headers` for a BGZF compressed file, giving virtual offsets"""
+    f = BGZFTextFile(filename)
+    try:
+        offsets = []
+        fields = [[] for _ in range(7)]
+        while True:
+            offset = f.tell()
+            line = f.file.readline()
+            if not line:
+                break
+            if line[:1].isdigit():
+                found = scan_headers(line)
+                offsets.append(offset)
+                for k in range(7):
+                    fields[k].append(found[k + 1][0])
+        return [offsets] + fields
+    finally:
+        f.close()
+
+
+def src_size(alignment, src, sizes):
+    """length of `src` from the lengths known to `alignment`, None if unknown"""
+    if src not in sizes:
+        try:
+            sizes[src] = alignment.src_size(src)
+        except ValueError:
+            sizes[src] = None
+    return sizes[src]
+
+
 def read_next_axt(file, species1, species2, species_to_lengths=None, support_ids=False):
     line = readline(file, skip_blank=True)
     if not line:
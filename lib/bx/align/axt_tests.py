@@ -0,0 +1,90 @@
+"""
+Tests for `bx.align.axt`.
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+
+import bx.align.maf
+from bx.align import axt
+
+MAF_FILE = "test_data/maf_tests/mm8_chr7_tiny.maf"
+
+
+def write_axt(fname):
+    """write the mm8/oryCun1 pairs of `MAF_FILE` as AXT, return the source lengths"""
+    lengths = {"mm8": {}, "oryCun1": {}}
+    with open(MAF_FILE) as f, open(fname, "w") as out:
+        writer = axt.Writer(out)
+        for block in bx.align.maf.Reader(f):
+            pair = block.limit_to_species(["mm8", "oryCun1"])
+            if len(pair.components) != 2:
+                continue
+            for c in pair.components:
+                species, chrom = c.src.split(".")
+                lengths[species][chrom] = c.src_size
+            writer.write(pair)
+    return lengths
+
+
+def write_bgzf(fname, data, block_size=1000):
+    """minimal BGZF writer, small blocks so that lines cross blocks"""
+    with open(fname, "wb") as out:
+        for i in range(0, len(data) + 1, block_size):
+            chunk = data[i : i + block_size]
+            compress = zlib.compressobj(6, zlib.DEFLATED, -15)
+            deflated = compress.compress(chunk) + compress.flush()
+            out.write(struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(deflated) + 25))
+            out.write(deflated)
+            out.write(struct.pack("<II", zlib.crc32(chunk), len(chunk)))
+
+
+def overlapping(fname, species_to_lengths, src, start, end):
+    with open(fname) as f:
+        reader = axt.Reader(f, "mm8", "oryCun1", species_to_lengths)
+        return [
+            str(a)
+            for a in reader
+            for c in a.components
+            if c.src == src and c.forward_strand_start < end and c.forward_strand_end > start
+        ]
+
+
+def test_build_index():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, "pairs.axt")
+        species_to_lengths = write_axt(fname)
+        indexes = axt.build_index(fname, "mm8", "oryCun1", species_to_lengths)
+        with open(fname + ".index", "wb") as out:
+            indexes.write(out)
+        assert sorted(indexes.indexes) == ["mm8.chr7", "oryCun1.scaffold_199771"]
+
+        # in parallel, the same blocks are indexed
+        parallel = axt.build_index(fname, "mm8", "oryCun1", species_to_lengths, processes=3)
+        for src in indexes.indexes:
+            assert indexes.find(src, 0, 1 << 28) == parallel.find(src, 0, 1 << 28)
+
+        index = axt.Indexed(fname, species1="mm8", species2="oryCun1", species_to_lengths=species_to_lengths)
+        for src, start, end in [("mm8.chr7", 80082400, 80082700), ("oryCun1.scaffold_199771", 60800, 61000)]:
+            expected = overlapping(fname, species_to_lengths, src, start, end)
+            assert len(expected) > 0
+            assert sorted(str(a) for a in index.get(src, start, end)) == sorted(expected)
+
+        # BGZF compressed
+        with open(fname, "rb") as f:
+            write_bgzf(fname + ".gz", f.read())
+        indexes = axt.build_index(fname + ".gz", "mm8", "oryCun1", species_to_lengths)
+        with open(fname + ".gz.index", "wb") as out:
+            indexes.write(out)
+        index = axt.AXTIndexedAccess(
+            fname + ".gz", species1="mm8", species2="oryCun1", species_to_lengths=species_to_lengths, keep_open=True
+        )
+        expected = overlapping(fname, species_to_lengths, "mm8.chr7", 80082400, 80082700)
+        assert sorted(str(a) for a in index.get("mm8.chr7", 80082400, 80082700)) == sorted(expected)
+        index.close()
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,329 @@
+"""
+Support for a compact binary container for `MAF` alignments, intended as a
+cache that sits next to a MAF file that is scanned many times.
+
+Blocks read from a binary MAF file are the same `Alignment` objects that
+`bx.align.maf` produces for the original text. Sequence rows are packed
+4 bits per column when all their characters are in `FOUR_BIT_ALPHABET`
+(which covers gaps, soft-masking and N) and stored raw otherwise.
+
+File format
+-----------
+
+All integers are little-endian. The file begins with a header:
+
+============ ===========   =================================================
+offset 0x00: uint32        magic number (`MAGIC`)
+offset 0x04: uint32        version
+offset 0x08: uint32        (L) length of the attributes string
+offset 0x0C: L bytes       MAF header attributes, as "key=value key=value"
+============ ===========   =================================================
+
+and is followed by blocks, one per alignment. The offset of the first byte
+of a block is what is stored in an `interval_index_file` index built over
+a binary MAF, so `BinaryMAFIndexedAccess` can seek straight to a block.
+
+Each block is:
+
+================ =========================================================
+uint32           number of bytes in the rest of the block
+uint32           text size (number of alignment columns)
+uint16           (N) number of components
+str              score
+str              other block attributes, as "key=value key=value"
+long str         the src of each component, separated by single spaces
+N x record       coordinate table
+packed rows      the text of each component with `FLAG_PACKED`
+raw rows         the text of each component with `FLAG_TEXT` only
+extras           quality and synteny of each component that has them
+================ =========================================================
+
+where `str` is a uint16 length followed by that many ASCII bytes and `long
+str` the same with a uint32 length. Records in the coordinate table have a
+fixed width (`RECORD`), the table and the rows are decoded in C by
+`bx.align._bmaf`:
+
+================ =========================================================
+uint8            'e' for an empty component, 's' otherwise
+uint8            strand character
+uint8            flags (`FLAG_*`)
+uint8            synteny status character for 'e' rows, 0 otherwise
+uint32           start
+uint32           size
+uint32           src_size
+================ =========================================================
+
+Packed rows take `(text_size + 1) // 2` bytes each and raw rows `text_size`
+bytes, rows of each kind are stored one after the other in component order
+and decoded together. The extras follow in component order: the quality
+string (a uint32 length and the bytes) when `FLAG_QUALITY` is set and then
+the synteny annotation from the 'i' row (two status bytes and two uint32
+counts) when `FLAG_SYNTENY` is set.
+
+.. _MAF: http://genome.ucsc.edu/FAQ/FAQformat.html#format5
+"""
+
+import struct
+
+import numpy
+
+from bx import interval_index_file
+from bx.align import Alignment
+from bx.align._bmaf import decode_components
+from bx.align.maf import parse_attributes
+
+MAGIC = 0xB3AF0001
+VERSION = 2
+
+FOUR_BIT_ALPHABET = b"-ACGTNacgtn"
+
+FLAG_TEXT = 0x01
+FLAG_PACKED = 0x02
+FLAG_QUALITY = 0x04
+FLAG_SYNTENY = 0x08
+
+HEADER = struct.Struct("<III")
+BLOCK_HEADER = struct.Struct("<IIH")
+RECORD = numpy.dtype(
+    [
+        ("kind", "u1"),
+        ("strand", "u1"),
+        ("flags", "u1"),
+        ("synteny", "u1"),
+        ("start", "<u4"),
+        ("size", "<u4"),
+        ("src_size", "<u4"),
+    ]
+)
+SYNTENY = struct.Struct("<cIcI")
+STR_LENGTH = struct.Struct("<H")
+LONG_STR_LENGTH = struct.Struct("<I")
+QUALITY_LENGTH = struct.Struct("<I")
+
+# Lookup table from ASCII to 4 bit codes, unknown characters map to 0xFF
+ENCODE_TABLE = numpy.full(256, 0xFF, dtype=numpy.uint8)
+ENCODE_TABLE[numpy.frombuffer(FOUR_BIT_ALPHABET, dtype=numpy.uint8)] = numpy.arange(
+    len(FOUR_BIT_ALPHABET), dtype=numpy.uint8
+)
+
+
+class BinaryMAFIndexedAccess(interval_index_file.AbstractIndexedAccess):
+    """
+    Indexed access to a binary MAF file.
+    """
+
+    def read_at_current_offset(self, file, **kwargs):
+        """
+        Read the block at the current position in `file` and return an
+        instance of `Alignment`.
+        """
+        return read_next_bmaf(file, **kwargs)
+
+
+class BinaryMAFMultiIndexedAccess(interval_index_file.AbstractMultiIndexedAccess):
+    """
+    Indexed access to multiple binary MAF files.
+    """
+
+    indexed_access_class = BinaryMAFIndexedAccess
+
+
+class Reader:
+    """
+    Iterate over all blocks in a binary MAF file in order
+    """
+
+    def __init__(self, file, **kwargs):
+        self.file = file
+        self.maf_kwargs = kwargs
+        self.attributes = read_header(file)
+
+    def __next__(self):
+        return read_next_bmaf(self.file, **self.maf_kwargs)
+
+    def __iter__(self):
+        return ReaderIter(self)
+
+    def close(self):
+        self.file.close()
+
+
+class ReaderIter:
+    """
+    Adapts a `Reader` to the iterator protocol.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        v = next(self.reader)
+        if not v:
+            raise StopIteration
+        return v
+
+
+class Writer:
+    def __init__(self, file, attributes=None):
+        if attributes is None:
+            attributes = {}
+        self.file = file
+        if "version" not in attributes:
+            attributes["version"] = 1
+        write_header(file, attributes)
+
+    def write(self, alignment):
+        self.file.write(encode_block(alignment))
+
+    def close(self):
+        self.file.close()
+
+
+# ---- Helper methods -------------------------------------------------------
+
+
+def convert(maf_file, bmaf_file, indexes=None, species=None):
+    """
+    Copy every block from the MAF text file `maf_file` to the binary MAF
+    file `bmaf_file`. If an `interval_index_file.Indexes` is passed as
+    `indexes` the position of each block in `bmaf_file` is added to it,
+    optionally only for components whose species is in `species`.
+    """
+    from bx.align import maf
+
+    reader = maf.Reader(maf_file, parse_e_rows=True)
+    writer = Writer(bmaf_file, dict(reader.attributes))
+    for block in reader:
+        pos = bmaf_file.tell()
+        writer.write(block)
+        if indexes is None:
+            continue
+        for c in block.components:
+            if species is not None and c.src.split(".")[0] not in species:
+                continue
+            indexes.add(c.src, c.forward_strand_start, c.forward_strand_end, pos, max=c.src_size)
+
+
+def write_header(file, attributes):
+    data = " ".join(f"{key}={value}" for key, value in attributes.items()).encode("ascii")
+    file.write(HEADER.pack(MAGIC, VERSION, len(data)))
+    file.write(data)
+
+
+def read_header(file):
+    """Read and verify the file header, return the MAF attributes"""
+    header = file.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise Exception("File does not have binary MAF header")
+    magic, version, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise Exception("File does not have binary MAF header")
+    if version != VERSION:
+        raise Exception(f"Unsupported binary MAF version {version}, convert the MAF file again")
+    return parse_attributes(file.read(length).decode("ascii").split())
+
+
+def encode_str(value, length=STR_LENGTH):
+    data = value.encode("ascii")
+    return length.pack(len(data)) + data
+
+
+def encode_text(text):
+    """
+    Return `(flags, data)` for an alignment row, packing two columns per
+    byte whenever every character has a 4 bit code.
+    """
+    raw = text.encode("ascii")
+    codes = ENCODE_TABLE[numpy.frombuffer(raw, dtype=numpy.uint8)]
+    if len(codes) and codes.max() == 0xFF:
+        return FLAG_TEXT, raw
+    if len(codes) % 2:
+        codes = numpy.append(codes, numpy.uint8(0))
+    packed = (codes[0::2] << 4) | codes[1::2]
+    return FLAG_TEXT | FLAG_PACKED, packed.tobytes()
+
+
+def encode_block(alignment):
+    """Return the bytes of a binary MAF block for `alignment`"""
+    records = []
+    packed = []
+    raw = []
+    extras = []
+    for c in alignment.components:
+        strand = ord(c.strand)
+        if c.empty:
+            records.append((ord("e"), strand, 0, ord(c.synteny_empty), c.start, c.size, c.src_size))
+            continue
+        flags = 0
+        if c.text is not None:
+            flags, data = encode_text(c.text)
+            (packed if flags & FLAG_PACKED else raw).append(data)
+        if c.quality is not None:
+            flags |= FLAG_QUALITY
+            quality = c.quality.encode("ascii")
+            extras.append(QUALITY_LENGTH.pack(len(quality)) + quality)
+        if c.synteny_left and c.synteny_right:
+            flags |= FLAG_SYNTENY
+            extras.append(
+                SYNTENY.pack(
+                    c.synteny_left[0].encode("ascii"),
+                    c.synteny_left[1],
+                    c.synteny_right[0].encode("ascii"),
+                    c.synteny_right[1],
+                )
+            )
+        records.append((ord("s"), strand, flags, 0, c.start, c.size, c.src_size))
+    attributes = " ".join(f"{key}={value}" for key, value in alignment.attributes.items())
+    body = b"".join(
+        [
+            encode_str(str(alignment.score)),
+            encode_str(attributes),
+            encode_str(" ".join(c.src for c in alignment.components), LONG_STR_LENGTH),
+            numpy.array(records, dtype=RECORD).tobytes(),
+            *packed,
+            *raw,
+            *extras,
+        ]
+    )
+    length = BLOCK_HEADER.size - 4 + len(body)
+    return BLOCK_HEADER.pack(length, alignment.text_size, len(alignment.components)) + body
+
+
+def read_next_bmaf(file, species_to_lengths=None, parse_e_rows=False):
+    """
+    Read the next block from the binary MAF `file` and return it as an
+    `Alignment` instance. If `parse_e_rows` is true, empty components are
+    included.
+    """
+    header = file.read(4)
+    if not header:
+        return None
+    (length,) = struct.unpack("<I", header)
+    buf = file.read(length)
+    if len(buf) != length:
+        raise Exception("Truncated binary MAF block")
+    text_size, ncomponents = struct.unpack_from("<IH", buf, 0)
+    pos = 6
+    alignment = Alignment(species_to_lengths=species_to_lengths)
+    score, pos = decode_str(buf, pos)
+    attributes, pos = decode_str(buf, pos)
+    srcs, pos = decode_str(buf, pos, LONG_STR_LENGTH)
+    srcs = srcs.split(" ") if ncomponents else []
+    if len(srcs) != ncomponents:
+        raise Exception("Binary MAF block does not have a src for each component")
+    alignment.attributes = parse_attributes(attributes.split())
+    alignment.score = score
+    # The coordinate table and rows are decoded by the C extension
+    if decode_components(buf, pos, text_size, srcs, alignment, parse_e_rows):
+        # as add_component, the text size is only set by components with text
+        alignment.text_size = text_size
+    return alignment
+
+
+def decode_str(buf, pos, length=STR_LENGTH):
+    (size,) = length.unpack_from(buf, pos)
+    pos += length.size
+    return buf[pos : pos + size].decode("ascii"), pos + size
@@ -0,0 +1,140 @@
+"""
+Tests for `bx.align.bmaf`.
+"""
+
+import os
+import struct
+import tempfile
+from io import (
+    BytesIO,
+    StringIO,
+)
+
+import pytest
+
+import bx.align as align
+import bx.align.bmaf as bmaf
+import bx.align.maf as maf
+from bx import interval_index_file
+from bx.align.maf_tests import (
+    test_maf,
+    test_maf_2,
+    test_maf_3,
+)
+
+
+def roundtrip(maf_text):
+    out = BytesIO()
+    bmaf.convert(StringIO(maf_text), out)
+    out.seek(0)
+    return out
+
+
+def test_roundtrip():
+    for maf_text in (test_maf, test_maf_2, test_maf_3):
+        reader = bmaf.Reader(roundtrip(maf_text), parse_e_rows=True)
+        assert reader.attributes == maf.Reader(StringIO(maf_text)).attributes
+        expected = list(maf.Reader(StringIO(maf_text), parse_e_rows=True))
+        actual = list(reader)
+        assert len(actual) == len(expected)
+        for a, b in zip(expected, actual):
+            assert a == b
+            assert a.text_size == b.text_size
+            assert str(a) == str(b)
+
+
+def test_roundtrip_file():
+    with open("test_data/maf_tests/mm8_chr7_tiny.maf") as f:
+        maf_text = f.read()
+    reader = bmaf.Reader(roundtrip(maf_text))
+    for a, b in zip(maf.Reader(StringIO(maf_text)), reader):
+        assert a == b
+
+
+def test_skip_e_rows():
+    reader = bmaf.Reader(roundtrip(test_maf_2))
+    a = next(reader)
+    assert len(a.components) == 5
+    assert all(not c.empty for c in a.components)
+
+
+def test_raw_and_quality_rows():
+    a = align.Alignment(score=12)
+    a.add_component(align.Component("hg18.chr1", 10, 5, "+", 100, "ACxG-T"))
+    a.add_component(align.Component("mm9.chr2", 20, 5, "-", 200, "acgtnN"))
+    a.components[1].quality = "99-999"
+    out = BytesIO()
+    writer = bmaf.Writer(out)
+    writer.write(a)
+    out.seek(0)
+    b = next(bmaf.Reader(out))
+    assert a == b
+    assert b.components[0].text == "ACxG-T"
+    assert b.components[1].quality == "99-999"
+
+
+def test_odd_text_size_and_synteny():
+    a = align.Alignment(score=1)
+    a.add_component(align.Component("hg18.chr1", 10, 4, "+", 100, "AC-GT"))
+    a.add_component(align.Component("mm9.chr2", 20, 5, "-", 200, "acgtN"))
+    a.components[0].synteny_left = ("C", 0)
+    a.components[0].synteny_right = ("I", 12)
+    empty = align.Component("rn4.chr3", 30, 7, "+", 300, None)
+    empty.empty = True
+    empty.synteny_empty = "I"
+    a.add_component(empty)
+    out = BytesIO()
+    bmaf.Writer(out).write(a)
+    out.seek(0)
+    b = next(bmaf.Reader(out, parse_e_rows=True))
+    assert str(a) == str(b)
+    assert b.text_size == 5
+    assert b.components[0].synteny_right == ("I", 12)
+    assert b.components[2].empty and b.components[2].synteny_empty == "I"
+
+
+def test_truncated():
+    data = roundtrip(test_maf).getvalue()
+    with pytest.raises(Exception, match="Truncated"):
+        list(bmaf.Reader(BytesIO(data[:-10])))
+    # a cut inside the rows, with the block length patched to match
+    reader = bmaf.Reader(BytesIO(data))
+    start = reader.file.tell()
+    (length,) = struct.unpack_from("<I", data, start)
+    cut = data[: start + 4 + length - 10]
+    cut = cut[:start] + struct.pack("<I", length - 10) + cut[start + 4 :]
+    with pytest.raises(Exception, match="Truncated"):
+        list(bmaf.Reader(BytesIO(cut)))
+
+
+def test_version():
+    data = bytearray(roundtrip(test_maf).getvalue())
+    data[4:8] = struct.pack("<I", bmaf.VERSION - 1)
+    with pytest.raises(Exception, match="Unsupported binary MAF version"):
+        bmaf.Reader(BytesIO(bytes(data)))
+
+
+def test_get_reader_and_indexed():
+    fd, bmaf_fname = tempfile.mkstemp(suffix=".bmaf")
+    os.close(fd)
+    index_fname = bmaf_fname + ".index"
+    try:
+        indexes = interval_index_file.Indexes()
+        with open("test_data/maf_tests/mm8_chr7_tiny.maf") as maf_in, open(bmaf_fname, "wb") as out:
+            bmaf.convert(maf_in, out, indexes=indexes)
+        with open(index_fname, "wb") as out:
+            indexes.write(out)
+
+        with open(bmaf_fname, "rb") as f:
+            assert len(list(align.get_reader("bmaf", f))) == 8
+
+        index = align.get_indexed("bmaf", bmaf_fname)
+        blocks = index.get("mm8.chr7", 80082592, 80082766)
+        expected = maf.Indexed("test_data/maf_tests/mm8_chr7_tiny.maf").get("mm8.chr7", 80082592, 80082766)
+        assert len(blocks) == len(expected) > 0
+        for a, b in zip(expected, blocks):
+            assert a == b
+    finally:
+        os.remove(bmaf_fname)
+        if os.path.exists(index_fname):
+            os.remove(index_fname)
@@ -5,6 +5,8 @@ Classes that represent alignments between multiple sequences.
 import random
 import weakref
 
+import numpy
+
 from bx.misc.readlengths import read_lengths_file
 
 # DNA reverse complement table
@@ -428,11 +430,14 @@ class Component:
 
 def get_reader(format, infile, species_to_lengths=None):
     import bx.align.axt
+    import bx.align.bmaf
     import bx.align.lav
     import bx.align.maf
 
     if format == "maf":
         return bx.align.maf.Reader(infile, species_to_lengths)
+    elif format == "bmaf":
+        return bx.align.bmaf.Reader(infile, species_to_lengths=species_to_lengths)
     elif format == "axt":
         return bx.align.axt.Reader(infile, species_to_lengths)
     elif format == "lav":
@@ -443,6 +448,7 @@ def get_reader(format, infile, species_to_lengths=None):
 
 def get_writer(format, outfile, attributes=None):
     import bx.align.axt
+    import bx.align.bmaf
     import bx.align.lav
     import bx.align.maf
 
@@ -450,6 +456,8 @@ def get_writer(format, outfile, attributes=None):
         attributes = {}
     if format == "maf":
         return bx.align.maf.Writer(outfile, attributes)
+    elif format == "bmaf":
+        return bx.align.bmaf.Writer(outfile, attributes)
     elif format == "axt":
         return bx.align.axt.Writer(outfile, attributes)
     elif format == "lav":
@@ -460,11 +468,16 @@ def get_writer(format, outfile, attributes=None):
 
 def get_indexed(format, filename, index_filename=None, keep_open=False, species_to_lengths=None):
     import bx.align.axt
+    import bx.align.bmaf
     import bx.align.lav
     import bx.align.maf
 
     if format == "maf":
         return bx.align.maf.Indexed(filename, index_filename, keep_open, species_to_lengths)
+    elif format == "bmaf":
+        return bx.align.bmaf.BinaryMAFIndexedAccess(
+            filename, index_filename, keep_open, species_to_lengths=species_to_lengths
+        )
     elif format == "axt":
         return bx.align.axt.Indexed(filename, index_filename, keep_open, species_to_lengths)
     elif format == "lav":
@@ -482,6 +495,33 @@ def shuffle_columns(a):
             c.text = "".join(c.text[i] for i in mask)
 
 
+def get_text_matrix(components):
+    """
+    Return the texts of `components` as a writable array of bytes with one
+    row per component, all texts must have the same length. Changes to the
+    array can be written back with `set_text_matrix`.
+
+    >>> components = [Component(text="AC-T"), Component(text="A-GT")]
+    >>> rows = get_text_matrix(components)
+    >>> rows[:, 1] = ord("N")
+    >>> set_text_matrix(components, rows)
+    >>> [c.text for c in components]
+    ['AN-T', 'ANGT']
+    """
+    if not components:
+        return numpy.zeros((0, 0), dtype=numpy.uint8)
+    data = bytearray("".join(component.text for component in components), "ascii")
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(len(components), -1)
+
+
+def set_text_matrix(components, rows):
+    """Set the text of each of `components` from the matching row of `rows`"""
+    data = rows.tobytes().decode("ascii")
+    size = rows.shape[1]
+    for i, component in enumerate(components):
+        component.text = data[i * size : (i + 1) * size]
+
+
 def src_split(src):  # splits src into species,chrom
     dot = src.rfind(".")
     if dot == -1:
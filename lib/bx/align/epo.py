@@ -6,15 +6,26 @@ import pickle as cPickle
 import re
 from collections import namedtuple
 
+import numpy
+
+from bx import interval_index_file
 from ._epo import (  # noqa: F401
     bed_union,
+    chain_blocks,
     cummulative_intervals,
     fastLoadChain,
+    parse_chain_buffer,
+    parse_cigar,
+    read_chain_file,
     rem_dash,
+    rem_dash_array,
 )
 
 log = logging.getLogger(__name__)
 
+# code of match runs in the ops arrays of parse_cigar
+MATCH = ord("M")
+
 
 class Chain(namedtuple("Chain", "score tName tSize tStrand tStart tEnd qName qSize qStrand qStart qEnd id")):
     """A Chain header as in http://genome.ucsc.edu/goldenPath/help/chain.html
@@ -62,41 +73,22 @@ class Chain(namedtuple("Chain", "score tName tSize tStrand tStart tEnd qName qSi
         :type qr_chrom_sizes: dictionary of the type (chrom) --> size
         :return: A L{Chain} instance"""
 
-        # size, target, query arrays
-        S, T, Q = [], [], []
-
         # the target strand of the chain must be on the forward strand
-        trg_intervals = trg_comp.intervals(reverse=trg_comp.strand == "-")
-        qr_intervals = qr_comp.intervals(reverse=trg_comp.strand == "-")
+        trg_intervals = trg_comp.intervals_array(reverse=trg_comp.strand == "-")
+        qr_intervals = qr_comp.intervals_array(reverse=trg_comp.strand == "-")
         if len(trg_intervals) == 0 or len(qr_intervals) == 0:
             log.warning("deletion/insertion only intervals")
             return None
-        A, B = rem_dash(trg_intervals, qr_intervals)
-        # correct for when cigar starts/ends with dashes (in number of bases)
-        tr_start_correction = max(B[0][0] - A[0][0], 0)
-        tr_end_correction = max(A[-1][1] - B[-1][1], 0)
-        qr_start_correction = max(A[0][0] - B[0][0], 0)
-        qr_end_correction = max(B[-1][1] - A[-1][1], 0)
-
-        a, b = A.pop(0), B.pop(0)
-
-        # intervals are 0-base, halfo-open => lengths = coordinate difference
-        while A or B:
-            if a[1] < b[1]:
-                T.append(0)
-                Q.append(A[0][0] - a[1])
-                S.append(min(a[1], b[1]) - max(a[0], b[0]))
-                a = A.pop(0)
-            elif b[1] < a[1]:
-                Q.append(0)
-                T.append(B[0][0] - b[1])
-                S.append(min(a[1], b[1]) - max(a[0], b[0]))
-                b = B.pop(0)
-            elif A and B:
-                assert 1 > 2, "there are dash columns"
-            else:
-                break
-        S.append(min(a[1], b[1]) - max(a[0], b[0]))
+        A, B = rem_dash_array(trg_intervals, qr_intervals)
+        # correct for when cigar starts/ends with dashes (in number of bases),
+        # as plain ints so that numpy types do not end up in the Chain
+        tr_start_correction = int(max(B[0, 0] - A[0, 0], 0))
+        tr_end_correction = int(max(A[-1, 1] - B[-1, 1], 0))
+        qr_start_correction = int(max(A[0, 0] - B[0, 0], 0))
+        qr_end_correction = int(max(B[-1, 1] - A[-1, 1], 0))
+
+        # size, target, query arrays
+        S, T, Q = chain_blocks(A, B)
         assert len(T) == len(Q) == len(S) - 1, f"(S, T, Q) = ({len(S)}, {len(T)}, {len(Q)})"
 
         tSize = trg_chrom_sizes[trg_comp.chrom]
@@ -138,12 +130,12 @@ class Chain(namedtuple("Chain", "score tName tSize tStrand tStart tEnd qName qSi
         if chain.qStrand == "-":
             chain = chain._replace(qEnd=chain.qSize - chain.qStart, qStart=chain.qSize - chain.qEnd)
 
-        assert chain.tEnd - chain.tStart == sum(S) + sum(
-            T
-        ), f"[{str(chain)}] {chain.tEnd - chain.tStart} != {sum(S) + sum(T)}"
-        assert chain.qEnd - chain.qStart == sum(S) + sum(
-            Q
-        ), f"[{str(chain)}] {chain.qEnd - chain.qStart} != {sum(S) + sum(Q)}"
+        assert (
+            chain.tEnd - chain.tStart == S.sum() + T.sum()
+        ), f"[{str(chain)}] {chain.tEnd - chain.tStart} != {S.sum() + T.sum()}"
+        assert (
+            chain.qEnd - chain.qStart == S.sum() + Q.sum()
+        ), f"[{str(chain)}] {chain.qEnd - chain.qStart} != {S.sum() + Q.sum()}"
         return chain, S, T, Q
 
     def slice(self, who):
@@ -173,7 +165,12 @@ class Chain(namedtuple("Chain", "score tName tSize tStrand tStart tEnd qName qSi
 
     @classmethod
     def _parse_file(cls, path, pickle=False):
-        """parse a .chain file into a list of the type [(L{Chain}, arr, arr, arr) ...]
+        """parse a .chain file into a sequence of the type [(L{Chain}, arr, arr, arr) ...]
+
+        Chain files are loaded from a binary cache (see L{ChainCache}) next to
+        the chain file when there is an up to date one, and if `pickle` is true
+        such a cache is written after parsing. Explicit `.pkl` files, and `.pkl`
+        files left next to the chain file by older versions, are still loaded.
 
         :param path: path of the file"""
 
@@ -187,6 +184,21 @@ class Chain(namedtuple("Chain", "score tName tSize tStrand tStart tEnd qName qSi
             with open(fname, "rb") as f:
                 return cPickle.load(f)
 
+        if fname.endswith(ChainCache.suffix):
+            log.debug("loading chain cache %s ...", fname)
+            return ChainCache.load(fname)
+
+        fname_cache = f"{fname}{ChainCache.suffix}"
+        if os.path.isfile(fname_cache):
+            if os.stat(path).st_mtime > os.stat(fname_cache).st_mtime:
+                log.warning("chain cache %s is not up to date, ignoring it", fname_cache)
+            else:
+                log.info("loading chain cache %s ...", fname_cache)
+                try:
+                    return ChainCache.load(fname_cache)
+                except Exception:
+                    log.warning("Loading chain cache %s failed", fname_cache)
+
         fname_pkl = f"{fname}.pkl"
         if os.path.isfile(fname_pkl):
             # there is a cached version I can give to you
@@ -199,13 +211,195 @@ class Chain(namedtuple("Chain", "score tName tSize tStrand tStart tEnd qName qSi
             except Exception:
                 log.warning("Loading pickled file %s failed", fname_pkl)
 
-        data = fastLoadChain(path, cls._strfactory)
-        if pickle and not os.path.isfile(fname_pkl):
-            log.info("pickling to %s", fname_pkl)
-            with open(fname_pkl, "wb") as f:
-                cPickle.dump(data, f)
+        data = ChainCache.from_chain_file(path)
+        if pickle:
+            log.info("writing chain cache to %s", fname_cache)
+            try:
+                data.save(fname_cache)
+            except OSError:
+                log.warning("Writing chain cache %s failed", fname_cache)
+        return data
+
+
+class ChainCache:
+    """The chains of a .chain file held as flat arrays.
+
+    The ungapped blocks of all chains are concatenated in the `S`, `T` and `Q`
+    arrays, those of chain `i` being `S[offsets[i]:offsets[i+1]]`. Header lines
+    are kept as text and only turned into L{Chain} instances when a chain is
+    accessed, so a cache written with `save` can be memory mapped by `load`
+    without parsing anything up front.
+
+    Indexing and iterating give `(Chain, S, T, Q)` tuples, like
+    L{fastLoadChain}.
+
+    The file layout is a 32 byte header (`magic`, then the number of chains,
+    blocks and bytes of header text as little endian uint64) followed by the
+    int64 arrays `offsets`, `S`, `T`, `Q`, `text_offsets` and then the header
+    text."""
+
+    magic = b"BXCHAIN1"
+    suffix = ".bin"
+    header_dtype = numpy.dtype([("magic", "S8"), ("nchains", "<u8"), ("nblocks", "<u8"), ("ntext", "<u8")])
+
+    def __init__(self, offsets, S, T, Q, text_offsets, text):
+        assert len(offsets) == len(text_offsets)
+        self.offsets = offsets
+        self.S, self.T, self.Q = S, T, Q
+        self.text_offsets = text_offsets
+        self.text = text
+
+    @classmethod
+    def from_headers(cls, headers, offsets, S, T, Q):
+        """build from the output of L{parse_chain_buffer}"""
+
+        encoded = [h.encode() for h in headers]
+        text_offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(h) for h in encoded], out=text_offsets[1:])
+        return cls(offsets, S, T, Q, text_offsets, numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8))
+
+    @classmethod
+    def from_chain_file(cls, fname):
+        """parse a (possibly gzipped) .chain file"""
+
+        headers, offsets, S, T, Q = read_chain_file(fname)
+        check_chain_sizes(headers, offsets, S, T, Q)
+        data = cls.from_headers(headers, offsets, S, T, Q)
+        log.info("parsed %d elements from %s", len(data), fname)
         return data
 
+    @classmethod
+    def load(cls, fname):
+        """memory map a file written by L{save}"""
+
+        header = numpy.fromfile(fname, dtype=cls.header_dtype, count=1)
+        if len(header) != 1 or header["magic"][0] != cls.magic:
+            raise Exception(f"{fname} is not a chain cache file")
+        nchains, nblocks, ntext = (int(header[k][0]) for k in ("nchains", "nblocks", "ntext"))
+        arrays = []
+        pos = cls.header_dtype.itemsize
+        for n in (nchains + 1, nblocks, nblocks, nblocks, nchains + 1):
+            arrays.append(
+                numpy.memmap(fname, dtype="<i8", mode="r", offset=pos, shape=(n,)) if n else numpy.empty(0, "<i8")
+            )
+            pos += 8 * n
+        if ntext:
+            text = numpy.memmap(fname, dtype=numpy.uint8, mode="r", offset=pos, shape=(ntext,))
+        else:
+            text = numpy.empty(0, dtype=numpy.uint8)
+        return cls(*arrays, text)
+
+    def save(self, fname):
+        """write the arrays to `fname`, see the class documentation for the layout"""
+
+        header = numpy.array([(self.magic, len(self), len(self.S), len(self.text))], dtype=self.header_dtype)
+        with open(fname, "wb") as f:
+            f.write(header.tobytes())
+            for a in (self.offsets, self.S, self.T, self.Q, self.text_offsets):
+                f.write(numpy.ascontiguousarray(a, dtype="<i8").tobytes())
+            f.write(numpy.ascontiguousarray(self.text, dtype=numpy.uint8).tobytes())
+
+    def header(self, i):
+        """the header line of chain `i`"""
+
+        return bytes(self.text[self.text_offsets[i] : self.text_offsets[i + 1]]).decode()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chain index out of range")
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return Chain._strfactory(self.header(i)), self.S[a:b], self.T[a:b], self.Q[a:b]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def check_chain_sizes(headers, offsets, S, T, Q):
+    """check, as L{fastLoadChain} does, that the blocks of every chain add up
+    to the target and query ranges of its header"""
+
+    fields = [header.split() for header in headers]
+    t_sizes = numpy.array([int(f[6]) - int(f[5]) for f in fields], dtype=numpy.int64)
+    q_sizes = numpy.array([int(f[11]) - int(f[10]) for f in fields], dtype=numpy.int64)
+
+    def chain_sums(values):
+        sums = numpy.concatenate(([0], numpy.cumsum(values)))
+        return sums[offsets[1:]] - sums[offsets[:-1]]
+
+    aligned = chain_sums(S)
+    bad = numpy.flatnonzero((t_sizes != aligned + chain_sums(T)) | (q_sizes != aligned + chain_sums(Q)))
+    if len(bad):
+        raise Exception(f"chain blocks do not add up to the ranges of its header: {headers[bad[0]]}")
+
+
+class IndexedChainFile(interval_index_file.AbstractIndexedAccess):
+    """Random access to the chains of a .chain file overlapping a region.
+
+    Requires an index built with L{build_chain_index}, where each chain is
+    indexed by its target range and, under `query_prefix` + the query
+    chromosome, by its query range (both on the forward strand). Only the
+    chains returned by a query are parsed. As with other indexed files the
+    chain file must be uncompressed (or a seekable bz2/lzo file).
+
+    `get` and `get_query` return lists of (L{Chain}, S, T, Q), as
+    L{Chain._parse_file} does for the whole file."""
+
+    query_prefix = "query:"
+
+    def read_at_current_offset(self, file, **kwargs):
+        return read_next_chain(file)
+
+    def get_query(self, chrom, start, end):
+        """chains whose query range overlaps `chrom`:`start`-`end`"""
+
+        return self.get(self.query_prefix + chrom, start, end)
+
+
+def read_next_chain(file):
+    """read the chain at the current position of the binary file `file`
+
+    :return: (L{Chain}, S, T, Q) or None at the end of the file"""
+
+    lines = []
+    for line in iter(file.readline, b""):
+        if not line.strip() or (not lines and line.startswith(b"#")):
+            continue
+        lines.append(line)
+        if len(lines) > 1 and len(line.split()) == 1:
+            break
+    if not lines:
+        return None
+    headers, offsets, S, T, Q = parse_chain_buffer(b"".join(lines))
+    return Chain._strfactory(headers[0]), S, T, Q
+
+
+def build_chain_index(file, query_prefix=IndexedChainFile.query_prefix):
+    """index the chains of the binary file `file` by target and query range
+
+    :return: an L{interval_index_file.Indexes} to be written next to the chain file"""
+
+    indexes = interval_index_file.Indexes()
+    pos = file.tell()
+    for line in iter(file.readline, b""):
+        if line.startswith(b"chain"):
+            chain = Chain._strfactory(line.decode())
+            start, end = chain.tStart, chain.tEnd
+            if chain.tStrand == "-":
+                start, end = chain.tSize - end, chain.tSize - start
+            indexes.add(chain.tName, start, end, pos, max=chain.tSize)
+            start, end = chain.qStart, chain.qEnd
+            if chain.qStrand == "-":
+                start, end = chain.qSize - end, chain.qSize - start
+            indexes.add(query_prefix + chain.qName, start, end, pos, max=chain.qSize)
+        pos += len(line)
+    return indexes
+
 
 class EPOitem(namedtuple("Epo_item", "species gabid chrom start end strand cigar")):
     "this format is how alignments are delivered from e!"
@@ -235,7 +429,8 @@ class EPOitem(namedtuple("Epo_item", "species gabid chrom start end strand cigar
             cls, (cmp[0], cmp[1], chrom, int(cmp[3]), int(cmp[4]), {"1": "+", "-1": "-"}[cmp[5]], cmp[6])
         )
         span = instance.end - instance.start + 1
-        m_num = sum((t[1] == "M" and [t[0]] or [0])[0] for t in instance.cigar_iter(False))
+        lengths, ops = instance.cigar_runs()
+        m_num = lengths[ops == MATCH].sum()
         if span != m_num:
             log.warning(
                 "[%s] %s.%s:%s-%s.(span) %d != %d (matches)",
@@ -264,6 +459,17 @@ class EPOitem(namedtuple("Epo_item", "species gabid chrom start end strand cigar
         log.info("parsed %d elements from %s", len(data), fname)
         return data
 
+    def cigar_runs(self, reverse=False):
+        """self.cigar => (lengths, ops) run-length arrays of the cigar (see L{parse_cigar})
+
+        :param reverse: whether to return the runs in the reverse direction (right-to-left)
+        :type reverse: boolean"""
+
+        lengths, ops = parse_cigar(self.cigar)
+        if reverse:
+            return lengths[::-1], ops[::-1]
+        return lengths, ops
+
     def cigar_iter(self, reverse):
         """self.cigar => [(length, type) ... ] iterate the cigar
 
@@ -273,19 +479,27 @@ class EPOitem(namedtuple("Epo_item", "species gabid chrom start end strand cigar
         :return a list of pairs of the type [(length, M/D) ..]
         """
 
-        l = 0
-        P = self.cigar_pattern
+        lengths, ops = self.cigar_runs(reverse)
+        return [(l, chr(t)) for l, t in zip(lengths.tolist(), ops.tolist())]
 
-        data = []
-        cigar = self.cigar
-        parsed_cigar = re.findall(P, cigar)
-        if reverse:
-            parsed_cigar = parsed_cigar[::-1]
-        for _l, t in parsed_cigar:
-            # 1M is encoded as M
-            l = _l and int(_l) or 1  # int(_l) cannot be 0
-            data.append((l, t))
-        return data
+    def intervals_array(self, reverse, thr=0):
+        """as L{intervals}, but return the intervals as an (N, 2) int64 array"""
+
+        lengths, ops = self.cigar_runs(reverse)
+        match = ops == MATCH
+        # each match run starts after the preceeding one plus the last deletion seen
+        last_del = numpy.maximum.accumulate(numpy.where(match, -1, numpy.arange(len(ops))))
+        dl = numpy.where(last_del >= 0, lengths[last_del], 0)[match]
+        m = lengths[match]
+        d = numpy.empty((len(m), 2), dtype=numpy.int64)
+        d[:, 1] = thr + numpy.cumsum(dl) + numpy.cumsum(m)
+        d[:, 0] = d[:, 1] - m
+
+        d_sum = m.sum()
+        assert (
+            self.end - self.start + 1 == d_sum
+        ), f"[ ({self.start}, {self.end}) = {self.end - self.start + 1} ] != {d_sum}"
+        return d
 
     def intervals(self, reverse, thr=0):
         """return a list of (0-based half-open) intervals representing the match regions of the cigar
@@ -300,21 +514,262 @@ class EPOitem(namedtuple("Epo_item", "species gabid chrom start end strand cigar
 
         :return: list of pairs"""
 
-        d = [(thr, thr)]
-        dl = 0
-        for tup in self.cigar_iter(reverse):
-            if tup[1] == "D":
-                dl = tup[0]
-            else:
-                s = d[-1][1] + dl
-                d.append((s, s + tup[0]))
+        return [tuple(i) for i in self.intervals_array(reverse, thr).tolist()]
 
-        assert d[0] == (thr, thr)
-        # assert that nr. of Ms in the interval == sum of produced intervals
-        assert sum(t[0] for t in self.cigar_iter(False) if t[1] == "M") == sum(t[1] - t[0] for t in d)
 
-        d_sum = sum(t[1] - t[0] for t in d)
-        assert (
-            self.end - self.start + 1 == d_sum
-        ), f"[ ({self.start}, {self.end}) = {self.end - self.start + 1} ] != {d_sum}"
-        return d[1:]  # clip the (thr, thr) entry
+class LiftOverResult(namedtuple("LiftOverResult", "index chroms offsets starts ends")):
+    """Features mapped by L{LiftOver.map}.
+
+    `index` holds the positions (in the input arrays) of the features that
+    were mapped and `chroms` the chromosome each was mapped to. The blocks of
+    the i-th mapped feature are `starts[offsets[i]:offsets[i+1]]` and
+    `ends[offsets[i]:offsets[i+1]]`, sorted and with touching blocks joined."""
+
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.index)
+
+    def blocks(self, i):
+        """the blocks of the i-th mapped feature as a list of (chrom, start, end)"""
+
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return [(self.chroms[i], int(s), int(e)) for s, e in zip(self.starts[a:b], self.ends[a:b])]
+
+
+class LiftOver:
+    """Map intervals from the target to the query species of a set of chains.
+
+    The ungapped blocks of all chains on a target chromosome are kept in flat
+    arrays, so features are mapped a whole chromosome at a time: the chains
+    overlapping each feature and the blocks the feature starts and ends in are
+    found with `searchsorted` and mapped coordinates are computed on arrays.
+    Results are the same as mapping the features one by one through an
+    `IntervalTree` of the chain headers, as `bnMapper.py` used to do.
+
+    :param chains: sequence of (L{Chain}, S, T, Q) as returned by L{Chain._parse_file}"""
+
+    # blocks of a chain are keyed by (chain number << shift) + coordinate
+    shift = 32
+
+    def __init__(self, chains):
+        by_chrom = {}
+        for chain, S, T, Q in chains:
+            if chain.tStrand == "-":
+                chain = chain._replace(tEnd=chain.tSize - chain.tStart, tStart=chain.tSize - chain.tEnd)
+            if chain.qStrand == "-":
+                chain = chain._replace(qEnd=chain.qSize - chain.qStart, qStart=chain.qSize - chain.qEnd)
+            by_chrom.setdefault(chain.tName, []).append((chain, S, T, Q))
+        self.chroms = {chrom: _ChainBlocks(data, self.shift) for chrom, data in by_chrom.items()}
+
+    @classmethod
+    def from_file(cls, path, cache=False):
+        """load the chains of `path` (see L{Chain._parse_file})"""
+
+        return cls(Chain._parse_file(path, cache))
+
+    def __len__(self):
+        return sum(len(blocks.chains) for blocks in self.chroms.values())
+
+    def chains(self, chrom):
+        """the chains (with headers on the forward strand) on target chromosome `chrom`, in search order"""
+
+        blocks = self.chroms.get(chrom)
+        return [] if blocks is None else blocks.chains
+
+    def overlaps(self, chrom, starts, ends):
+        """number of chains overlapping each of the features `starts`, `ends` of `chrom`"""
+
+        starts, ends = _as_int64(starts), _as_int64(ends)
+        blocks = self.chroms.get(chrom)
+        if blocks is None:
+            return numpy.zeros(len(starts), dtype=numpy.int64)
+        feature, _ = blocks.find(starts, ends)
+        return numpy.bincount(feature, minlength=len(starts))
+
+    def map(self, chrom, starts, ends, max_gap=-1, keep_split=False, threshold=0.0):
+        """map the features `starts`, `ends` of target chromosome `chrom`.
+
+        :param max_gap: discard features with an insertion/deletion bigger than this (if non negative)
+        :param keep_split: for features mapped by several chains keep the longest mapping instead of discarding them
+        :param threshold: discard features with less than this fraction of their length mapped
+        :return: a L{LiftOverResult}"""
+
+        starts, ends = _as_int64(starts), _as_int64(ends)
+        blocks = self.chroms.get(chrom)
+        if blocks is None:
+            return _empty_result()
+        pairs = blocks.transform(starts, ends, max_gap)
+        feature, chain, first, last, slice_starts, slice_ends = pairs
+        if len(feature) == 0:
+            return _empty_result()
+
+        # pick one chain per feature
+        slice_offsets = numpy.zeros(len(feature) + 1, dtype=numpy.int64)
+        numpy.cumsum(last - first + 1, out=slice_offsets[1:])
+        group_starts = numpy.flatnonzero(numpy.r_[True, feature[1:] != feature[:-1]])
+        group_sizes = numpy.diff(numpy.r_[group_starts, len(feature)])
+        if keep_split:
+            # the first chain with the largest span, as measured by the ends of its first and last slices
+            span = slice_ends[slice_offsets[1:] - 1] - slice_ends[slice_offsets[:-1]]
+            best = numpy.repeat(numpy.maximum.reduceat(span, group_starts), group_sizes)
+            span = numpy.where(best > 0, span, 0)
+            best = numpy.where(best > 0, best, 0)
+            candidates = numpy.flatnonzero(span == best)
+            selected = candidates[numpy.r_[True, feature[candidates[1:]] != feature[candidates[:-1]]]]
+        else:
+            selected = group_starts[group_sizes == 1]
+
+        # apply the mapping threshold
+        lengths = numpy.add.reduceat(slice_ends - slice_starts, slice_offsets[:-1])
+        selected = selected[(ends[feature[selected]] - starts[feature[selected]]) * threshold <= lengths[selected]]
+        if len(selected) == 0:
+            return _empty_result()
+
+        # join blocks of the selected chains that touch on the query side
+        counts = slice_offsets[selected + 1] - slice_offsets[selected]
+        owner = numpy.repeat(numpy.arange(len(selected), dtype=numpy.int64), counts)
+        rows = numpy.repeat(slice_offsets[selected] - numpy.cumsum(counts) + counts, counts) + numpy.arange(len(owner))
+        s, e = slice_starts[rows], slice_ends[rows]
+        order = numpy.lexsort((e, s, owner))
+        owner, s, e = owner[order], s[order], e[order]
+        owner_key = owner << self.shift
+        running_end = numpy.maximum.accumulate(owner_key + e) - owner_key
+        new = numpy.r_[True, (owner[1:] != owner[:-1]) | (s[1:] > running_end[:-1])]
+        head = numpy.flatnonzero(new)
+        tail = numpy.r_[head[1:], len(s)] - 1
+        starts, ends = s[head], running_end[tail]
+        # empty blocks are dropped when joining several blocks
+        keep = (starts < ends) | (counts[owner[head]] < 2)
+        head, starts, ends = head[keep], starts[keep], ends[keep]
+        sizes = numpy.bincount(owner[head], minlength=len(selected))
+        selected = selected[sizes > 0]
+        offsets = numpy.zeros(len(selected) + 1, dtype=numpy.int64)
+        numpy.cumsum(sizes[sizes > 0], out=offsets[1:])
+        return LiftOverResult(feature[selected], blocks.q_names[blocks.q_name[chain[selected]]], offsets, starts, ends)
+
+    def map_points(self, chrom, positions):
+        """map single positions of target chromosome `chrom`.
+
+        A position is mapped by the first chain (in search order) that has
+        it strictly inside an ungapped block.
+
+        :return: (chroms, mapped) where mapped is -1 for positions that do not map"""
+
+        positions = _as_int64(positions)
+        mapped = numpy.full(len(positions), -1, dtype=numpy.int64)
+        chroms = numpy.full(len(positions), "", dtype=object)
+        blocks = self.chroms.get(chrom)
+        if blocks is None:
+            return chroms, mapped
+        feature, chain, first, last, slice_starts, slice_ends = blocks.transform(positions, positions, -1)
+        if len(feature):
+            offsets = numpy.r_[0, numpy.cumsum(last - first + 1)]
+            head = numpy.flatnonzero(numpy.r_[True, feature[1:] != feature[:-1]])
+            mapped[feature[head]] = slice_starts[offsets[head]]
+            chroms[feature[head]] = blocks.q_names[blocks.q_name[chain[head]]]
+        return chroms, mapped
+
+
+class _ChainBlocks:
+    """the blocks of the chains on one target chromosome, for L{LiftOver}"""
+
+    def __init__(self, data, shift):
+        # search order is that of an IntervalTree of the chain headers: by start, ties in input order
+        data = sorted(data, key=lambda d: d[0].tStart)
+        self.shift = shift
+        self.chains = [d[0] for d in data]
+        self.t_start = numpy.array([c.tStart for c in self.chains], dtype=numpy.int64)
+        self.t_end = numpy.array([c.tEnd for c in self.chains], dtype=numpy.int64)
+        self.q_start = numpy.array([c.qStart for c in self.chains], dtype=numpy.int64)
+        self.q_span = numpy.array([c.qEnd - c.qStart for c in self.chains], dtype=numpy.int64)
+        self.q_minus = numpy.array([c.qStrand == "-" for c in self.chains], dtype=bool)
+        names = {}
+        self.q_name = numpy.array([names.setdefault(c.qName, len(names)) for c in self.chains], dtype=numpy.int64)
+        self.q_names = numpy.empty(len(names), dtype=object)
+        self.q_names[:] = list(names)
+        self.max_length = int((self.t_end - self.t_start).max())
+
+        sizes = numpy.array([len(d[1]) for d in data], dtype=numpy.int64)
+        self.offsets = numpy.zeros(len(data) + 1, dtype=numpy.int64)
+        numpy.cumsum(sizes, out=self.offsets[1:])
+        S, T, Q = (numpy.concatenate([_as_int64(d[i]) for d in data]) for i in (1, 2, 3))
+        self.ct_start, self.ct_end = self._cummulative(S, T)
+        self.cq_start, self.cq_end = self._cummulative(S, Q)
+        owner = numpy.repeat(numpy.arange(len(data), dtype=numpy.int64), sizes) << shift
+        self.start_keys = owner + self.ct_start
+        self.end_keys = owner + self.ct_end
+        # gap_sizes[i] is the largest of the gaps between blocks i and i + 1
+        self.gap_sizes = numpy.zeros(len(S), dtype=numpy.int64)
+        self.gap_sizes[:-1] = numpy.maximum(self.ct_start[1:] - self.ct_end[:-1], self.cq_start[1:] - self.cq_end[:-1])
+        self.gap_sizes[self.offsets[1:] - 1] = 0
+
+    def _cummulative(self, S, D):
+        """vectorized L{cummulative_intervals} for all the chains"""
+
+        ends = numpy.cumsum(S + D) - D
+        before = numpy.repeat(ends[self.offsets[1:-1] - 1] + D[self.offsets[1:-1] - 1], numpy.diff(self.offsets[1:]))
+        ends[self.offsets[1] :] -= before
+        return ends - S, ends
+
+    def find(self, starts, ends):
+        """(feature, chain) index pairs of overlapping features and chains, sorted"""
+
+        lo = numpy.searchsorted(self.t_start, starts - self.max_length, side="right")
+        hi = numpy.searchsorted(self.t_start, ends, side="left")
+        counts = numpy.maximum(hi - lo, 0)
+        feature = numpy.repeat(numpy.arange(len(starts), dtype=numpy.int64), counts)
+        chain = numpy.repeat(lo - numpy.cumsum(counts) + counts, counts) + numpy.arange(len(feature))
+        keep = self.t_end[chain] > starts[feature]
+        return feature[keep], chain[keep]
+
+    def transform(self, starts, ends, max_gap):
+        """map each feature through each of the chains it overlaps.
+
+        :return: (feature, chain, first, last, slice_starts, slice_ends) where
+            blocks first..last of the chain are mapped for each pair and the
+            slices of the pairs are concatenated, in block order"""
+
+        feature, chain = self.find(starts, ends)
+        t_start = self.t_start[chain]
+        rel_start = numpy.maximum(starts[feature], t_start) - t_start
+        rel_end = numpy.minimum(ends[feature], self.t_end[chain]) - t_start
+        key = chain << self.shift
+        first = numpy.searchsorted(self.end_keys, key + rel_start, side="right")
+        last = numpy.searchsorted(self.start_keys, key + rel_end, side="left") - 1
+        keep = first <= last
+        if max_gap >= 0:
+            big = numpy.zeros(len(self.gap_sizes) + 1, dtype=numpy.int64)
+            numpy.cumsum(self.gap_sizes > max_gap, out=big[1:])
+            # the gap after the last block is not considered
+            keep &= (first >= last - 1) | (big[numpy.maximum(last - 1, first)] == big[first])
+        feature, chain, first, last = feature[keep], chain[keep], first[keep], last[keep]
+        rel_start, rel_end = rel_start[keep], rel_end[keep]
+
+        counts = last - first + 1
+        heads = numpy.cumsum(counts) - counts
+        block = numpy.repeat(first - heads, counts) + numpy.arange(counts.sum())
+        slice_starts = self.cq_start[block]
+        slice_ends = self.cq_end[block]
+        slice_starts[heads] += numpy.maximum(0, rel_start - self.ct_start[first])
+        tails = heads + counts - 1
+        slice_ends[tails] -= numpy.maximum(0, self.ct_end[last] - rel_end)
+        owner = numpy.repeat(chain, counts)
+        minus = self.q_minus[owner]
+        span = self.q_span[owner]
+        slice_starts, slice_ends = (
+            numpy.where(minus, span - slice_ends, slice_starts),
+            numpy.where(minus, span - slice_starts, slice_ends),
+        )
+        slice_starts += self.q_start[owner]
+        slice_ends += self.q_start[owner]
+        return feature, chain, first, last, slice_starts, slice_ends
+
+
+def _as_int64(a):
+    return numpy.asarray(a, dtype=numpy.int64)
+
+
+def _empty_result():
+    empty = numpy.empty(0, dtype=numpy.int64)
+    return LiftOverResult(empty, numpy.empty(0, dtype=object), numpy.zeros(1, dtype=numpy.int64), empty, empty)
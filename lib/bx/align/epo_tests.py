@@ -1,7 +1,9 @@
 "tests for bx.align.epo"
 
+import os
 import pdb
 import random
+import tempfile
 import unittest
 
 import numpy as np
@@ -9,10 +11,16 @@ import numpy as np
 from bx.align._epo import (
     bed_union,
     cummulative_intervals,
+    fastLoadChain,
+    parse_chain_buffer,
 )
 from bx.align.epo import (
+    build_chain_index,
     Chain,
+    ChainCache,
     EPOitem,
+    IndexedChainFile,
+    LiftOver,
 )
 
 
@@ -178,6 +186,8 @@ class TestEpo(unittest.TestCase):
             if not chain:
                 continue
             ch, S, T, Q = chain
+            for field in (ch.tStart, ch.tEnd, ch.qStart, ch.qEnd):
+                assert type(field) is int
             i = int(ch.id)
             c1, c2 = cigar_pairs[i]
             if p[0].strand == "-":
@@ -194,6 +204,16 @@ class TestEpo(unittest.TestCase):
                     cch(c2, th + s, th + s + q) and c1[th + s : th + s + q] == "-" * q
                 th = th + s + max(t, q)
 
+    def test_cigar_runs(self):
+        item = EPOitem._strfactory("homo_sapiens\t0\t1\t1\t9\t1\t4MD4M2DM")
+        lengths, ops = item.cigar_runs()
+        assert lengths.tolist() == [4, 1, 4, 2, 1]
+        assert bytes(ops) == b"MDMDM"
+        assert item.cigar_iter(True) == [(1, "M"), (2, "D"), (4, "M"), (1, "D"), (4, "M")]
+        assert item.intervals(False) == [(0, 4), (5, 9), (11, 12)]
+        assert item.intervals(True) == [(0, 1), (3, 7), (8, 12)]
+        assert item.intervals_array(False, thr=10).tolist() == [[10, 14], [15, 19], [21, 22]]
+
     def test_rem_dash(self):
         # ****--****-------****  4M2D4M7D4M
         # *******-------*******  7M7D7M
@@ -252,5 +272,117 @@ class TestEpo(unittest.TestCase):
             assert (qStart + 1) - 1 == chain[0].qStart, f"{qStart + 1} != {chain[0].qStart}"
 
 
+class TestChainCache(unittest.TestCase):
+    chain_file = "test_data/epo_tests/epo_547_hs_mm_12way_mammals_65.chain"
+
+    def assert_same_chains(self, A, B):
+        assert len(A) == len(B)
+        for a, b in zip(A, B):
+            assert a[0] == b[0]
+            for x, y in zip(a[1:], b[1:]):
+                assert np.array_equal(x, y)
+
+    def test_parse_buffer(self):
+        headers, offsets, S, T, Q = parse_chain_buffer(
+            b"chain 10 chr1 100 + 0 12 chr2 50 - 5 16 1\n5 1 0\n6\n\n#comment\nchain 3 chr1 100 + 20 23 chr3 9 + 0 3 2\n3\n"
+        )
+        assert headers == ["chain 10 chr1 100 + 0 12 chr2 50 - 5 16 1", "chain 3 chr1 100 + 20 23 chr3 9 + 0 3 2"]
+        assert offsets.tolist() == [0, 2, 3]
+        assert S.tolist() == [5, 6, 3] and T.tolist() == [1, 0, 0] and Q.tolist() == [0, 0, 0]
+        with self.assertRaises(ValueError):
+            parse_chain_buffer(b"chain 10 chr1 100 + 0 12 chr2 50 - 5 16 1\n5 1 0\n")
+        with self.assertRaises(ValueError):
+            parse_chain_buffer(b"5 1 0\n")
+
+    def test_save_load(self):
+        expected = fastLoadChain(self.chain_file, Chain._strfactory)
+        data = ChainCache.from_chain_file(self.chain_file)
+        self.assert_same_chains(expected, data)
+        fd, fname = tempfile.mkstemp(suffix=ChainCache.suffix)
+        os.close(fd)
+        try:
+            data.save(fname)
+            loaded = ChainCache.load(fname)
+            self.assert_same_chains(expected, loaded)
+            assert loaded[-1][0] == expected[-1][0]
+            self.assert_same_chains(expected, Chain._parse_file(fname))
+        finally:
+            os.remove(fname)
+
+    def test_corrupt(self):
+        fd, fname = tempfile.mkstemp(suffix=".chain")
+        with os.fdopen(fd, "w") as f:
+            f.write(
+                "chain 10 chr1 100 + 0 12 chr2 50 - 5 16 1\n5 1 0\n6\n\nchain 3 chr1 100 + 20 24 chr3 9 + 0 3 2\n3\n"
+            )
+        try:
+            with self.assertRaises(Exception) as e:
+                ChainCache.from_chain_file(fname)
+            assert "chain 3 chr1" in str(e.exception)
+            assert not os.path.exists(fname + ChainCache.suffix)
+        finally:
+            os.remove(fname)
+
+
+class TestIndexedChainFile(unittest.TestCase):
+    chain_file = "test_data/epo_tests/epo_547_hs_mm_12way_mammals_65.chain"
+
+    def test_get(self):
+        chains = fastLoadChain(self.chain_file, Chain._strfactory)
+        fd, index_fname = tempfile.mkstemp(suffix=".index")
+        os.close(fd)
+        try:
+            with open(self.chain_file, "rb") as f, open(index_fname, "wb") as out:
+                build_chain_index(f).write(out)
+            index = IndexedChainFile(self.chain_file, index_fname)
+            for chain, S, T, Q in chains:
+                start, end = chain.bedInterval("t")[1:3]
+                found = index.get(chain.tName, start, end)
+                assert chain in [c[0] for c in found]
+                match = [c for c in found if c[0] == chain][0]
+                for x, y in zip((S, T, Q), match[1:]):
+                    assert np.array_equal(x, y)
+                start, end = chain.bedInterval("q")[1:3]
+                assert chain in [c[0] for c in index.get_query(chain.qName, start, end)]
+            assert index.get("chr21", 0, 10) == []
+        finally:
+            os.remove(index_fname)
+
+
+class TestLiftOver(unittest.TestCase):
+    chain_file = "test_data/epo_tests/epo_547_hs_mm_12way_mammals_65.chain"
+
+    def setUp(self):
+        self.lift = LiftOver.from_file(self.chain_file)
+        with open("test_data/epo_tests/hpeaks.bed") as f:
+            self.peaks = [line.split() for line in f]
+
+    def map_peaks(self, **kwargs):
+        starts = [int(p[1]) for p in self.peaks]
+        ends = [int(p[2]) for p in self.peaks]
+        mapped = self.lift.map("chr21", starts, ends, **kwargs)
+        lines = []
+        for i, idx in enumerate(mapped.index):
+            for chrom, s, e in mapped.blocks(i):
+                lines.append(f"{chrom}\t{s}\t{e}\t{self.peaks[idx][3]}\n")
+        return lines
+
+    def test_map(self):
+        with open("test_data/epo_tests/hpeaks.mapped.bed4") as f:
+            assert self.map_peaks() == f.readlines()
+        with open("test_data/epo_tests/hpeaks.mapped.nopeak2.bed4") as f:
+            assert self.map_peaks(max_gap=3) == f.readlines()
+        assert len(self.lift.map("chrX", [10], [20])) == 0
+
+    def test_map_points(self):
+        mapped = self.lift.map("chr21", [int(p[1]) for p in self.peaks], [int(p[1]) + 1 for p in self.peaks])
+        chroms, points = self.lift.map_points("chr21", [int(p[1]) for p in self.peaks])
+        for i, idx in enumerate(mapped.index):
+            if points[idx] >= 0:
+                assert chroms[idx] == mapped.chroms[i]
+                assert points[idx] in (mapped.starts[mapped.offsets[i]], mapped.ends[mapped.offsets[i + 1] - 1])
+        assert self.lift.overlaps("chr21", [0], [1]).tolist() == [0]
+
+
 if __name__ == "__main__":
     unittest.main()
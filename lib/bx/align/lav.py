@@ -5,22 +5,37 @@ pairwise aligner.
 .. _blastz: http://www.bx.psu.edu/miller_lab/
 """
 
+import os
 import sys
+from collections import OrderedDict
 from io import StringIO
 
 import bx.seq
+import bx.seq.nib
+import bx.seq.twobit
 from bx.align import (
     Alignment,
     Component,
     src_merge,
     src_split,
 )
+from bx.seq.seq import SeqFile
+
+DEFAULT_WINDOW_SIZE = 64 * 1024
+DEFAULT_MAX_WINDOWS = 16
 
 
 class Reader:
     """Iterate over all lav blocks in a file in order"""
 
-    def __init__(self, file, path_subs=None, fail_to_ns=False):
+    def __init__(
+        self,
+        file,
+        path_subs=None,
+        fail_to_ns=False,
+        window_size=DEFAULT_WINDOW_SIZE,
+        max_windows=DEFAULT_MAX_WINDOWS,
+    ):
         self.file = file
         self.lineNumber = 0
         # list of (prefix, replacement) to allow redirection of sequence file
@@ -29,6 +44,11 @@ class Reader:
         if self.path_subs is None:
             self.path_subs = []
         self.fail_to_ns = fail_to_ns  # True => if sequences fail to open, create a fake file of all Ns
+        # nib and 2bit sequences are fetched lazily, keeping at most max_windows
+        # windows of window_size bases of each sequence in memory
+        self.window_size = window_size
+        self.max_windows = max_windows
+        self.twobit_files = {}  # open 2bit files, by filename
 
         self.d_stanza_text = None
 
@@ -87,6 +107,10 @@ class Reader:
         return ReaderIter(self)
 
     def close(self):
+        self.close_seqs()
+        for tbf in self.twobit_files.values():
+            tbf.file.close()
+        self.twobit_files = {}
         self.file.close()
 
     def open_seqs(self):
@@ -94,68 +118,26 @@ class Reader:
             return
 
         if self.seq1_file is None:
-            if self.seq1_strand == "+":
-                revcomp = False
-            else:
-                revcomp = "-5'"
-            if self.seq1_contig == 1:
-                contig = None
-            else:
-                contig = self.seq1_contig
-            try:
-                f = open(self.seq1_filename, "rb")
-            except Exception:
-                if self.fail_to_ns:
-                    f = StringIO(">seq1\n" + ("n" * (self.seq1_end - self.seq1_start)))
-                    revcomp = False
-                    contig = 1
-                else:
-                    raise Exception(f"failed to open {self.seq1_filename}")
-            self.seq1_file = bx.seq.seq_file(f, revcomp=revcomp, contig=contig)
+            self.seq1_file, self.seq1_src, species1, chrom1 = self.open_seq(
+                self.seq1_filename,
+                self.seq1_header,
+                self.seq1_strand,
+                self.seq1_contig,
+                self.seq1_end - self.seq1_start,
+                "seq1",
+            )
             self.seq1_gap = self.seq1_file.gap
-            try:
-                name1 = self.header_to_src_name(self.seq1_header)
-            except ValueError:
-                try:
-                    name1 = self.path_to_src_name(self.seq1_filename)
-                except ValueError:
-                    name1 = "seq1"
-            species1, chrom1 = src_split(name1)
-            self.seq1_src = src_merge(species1, chrom1, contig)
-            if contig is not None:
-                chrom1 += f"[{contig}]"
 
         if self.seq2_file is None:
-            if self.seq2_strand == "+":
-                revcomp = False
-            else:
-                revcomp = "-5'"
-            if self.seq2_contig == 1:
-                contig = None
-            else:
-                contig = self.seq2_contig
-            try:
-                f = open(self.seq2_filename, "rb")
-            except Exception:
-                if self.fail_to_ns:
-                    f = StringIO(">seq2\n" + ("n" * (self.seq2_end - self.seq2_start)))
-                    revcomp = False
-                    contig = 1
-                else:
-                    raise Exception(f"failed to open {self.seq1_filename}")
-            self.seq2_file = bx.seq.seq_file(f, revcomp=revcomp, contig=contig)
+            self.seq2_file, self.seq2_src, species2, chrom2 = self.open_seq(
+                self.seq2_filename,
+                self.seq2_header,
+                self.seq2_strand,
+                self.seq2_contig,
+                self.seq2_end - self.seq2_start,
+                "seq2",
+            )
             self.seq2_gap = self.seq2_file.gap
-            try:
-                name2 = self.header_to_src_name(self.seq2_header)
-            except ValueError:
-                try:
-                    name2 = self.path_to_src_name(self.seq2_filename)
-                except ValueError:
-                    name2 = "seq2"
-            species2, chrom2 = src_split(name2)
-            self.seq2_src = src_merge(species2, chrom2, contig)
-            if contig is not None:
-                chrom2 += f"[{contig}]"
 
         length1 = self.seq1_file.length
         length2 = self.seq2_file.length
@@ -169,6 +151,90 @@ class Reader:
         self.species_to_lengths[species1][chrom1] = self.seq1_file.length
         self.species_to_lengths[species2][chrom2] = self.seq2_file.length
 
+    def open_seq(self, filename, header, strand, contig, size, default_name):
+        """
+        Open the sequence named in an s-stanza, returns (seq_file, src,
+        species, chrom) with chrom as used in `species_to_lengths`.
+        """
+        if strand == "+":
+            revcomp = False
+        else:
+            revcomp = "-5'"
+        if contig == 1:
+            contig = None
+        twobit_filename, seq_name = split_twobit_filename(filename)
+        if twobit_filename is not None and (os.path.exists(twobit_filename) or not self.fail_to_ns):
+            return self.open_twobit_seq(twobit_filename, seq_name, header, revcomp, contig)
+        try:
+            f = open(filename, "rb")
+        except Exception:
+            if self.fail_to_ns:
+                f = StringIO(f">{default_name}\n" + ("n" * size))
+                revcomp = False
+                contig = 1
+            else:
+                raise Exception(f"failed to open {filename}")
+        format = "fasta" if isinstance(f, StringIO) else bx.seq.infer_format(f)
+        if format == "nib" and contig is None:
+            # nib files are random access, only keep a few windows in memory
+            nib_file = bx.seq.nib.NibFile(f)
+            seq_file = WindowedSeqFile(
+                f, nib_file.length, nib_file.raw_fetch, revcomp, self.window_size, self.max_windows
+            )
+        else:
+            seq_file = bx.seq.seq_file(f, format=format, revcomp=revcomp, contig=contig)
+        try:
+            name = self.header_to_src_name(header)
+        except ValueError:
+            try:
+                name = self.path_to_src_name(filename)
+            except ValueError:
+                name = default_name
+        species, chrom = src_split(name)
+        src = src_merge(species, chrom, contig)
+        if contig is not None:
+            chrom += f"[{contig}]"
+        return seq_file, src, species, chrom
+
+    def open_twobit_seq(self, filename, seq_name, header, revcomp, contig):
+        """
+        Open a sequence of a 2bit file. The sequence is the one named in the
+        filename (as "file.2bit:name" or "file.2bit/name"), else the one
+        named by the h-stanza header, else the contig-th in the file.
+        """
+        if filename not in self.twobit_files:
+            try:
+                f = open(filename, "rb")
+            except Exception:
+                raise Exception(f"failed to open {filename}")
+            self.twobit_files[filename] = bx.seq.twobit.TwoBitFile(f)
+        tbf = self.twobit_files[filename]
+        if seq_name is None:
+            try:
+                seq_name = self.header_to_src_name(header)
+            except ValueError:
+                pass
+            if seq_name not in tbf.index and seq_name is not None and "." in seq_name:
+                seq_name = seq_name.split(".", 1)[1]
+            if seq_name not in tbf.index:
+                names = list(tbf.index)
+                if contig is not None and contig > len(names):
+                    raise Exception(f"{filename} has no contig {contig}")
+                seq_name = names[(contig or 1) - 1]
+        if seq_name not in tbf.index:
+            raise Exception(f"{filename} has no sequence {seq_name}")
+        seq = tbf[seq_name]
+        seq_file = WindowedSeqFile(
+            None,
+            seq.size,
+            lambda start, length: seq.get(start, start + length),
+            revcomp,
+            self.window_size,
+            self.max_windows,
+        )
+        species = os.path.basename(filename)[:-5]
+        return seq_file, src_merge(species, seq_name), species, seq_name
+
     def close_seqs(self):
         if self.seq1_file is not None:
             self.seq1_file.close()
@@ -331,21 +397,24 @@ class Reader:
         """converts a score and pieces to an alignment"""
         # build text
         self.open_seqs()
-        text1 = text2 = ""
+        text1 = []
+        text2 = []
         end1 = end2 = None
         for start1, start2, length, _pctId in pieces:
             if end1 is not None:
                 if start1 == end1:  # insertion in sequence 2
-                    text1 += self.seq1_gap * (start2 - end2)
-                    text2 += self.seq2_file.get(end2, start2 - end2)
+                    text1.append(self.seq1_gap * (start2 - end2))
+                    text2.append(self.seq2_file.get(end2, start2 - end2))
                 else:  # insertion in sequence 1
-                    text1 += self.seq1_file.get(end1, start1 - end1)
-                    text2 += self.seq2_gap * (start1 - end1)
+                    text1.append(self.seq1_file.get(end1, start1 - end1))
+                    text2.append(self.seq2_gap * (start1 - end1))
 
-            text1 += self.seq1_file.get(start1, length)
-            text2 += self.seq2_file.get(start2, length)
+            text1.append(self.seq1_file.get(start1, length))
+            text2.append(self.seq2_file.get(start2, length))
             end1 = start1 + length
             end2 = start2 + length
+        text1 = "".join(text1)
+        text2 = "".join(text2)
         # create alignment
         start1 = pieces[0][0]
         start2 = pieces[0][1]
@@ -399,6 +468,50 @@ class Reader:
         return ".".join(header)
 
 
+class WindowedSeqFile(SeqFile):
+    """
+    A sequence read on demand through `fetch(start, length)`, keeping the
+    `max_windows` most recently used windows of `window_size` bases in
+    memory. Gets work as for any `SeqFile` (including reverse complement).
+    """
+
+    def __init__(
+        self, file, length, fetch, revcomp=False, window_size=DEFAULT_WINDOW_SIZE, max_windows=DEFAULT_MAX_WINDOWS
+    ):
+        SeqFile.__init__(self, file, revcomp)
+        self.length = length
+        self.fetch = fetch
+        self.window_size = window_size
+        self.max_windows = max_windows
+        self.windows = OrderedDict()
+
+    def close(self):
+        self.windows.clear()
+        if self.file is not None:
+            SeqFile.close(self)
+
+    def raw_fetch(self, start, length):
+        size = self.window_size
+        end = start + length
+        texts = []
+        for w in range(start // size, (end - 1) // size + 1):
+            text = self.window(w)
+            texts.append(text[max(start - w * size, 0) : end - w * size])
+        return "".join(texts)
+
+    def window(self, w):
+        text = self.windows.get(w)
+        if text is not None:
+            self.windows.move_to_end(w)
+            return text
+        start = w * self.window_size
+        text = self.fetch(start, min(self.window_size, self.length - start))
+        self.windows[w] = text
+        if len(self.windows) > self.max_windows:
+            self.windows.popitem(last=False)
+        return text
+
+
 class ReaderIter:
     def __init__(self, reader):
         self.reader = reader
@@ -607,6 +720,23 @@ def rc_or_nothing(strand):
         return ""
 
 
+def split_twobit_filename(filename):
+    """
+    Split "file.2bit", "file.2bit:name" or "file.2bit/name" into the 2bit
+    filename and the sequence name (None if not given), returns (None, None)
+    for other files.
+    """
+    ix = filename.rfind(".2bit")
+    if ix == -1:
+        return None, None
+    rest = filename[ix + 5 :]
+    if rest == "":
+        return filename, None
+    if rest[0] in ":/" and len(rest) > 1:
+        return filename[: ix + 5], rest[1:]
+    return None, None
+
+
 def do_path_subs(path, path_subs):
     for prefix, replacement in path_subs:
         if path.startswith(prefix):
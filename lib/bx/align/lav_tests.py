@@ -2,9 +2,14 @@
 Tests for `bx.align.lav`.
 """
 
+import os
+import shutil
+import struct
+import tempfile
 import unittest
 
 import bx.align.lav as lav
+import bx.seq
 
 test_lav = "test_data/lav_tests/apple_orange.lav"
 
@@ -62,6 +67,62 @@ class lavTestCase(unittest.TestCase):
 
         reader.close()
 
+    def testWindows(self):
+        expected = [str(a) for a in lav.Reader(open(test_lav))]
+        reader = lav.Reader(open(test_lav), window_size=7, max_windows=3)
+        assert [str(a) for a in reader] == expected
+        assert len(reader.seq2_file.windows) == 3
+        reader.close()
+
+    def testTwoBit(self):
+        expected = [str(a).replace("lav_tests.orange", "fruit.orange") for a in lav.Reader(open(test_lav))]
+        tmpdir = tempfile.mkdtemp()
+        try:
+            seqs = {}
+            for name, fname in [("apple", "apple.fa"), ("orange", "orange.nib")]:
+                with open(os.path.join("test_data/lav_tests", fname), "rb") as f:
+                    seq = bx.seq.seq_file(f)
+                    seqs[name] = seq.get(0, seq.length)
+            twobit_fname = os.path.join(tmpdir, "fruit.2bit")
+            write_twobit(twobit_fname, seqs)
+            with open(test_lav) as f:
+                text = f.read()
+            # apple is found by header, orange by name in the path
+            text = text.replace("test_data/lav_tests/apple.fa", twobit_fname)
+            text = text.replace("test_data/lav_tests/orange.nib", twobit_fname + ":orange")
+            lav_fname = os.path.join(tmpdir, "fruit.lav")
+            with open(lav_fname, "w") as f:
+                f.write(text)
+            reader = lav.Reader(open(lav_fname), window_size=16, max_windows=2)
+            alignments = [str(a).replace("fruit.apple", "apple") for a in reader]
+            assert alignments == expected
+            assert len(reader.twobit_files) == 1
+            reader.close()
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+def write_twobit(fname, seqs):
+    """write a 2bit file for upper case ACGT sequences"""
+    codes = {"T": 0, "C": 1, "A": 2, "G": 3}
+    header = struct.pack("<IIII", 0x1A412743, 0, len(seqs), 0)
+    index_size = sum(5 + len(name) for name in seqs)
+    records = []
+    offset = len(header) + index_size
+    index = b""
+    for name, text in seqs.items():
+        index += struct.pack("<B", len(name)) + name.encode() + struct.pack("<I", offset)
+        text += "T" * (-len(text) % 4)
+        packed = bytes(
+            (codes[text[i]] << 6) | (codes[text[i + 1]] << 4) | (codes[text[i + 2]] << 2) | codes[text[i + 3]]
+            for i in range(0, len(text), 4)
+        )
+        record = struct.pack("<IIII", len(seqs[name]), 0, 0, 0) + packed
+        records.append(record)
+        offset += len(record)
+    with open(fname, "wb") as f:
+        f.write(header + index + b"".join(records))
+
 
 def check_component(c, src, start, size, strand, src_size, text):
     # ..print "\"%s\" == \"%s\"" % (c.src,src)
@@ -5,6 +5,9 @@ Support for the `MAF`_ multiple sequence alignment format used by `multiz`_.
 .. _multiz: http://www.bx.psu.edu/miller_lab/
 """
 
+import queue
+import threading
+import weakref
 from io import (
     StringIO,
     TextIOWrapper,
@@ -26,6 +29,10 @@ MAF_MAYBE_NEW_STATUS = "S"
 MAF_MAYBE_NEW_NESTED_STATUS = "s"
 MAF_MISSING_STATUS = "M"
 
+# Lazy 's' rows look for the coordinate fields in this many leading characters
+# before splitting the whole line
+S_ROW_PREFIX_LENGTH = 256
+
 
 class MAFIndexedAccess(interval_index_file.AbstractIndexedAccess):
     """
@@ -117,31 +124,126 @@ class Writer:
         self.file.write("\n")
 
     def write(self, alignment):
-        self.file.write("a score=" + str(alignment.score))
-        for key in alignment.attributes:
-            self.file.write(f" {key}={alignment.attributes[key]}")
-        self.file.write("\n")
-        # Components
-        rows = []
-        for c in alignment.components:
-            # "Empty component" generates an 'e' row
-            if c.empty:
-                rows.append(("e", c.src, str(c.start), str(c.size), c.strand, str(c.src_size), c.synteny_empty))
-                continue
-            # Regular component
-            rows.append(("s", c.src, str(c.start), str(c.size), c.strand, str(c.src_size), c.text))
-            # If component has quality, write a q row
-            if c.quality is not None:
-                rows.append(("q", c.src, "", "", "", "", c.quality))
-            # If component has synteny follow up with an 'i' row
-            if c.synteny_left and c.synteny_right:
-                rows.append(("i", c.src, "", "", "", "", " ".join(map(str, c.synteny_left + c.synteny_right))))
-        self.file.write(format_tabular(rows, "llrrrrl"))
-        self.file.write("\n")
+        self.file.write(format_block(alignment))
+
+    def close(self):
+        self.file.close()
+
+
+class BufferedWriter(Writer):
+    """
+    A `Writer` that accumulates formatted blocks and passes them to the
+    underlying file in large chunks of roughly `buffer_size` characters.
+
+    If `threaded` is true the chunks are written by a background thread, so
+    formatting of the following blocks overlaps with the I/O. The output is
+    identical to that of `Writer`, but only complete once `flush` or `close`
+    has been called.
+    """
+
+    def __init__(self, file, attributes=None, buffer_size=1024 * 1024, threaded=False):
+        super().__init__(file, attributes)
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.thread = None
+        self.error = None
+        if threaded:
+            self.queue = queue.Queue(maxsize=4)
+            self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+            self.thread.start()
+
+    def write(self, alignment):
+        block = format_block(alignment)
+        self.buffer.append(block)
+        self.buffered += len(block)
+        if self.buffered >= self.buffer_size:
+            self._flush_buffer()
+
+    def flush(self):
+        """Pass all buffered blocks to the underlying file and flush it"""
+        self._flush_buffer()
+        if self.thread is not None:
+            self.queue.join()
+            self._check_error()
+        self.file.flush()
 
     def close(self):
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
         self.file.close()
 
+    def _flush_buffer(self):
+        if not self.buffer:
+            return
+        chunk = "".join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        if self.thread is not None:
+            self._check_error()
+            self.queue.put(chunk)
+        else:
+            self.file.write(chunk)
+
+    def _write_chunks(self):
+        while True:
+            chunk = self.queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self.error is None:
+                    self.file.write(chunk)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+class LazyComponent(Component):
+    """
+    A `Component` read from an 's' row whose text is not copied out of the
+    row until it is first accessed. The component keeps the row and the
+    offsets of its text in it, so code that only looks at coordinates never
+    pays for building the text. Finding the coordinates costs about as much
+    as splitting a short row, so this only pays off for blocks with long
+    rows.
+    """
+
+    def __init__(self, line, text_start, text_end, src, start, size, strand, src_size):
+        super().__init__(src, start, size, strand, src_size, None)
+        self._line = line
+        self._text_start = text_start
+        self._text_end = text_end
+
+    def get_text(self):
+        if self._line is not None:
+            self._text = self._line[self._text_start : self._text_end]
+            self._line = None
+        return self._text
+
+    def set_text(self, text):
+        self._text = text
+        self._line = None
+
+    text = property(fget=get_text, fset=set_text)
+
+    @property
+    def text_size(self):
+        """Length of the text, without materializing it"""
+        if self._line is not None:
+            return self._text_end - self._text_start
+        elif self._text is not None:
+            return len(self._text)
+        return 0
+
 
 # ---- Helper methods -------------------------------------------------------
 
@@ -150,11 +252,13 @@ def from_string(string, **kwargs):
     return read_next_maf(StringIO(string), **kwargs)
 
 
-def read_next_maf(file, species_to_lengths=None, parse_e_rows=False):
+def read_next_maf(file, species_to_lengths=None, parse_e_rows=False, lazy_text=False):
     """
     Read the next MAF block from `file` and return as an `Alignment`
     instance. If `parse_e_rows` is true, empty components will be created
-    when e rows are encountered.
+    when e rows are encountered. If `lazy_text` is true, 's' rows produce
+    `LazyComponent` instances whose text is only built when accessed, from
+    the row it was read from.
     """
     alignment = Alignment(species_to_lengths=species_to_lengths)
     # Attributes line
@@ -179,6 +283,19 @@ def read_next_maf(file, species_to_lengths=None, parse_e_rows=False):
             break
         if line.isspace():
             break
+        # Lazy 's' rows only split the coordinate fields
+        if lazy_text:
+            component = parse_lazy_component(line)
+            if component is not None:
+                component._alignment = weakref.ref(alignment)
+                alignment.components.append(component)
+                text_size = component._text_end - component._text_start
+                if alignment.text_size == 0:
+                    alignment.text_size = text_size
+                elif alignment.text_size != text_size:
+                    raise Exception("Components must have same text length")
+                last_component = component
+                continue
         # Parse row
         fields = line.split()
         if fields[0] == "s":
@@ -221,10 +338,92 @@ def read_next_maf(file, species_to_lengths=None, parse_e_rows=False):
             assert fields[1] == last_component.src, "'q' row does not follow matching 's' row"
             # TODO: Should convert this to an integer array?
             last_component.quality = fields[2]
-
     return alignment
 
 
+def parse_lazy_component(line):
+    """
+    Build a `LazyComponent` from an 's' row, or return None if `line` is not
+    an 's' row with text.
+    """
+    if not line.startswith("s"):
+        return None
+    # Usually the coordinates are all in the first few characters and only
+    # those are split, the remainder of the split starts at the text
+    head = line[:S_ROW_PREFIX_LENGTH]
+    fields = head.split(None, 6)
+    if len(fields) < 7:
+        head = line
+        fields = line.split(None, 6)
+        if len(fields) < 7:
+            return None
+    if fields[0] != "s":
+        return None
+    text_start = len(head) - len(fields[6])
+    text_end = len(line)
+    while text_end > text_start and line[text_end - 1].isspace():
+        text_end -= 1
+    return LazyComponent(
+        line, text_start, text_end, fields[1], int(fields[2]), int(fields[3]), fields[4], int(fields[5])
+    )
+
+
+def shard_offsets(file, nshards):
+    """
+    Split the MAF file `file` (opened in binary mode) into at most `nshards`
+    `(start, end)` byte ranges, each starting at the beginning of a block.
+    """
+    size = file.seek(0, 2)
+    starts = []
+    for i in range(nshards):
+        file.seek(size * i // nshards)
+        if i > 0:
+            # Skip the (probably partial) line we landed in
+            file.readline()
+        while True:
+            pos = file.tell()
+            line = file.readline()
+            if not line:
+                pos = size
+                break
+            if line.startswith(b"a"):
+                break
+        if not starts or pos > starts[-1]:
+            starts.append(pos)
+    starts = [start for start in starts if start < size]
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_shard(shard):
+    """
+    Yield the blocks of a `(filename, start, end, kwargs)` byte range as
+    created by `shard_offsets`.
+    """
+    filename, start, end, kwargs = shard
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = StringIO(f.read(end - start).decode("ascii"))
+    while True:
+        block = read_next_maf(data, **kwargs)
+        if block is None:
+            break
+        yield block
+
+
+def read_indexed_shard(shard):
+    """
+    Yield the blocks at the file offsets of an indexed MAF given by a
+    `(filename, index_filename, offsets, kwargs)` shard.
+    """
+    filename, index_filename, offsets, kwargs = shard
+    index = MAFIndexedAccess(filename, index_filename, keep_open=True, **kwargs)
+    try:
+        for offset in offsets:
+            yield index.get_at_offset(offset)
+    finally:
+        index.close()
+
+
 def readline(file, skip_blank=False):
     """Read a line from provided file, skipping any blank or comment lines"""
     while True:
@@ -244,20 +443,32 @@ def parse_attributes(fields):
     return attributes
 
 
+def format_block(alignment):
+    """Return the text of `alignment` as a MAF block, including the blank line that ends it"""
+    attributes = "".join(f" {key}={value}" for key, value in alignment.attributes.items())
+    rows = []
+    for c in alignment.components:
+        # "Empty component" generates an 'e' row
+        if c.empty:
+            rows.append(("e", c.src, str(c.start), str(c.size), c.strand, str(c.src_size), c.synteny_empty))
+            continue
+        # Regular component
+        rows.append(("s", c.src, str(c.start), str(c.size), c.strand, str(c.src_size), c.text))
+        # If component has quality, write a q row
+        if c.quality is not None:
+            rows.append(("q", c.src, "", "", "", "", c.quality))
+        # If component has synteny follow up with an 'i' row
+        if c.synteny_left and c.synteny_right:
+            rows.append(("i", c.src, "", "", "", "", " ".join(map(str, c.synteny_left + c.synteny_right))))
+    return f"a score={alignment.score}{attributes}\n{format_tabular(rows, 'llrrrrl')}\n"
+
+
 def format_tabular(rows, align=None):
     if len(rows) == 0:
         return ""
-    lengths = [len(col) for col in rows[0]]
-    for row in rows[1:]:
-        for i in range(0, len(row)):
-            lengths[i] = max(lengths[i], len(row[i]))
-    rval = ""
-    for row in rows:
-        for i in range(0, len(row)):
-            if align and align[i] == "l":
-                rval += row[i].ljust(lengths[i])
-            else:
-                rval += row[i].rjust(lengths[i])
-            rval += " "
-        rval += "\n"
-    return rval
+    ncols = len(rows[0])
+    lengths = [max(len(row[i]) for row in rows) for i in range(ncols)]
+    justify = [str.ljust if align and align[i] == "l" else str.rjust for i in range(ncols)]
+    lines = [" ".join([just(field, length) for just, field, length in zip(justify, row, lengths)]) for row in rows]
+    lines.append("")
+    return " \n".join(lines)
@@ -128,6 +128,22 @@ s horse_hoxa 120 10 -   98892 ACAATTGCT
 """  # noqa: W291
 
 
+def test_buffered_writer():
+    with open("test_data/maf_tests/mm8_chr7_tiny.maf") as f:
+        blocks = list(maf.Reader(f, parse_e_rows=True))
+    expected = StringIO()
+    writer = maf.Writer(expected, {"scoring": "foobar"})
+    for block in blocks:
+        writer.write(block)
+    for threaded in (False, True):
+        val = StringIO()
+        writer = maf.BufferedWriter(val, {"scoring": "foobar"}, buffer_size=4096, threaded=threaded)
+        for block in blocks:
+            writer.write(block)
+        writer.flush()
+        assert val.getvalue() == expected.getvalue()
+
+
 def test_slice():
     b = complex_maf.slice_by_component(0, 101, 105)
 
@@ -293,6 +309,38 @@ e mm7.chr6                28091695 3290 - 149646834 I
     assert actual == expected
 
 
+def test_lazy_text():
+    for maf_text in (test_maf, test_maf_2, test_maf_3):
+        eager = maf.Reader(StringIO(maf_text), parse_e_rows=True)
+        lazy = maf.Reader(StringIO(maf_text), parse_e_rows=True, lazy_text=True)
+        for a, b in zip(eager, lazy):
+            assert a.text_size == b.text_size
+            # components of different classes do not compare equal
+            assert str(a) == str(b)
+
+    reader = maf.Reader(StringIO(test_maf), lazy_text=True)
+    a = next(reader)
+    c = a.components[0]
+    assert isinstance(c, maf.LazyComponent)
+    assert c.text_size == 9
+    assert c.end == 108
+    assert c._line is not None
+    assert c.text == "ACA-TTACT"
+    assert c._line is None
+    assert a.components[1].text == "ACAATTGCT"
+    c.text = "ACAGTTACT"
+    assert c.text == "ACAGTTACT"
+
+    # coordinates past the first characters of the row, and rows without text
+    row = "s " + "x" * 300 + ".chr1 10 3 + 100 AC-G  \n"
+    c = maf.parse_lazy_component(row)
+    assert (c.src, c.start, c.size, c.strand, c.src_size) == ("x" * 300 + ".chr1", 10, 3, "+", 100)
+    assert c.text_size == 4
+    assert c.text == "AC-G"
+    assert maf.parse_lazy_component("s hg18.chr1 10 3 + 100\n") is None
+    assert maf.parse_lazy_component("e hg18.chr1 10 3 + 100 I\n") is None
+
+
 def check_component(c, src, start, size, strand, src_size, text):
     assert c.src == src
     assert c.start == start
@@ -300,3 +348,17 @@ def check_component(c, src, start, size, strand, src_size, text):
     assert c.strand == strand
     assert c.src_size == src_size
     assert c.text == text
+
+
+def test_shard_offsets():
+    maf_fname = "test_data/maf_tests/mm8_chr7_tiny.maf"
+    with open(maf_fname) as f:
+        expected = list(maf.Reader(f))
+    with open(maf_fname, "rb") as f:
+        for nshards in (1, 2, 5, 1000):
+            shards = maf.shard_offsets(f, nshards)
+            assert 0 < len(shards) <= nshards
+            blocks = []
+            for start, end in shards:
+                blocks.extend(maf.read_shard((maf_fname, start, end, {})))
+            assert blocks == expected
@@ -115,3 +115,62 @@ def remove_gaps( sp, cpglist ):
         if sp[item] == '-':
             cpglist.remove(item)
     return cpglist
+
+# Kinds of columns found by `mask_columns_block`, as `list_cpg`,
+# `list_cpg_restricted` and `list_non_cpg` find them
+CPG = 0
+CPG_RESTRICTED = 1
+NON_CPG = 2
+
+cdef inline bint is_c( unsigned char ch ):
+    return ch == b'C' or ch == b'c'
+
+cdef inline bint is_g( unsigned char ch ):
+    return ch == b'G' or ch == b'g'
+
+def mask_columns_block( unsigned char[:, ::1] rows, int kind, unsigned char mask ):
+    """
+    Mask the CpG (or non-CpG, see `kind`) columns of an alignment block given
+    as a matrix of characters with one row per component. Columns are
+    chosen from the first two rows, without regard to case, and replaced by
+    `mask` in every row that does not have a gap there. Returns the number
+    of columns found.
+    """
+    cdef Py_ssize_t nrows = rows.shape[0], n = rows.shape[1], i, j
+    cdef int count = 0
+    cdef bint hit, non_cpg
+    cdef unsigned char[:] a, b
+    if nrows < 2 or n < 2:
+        return 0
+    a = rows[0]
+    b = rows[1]
+    columns = bytearray( n )
+    cdef unsigned char[:] found = columns
+    # the last column is never a site, there is no following base
+    for i in range( n - 1 ):
+        if i == 0:
+            non_cpg = True
+        else:
+            non_cpg = ( not is_c( a[i - 1] ) and not is_c( b[i - 1] ) and
+                        not is_g( a[i + 1] ) and not is_g( b[i + 1] ) )
+        if kind == NON_CPG:
+            hit = non_cpg
+        elif kind == CPG_RESTRICTED:
+            hit = not non_cpg
+        elif i == 0:
+            hit = False
+        else:
+            hit = ( ( not is_c( a[i - 1] ) and not is_c( b[i - 1] ) and
+                      is_g( a[i + 1] ) and is_g( b[i + 1] ) and
+                      ( is_c( a[i] ) or is_c( b[i] ) ) ) or
+                    ( not is_g( a[i + 1] ) and not is_g( b[i + 1] ) and
+                      is_c( a[i - 1] ) and is_c( b[i - 1] ) and
+                      ( is_g( a[i] ) or is_g( b[i] ) ) ) )
+        if hit:
+            found[i] = 1
+            count += 1
+    for j in range( nrows ):
+        for i in range( n - 1 ):
+            if found[i] and rows[j, i] != b'-':
+                rows[j, i] = mask
+    return count
@@ -14,6 +14,16 @@ class Masker(Filter):
         self.total = 0
         Exception("Abstract class")
 
+    def merge(self, other):
+        """Add the counts of a copy of this masker used by a `ParallelPipeline` worker"""
+        self.masked += other.masked
+        self.total += other.total
+
+    def reset(self):
+        """Clear the counts, as done for the copy of each `ParallelPipeline` worker"""
+        self.masked = 0
+        self.total = 0
+
 
 class MaskPipeline(Pipeline):
     """
@@ -2,11 +2,19 @@
 Support for masking potential CpG sites in *pairwise* alignments.
 """
 
+from bx.align.core import (
+    get_text_matrix,
+    set_text_matrix,
+)
 from bx.align.sitemask import Masker
 from ._cpg import (
+    CPG,
+    CPG_RESTRICTED,
     list_cpg,
     list_cpg_restricted,
     list_non_cpg,
+    mask_columns_block,
+    NON_CPG,
 )
 
 
@@ -22,13 +30,8 @@ class Restricted(Masker):
             return block
         if len(block.components) < 2:
             return
-        cpglist = list_cpg_restricted(block.components[0].text.upper(), block.components[1].text.upper())
-
-        # now we have a fast list of CpG columns, iterate/mask
-        self.masked += len(cpglist)
+        self.masked += mask_block(block, CPG_RESTRICTED, self.mask)
         self.total += len(block.components[0].text)
-        for component in block.components:
-            component.text = mask_columns(cpglist, component.text, self.mask)
 
         return block
 
@@ -47,12 +50,8 @@ class Inclusive(Masker):
             return block
         if len(block.components) < 2:
             return
-        cpglist = list_cpg(block.components[0].text.upper(), block.components[1].text.upper())
-
-        self.masked += len(cpglist)
+        self.masked += mask_block(block, CPG, self.mask)
         self.total += len(block.components[0].text)
-        for component in block.components:
-            component.text = mask_columns(cpglist, component.text, self.mask)
 
         return block
 
@@ -71,17 +70,32 @@ class nonCpG(Masker):
             return block
         if len(block.components) < 2:
             return
-        noncpglist = list_non_cpg(block.components[0].text.upper(), block.components[1].text.upper())
-
-        # now we have a fast list of non-CpG columns, iterate/mask
-        self.masked += len(noncpglist)
+        self.masked += mask_block(block, NON_CPG, self.mask)
         self.total += len(block.components[0].text)
-        for component in block.components:
-            component.text = mask_columns(noncpglist, component.text, self.mask)
 
         return block
 
 
+def mask_block(block, kind, mask):
+    """
+    Mask the columns of `block` of the given kind (`CPG`, `CPG_RESTRICTED`
+    or `NON_CPG`) in every component at once, returns the number of columns
+    found. Columns are chosen from the first two components.
+    """
+    texts = [component.text for component in block.components]
+    if len(mask) != 1:
+        # a longer mask changes the text length, fall back to the list of columns
+        find = {CPG: list_cpg, CPG_RESTRICTED: list_cpg_restricted, NON_CPG: list_non_cpg}[kind]
+        masklist = find(texts[0].upper(), texts[1].upper())
+        for component in block.components:
+            component.text = mask_columns(masklist, component.text, mask)
+        return len(masklist)
+    rows = get_text_matrix(block.components)
+    count = mask_columns_block(rows, kind, ord(mask))
+    set_text_matrix(block.components, rows)
+    return count
+
+
 def mask_columns(masklist, text, mask):
     templist = []
     for position in masklist:
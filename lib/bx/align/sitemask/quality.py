@@ -3,10 +3,25 @@ Support for masking out sites in alignments based on sequence quality. Both
 simple masking of regions below some threshold and masking using the
 neighborhood quality standard (NQS) are supported. Uses sequence quality
 values stored in a `bx.binned_array.FileBinnedArray`.
+
+Quality values for a whole component are fetched at once and all maskers
+share one `bx.binned_array.BinCache` of decompressed bins, available as
+their `cache` attribute, whose `stats()` show how well it is sized.
 """
 
+import numpy
+
+from bx.align.core import (
+    get_text_matrix,
+    set_text_matrix,
+)
 from bx.align.sitemask import Masker
-from bx.binned_array import FileBinnedArray
+from bx.binned_array import (
+    BinCache,
+    FileBinnedArray,
+)
+
+GAP = ord("-")
 
 
 # This class implements simple rules for masking quality, if base <
@@ -19,7 +34,8 @@ class Simple(Masker):
     # mask: mask character (default is '?')
     # minqual: minimum quality
     # cache: optional, but sets the number of megabytes allowed in cache per quality masked species
-    def __init__(self, qualfiles=None, qualspecies=None, minqual=None, mask="?", cache=100):
+    # cache_bytes: optional, total number of bytes allowed in cache (overrides cache)
+    def __init__(self, qualfiles=None, qualspecies=None, minqual=None, mask="?", cache=100, cache_bytes=None):
         if not qualfiles:
             raise Exception("No quality files.")
         if not qualspecies:
@@ -34,42 +50,16 @@ class Simple(Masker):
 
         self.qualfiles = qualfiles
         self.qualspecies = qualspecies
-        self.cache = cache * 2  # typical bin size is 512K
+        if cache_bytes is None:
+            cache_bytes = cache * 1024 * 1024 * len(qualfiles)
+        self.cache = BinCache(cache_bytes)
         # load quality files into FileBinnedArray
-        self.qualities = {}
-        for species, qualfile in self.qualfiles.items():
-            specdict = {}
-            for chrom in self.qualspecies[species]:
-                specdict[chrom] = FileBinnedArray(
-                    open(qualfile + "." + chrom + ".bqv", "rb"), cache=self.cache / len(qualfiles)
-                )
-            self.qualities[species] = specdict
+        self.qualities = open_qualities(qualfiles, qualspecies, self.cache)
 
     def __call__(self, block):
         if not block:
             return
-        for qualspec in self.qualities:
-            comp = block.get_component_by_src_start(qualspec)
-            if not comp:
-                continue
-            chrom = comp.src.split(".")[1]
-            start, end = comp.get_forward_strand_start(), comp.get_forward_strand_end()
-            # get quality slice, for + strand
-            qual = self.qualities[qualspec][chrom][start:end]
-            x = 0
-            while start + x < end:
-                self.total += 1
-                # got the column in the alignment for this particular base
-                if qual[x] < self.minqual:
-                    col = comp.coord_to_col(start + x)
-                    self.masked += 1
-                    for component in block.components:
-                        if component.text[col] != "-":
-                            component.text = (
-                                component.text[0:col] + self.mask + component.text[col + 1 : len(component.text)]
-                            )
-                # iterate through quality
-                x += 1
+        mask_low_quality(self, block)
         return block
 
 
@@ -82,7 +72,8 @@ class NQS(Masker):
     # minqual: minimum quality
     # neighborqual: neighborhood minimum quality (bases within 5 bps are masked)
     # cache: optional, but sets the number of megabytes allowed in cache per quality masked species
-    def __init__(self, qualfiles=None, qualspecies=None, minqual=None, mask="?", cache=100):
+    # cache_bytes: optional, total number of bytes allowed in cache (overrides cache)
+    def __init__(self, qualfiles=None, qualspecies=None, minqual=None, mask="?", cache=100, cache_bytes=None):
         if not qualfiles:
             raise Exception("No quality files.")
         if not qualspecies:
@@ -97,38 +88,61 @@ class NQS(Masker):
 
         self.qualfiles = qualfiles
         self.qualspecies = qualspecies
-        self.cache = cache * 2  # typical bin size is 512K
+        if cache_bytes is None:
+            cache_bytes = cache * 1024 * 1024 * len(qualfiles)
+        self.cache = BinCache(cache_bytes)
         # load quality files into FileBinnedArray
-        self.qualities = {}
-        for species, qualfile in self.qualfiles.items():
-            specdict = {}
-            for chrom in self.qualspecies[species]:
-                specdict[chrom] = FileBinnedArray(
-                    open(qualfile + "." + chrom + ".bqv", "rb"), cache=self.cache / len(qualfiles)
-                )
-            self.qualities[species] = specdict
+        self.qualities = open_qualities(qualfiles, qualspecies, self.cache)
 
     def __call__(self, block):
         if not block:
             return
-        for qualspec in self.qualities:
-            comp = block.get_component_by_src_start(qualspec)
-            chrom = comp.src.split(".")[1]
-            start, end = comp.get_forward_strand_start(), comp.get_forward_strand_end()
-            # get quality slice, for + strand
-            qual = self.qualities[qualspec][chrom][start:end]
-            x = 0
-            while start + x < end:
-                self.total += 1
-                # got the column in the alignment for this particular base
-                if qual[x] < self.minqual:
-                    col = comp.coord_to_col(start + x)
-                    self.masked += 1
-                    for component in block.components:
-                        if component.text[col] != "-":
-                            component.text = (
-                                component.text[0:col] + self.mask + component.text[col + 1 : len(component.text)]
-                            )
-                # iterate through quality
-                x += 1
+        mask_low_quality(self, block)
         return block
+
+
+def open_qualities(qualfiles, qualspecies, cache):
+    """Open the quality file of each chromosome of each species, sharing `cache`"""
+    qualities = {}
+    for species, qualfile in qualfiles.items():
+        specdict = {}
+        for chrom in qualspecies[species]:
+            specdict[chrom] = FileBinnedArray(open(qualfile + "." + chrom + ".bqv", "rb"), cache=cache)
+        qualities[species] = specdict
+    return qualities
+
+
+def mask_low_quality(masker, block):
+    """
+    Mask the columns of `block` where a component of a quality masked species
+    has a base with quality below `masker.minqual`, in every component that
+    does not have a gap there.
+    """
+    columns = []
+    for qualspec in masker.qualities:
+        comp = block.get_component_by_src_start(qualspec)
+        if not comp:
+            continue
+        chrom = comp.src.split(".")[1]
+        start, end = comp.get_forward_strand_start(), comp.get_forward_strand_end()
+        # get quality slice, for + strand
+        low = numpy.flatnonzero(masker.qualities[qualspec][chrom].get_range(start, end) < masker.minqual)
+        masker.total += end - start
+        masker.masked += len(low)
+        if len(low) == 0:
+            continue
+        # column of each base, in + strand order
+        cols = numpy.flatnonzero(numpy.frombuffer(comp.text.encode("ascii"), dtype=numpy.uint8) != GAP)
+        if comp.strand == "-":
+            cols = cols[::-1]
+        columns.append(cols[low])
+    if columns:
+        mask_columns(block, numpy.concatenate(columns), masker.mask)
+
+
+def mask_columns(block, columns, mask):
+    """Replace the non-gap characters of all components in `columns` with `mask`"""
+    rows = get_text_matrix(block.components)
+    selected = rows[:, columns]
+    rows[:, columns] = numpy.where(selected == GAP, selected, ord(mask))
+    set_text_matrix(block.components, rows)
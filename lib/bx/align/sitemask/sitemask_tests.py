@@ -2,11 +2,25 @@
 Tests for `bx.align.maf.sitemask`.
 """
 
+import os
+import random
+import shutil
 import tempfile
 from io import StringIO
 
+import numpy
+
 import bx.align.maf
-from bx.align.sitemask import cpg
+from bx.align import (
+    Alignment,
+    Component,
+)
+from bx.align.sitemask import (
+    cpg,
+    quality,
+)
+from bx.binned_array import BinnedArray
+from bx.filter import ParallelPipeline
 
 test_maf_cpg = """##maf version=1 scoring=none
 a score=0
@@ -82,3 +96,117 @@ def test_non_cpg():
             continue
         assert noncpg_result[j] == ",".join(line.split())
         j += 1
+
+
+def test_parallel_pipeline():
+    maf_fname = "test_data/maf_tests/mm8_chr7_tiny.maf"
+    expected = StringIO()
+    with open(maf_fname) as f:
+        reader = bx.align.maf.Reader(f)
+        writer = bx.align.maf.Writer(expected, reader.attributes)
+        cpgfilter = cpg.Restricted(mask="#")
+        cpgfilter.run(reader, writer.write)
+
+    pipeline = ParallelPipeline(processes=2)
+    pipeline.append(cpg.Restricted(mask="#"))
+    # counts add up over repeated runs
+    for runs, nshards in enumerate((1, 3, 4, 100), 1):
+        out = StringIO()
+        pipeline.run_maf(maf_fname, out, nshards=nshards)
+        assert out.getvalue() == expected.getvalue()
+        assert pipeline[0].masked == runs * cpgfilter.masked
+        assert pipeline[0].total == runs * cpgfilter.total
+
+
+def test_parallel_pipeline_indexed():
+    maf_fname = "test_data/maf_tests/mm8_chr7_tiny.maf"
+    expected = StringIO()
+    with open(maf_fname) as f:
+        cpgfilter = cpg.Restricted(mask="#")
+        cpgfilter.run(bx.align.maf.Reader(f), bx.align.maf.Writer(expected).write)
+    pipeline = ParallelPipeline(processes=2)
+    pipeline.append(cpg.Restricted(mask="#"))
+    # overlapping regions, and a block spanning the gap between the last two
+    regions = [
+        ("mm8.chr7", 80082334, 80082500),
+        ("mm8.chr7", 80082400, 80082600),
+        ("mm8.chr7", 80082700, 80082720),
+        ("mm8.chr7", 80082760, 80083200),
+    ]
+    out = StringIO()
+    pipeline.run_maf_indexed(maf_fname, regions, out)
+    assert out.getvalue() == expected.getvalue()
+    assert pipeline[0].masked == cpgfilter.masked
+    assert pipeline[0].total == cpgfilter.total
+
+
+def test_mask_block():
+    # the block kernel matches masking the columns listed for the first pair
+    random.seed(11)
+    finders = [
+        (cpg.CPG, cpg.list_cpg),
+        (cpg.CPG_RESTRICTED, cpg.list_cpg_restricted),
+        (cpg.NON_CPG, cpg.list_non_cpg),
+    ]
+    for _ in range(200):
+        size = random.randint(0, 40)
+        texts = ["".join(random.choice("ACGTcg--N") for _ in range(size)) for _ in range(random.randint(2, 6))]
+        for kind, find in finders:
+            block = Alignment()
+            for i, text in enumerate(texts):
+                block.add_component(Component(f"s{i}.chr1", 0, len(text) - text.count("-"), "+", 1000, text))
+            masklist = find(texts[0].upper(), texts[1].upper())
+            assert cpg.mask_block(block, kind, "#") == len(masklist)
+            assert [c.text for c in block.components] == [cpg.mask_columns(masklist, text, "#") for text in texts]
+
+
+def test_quality():
+    random.seed(5)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # random qualities for two species, in small bins
+        lengths = {"apple": {"chr1": 500}, "orange": {"chr2": 400}}
+        quals = {}
+        qualfiles = {}
+        for species, chroms in lengths.items():
+            for chrom, length in chroms.items():
+                quals[species] = numpy.array([random.randint(0, 40) for _ in range(length)], dtype="b")
+                binned = BinnedArray(bin_size=32, default=0, max_size=length, typecode="b")
+                for i, value in enumerate(quals[species]):
+                    binned[i] = value
+                with open(os.path.join(tmpdir, f"{species}.{chrom}.bqv"), "wb") as f:
+                    binned.to_file(f)
+            qualfiles[species] = os.path.join(tmpdir, species)
+        for masker_class in (quality.Simple, quality.NQS):
+            masker = masker_class(qualfiles, lengths, minqual=10, mask="#", cache_bytes=64)
+            total = masked = 0
+            for _ in range(20):
+                size = random.randint(1, 60)
+                texts = ["".join(random.choice("ACGT-") for _ in range(size)) for _ in range(3)]
+                block = Alignment(species_to_lengths={"pear": {"chr3": 1000}, **lengths})
+                for src, strand, text in zip(("apple.chr1", "orange.chr2", "pear.chr3"), "+-+", texts):
+                    block.add_component(
+                        Component(src, random.randint(0, 300), len(text) - text.count("-"), strand, text=text)
+                    )
+                # brute force
+                expected = [list(text) for text in texts]
+                for c in block.components[:2]:
+                    qual = quals[c.src.split(".")[0]]
+                    cols = [col for col, ch in enumerate(c.text) if ch != "-"]
+                    if c.strand == "-":
+                        cols.reverse()
+                    for pos, col in zip(range(c.forward_strand_start, c.forward_strand_end), cols):
+                        total += 1
+                        if qual[pos] < 10:
+                            masked += 1
+                            for row in expected:
+                                if row[col] != "-":
+                                    row[col] = "#"
+                masker(block)
+                assert [c.text for c in block.components] == ["".join(row) for row in expected]
+            assert (masker.total, masker.masked) == (total, masked)
+            stats = masker.cache.stats()
+            assert stats["evictions"] > 0
+            assert stats["nbytes"] <= 64
+    finally:
+        shutil.rmtree(tmpdir)
@@ -10,11 +10,14 @@ from .fuse import (
 )
 from .thread import get_components_for_species
 from .tile import (
+    BlockWindow,
     intervals_from_mask,
     tile_interval,
+    tile_intervals,
 )
 
 __all__ = [
+    "BlockWindow",
     "chop_list",
     "fuse",
     "fuse_list",
@@ -22,4 +25,5 @@ __all__ = [
     "get_components_for_species",
     "intervals_from_mask",
     "tile_interval",
+    "tile_intervals",
 ]
@@ -56,51 +56,76 @@ def fuse(m1, m2):
     s panTro1.chrUn_random 208115356 113 - 240967748 GTGCTAACTGACTGCTCCAGAGAAAACATCAATTCTGTTCATGTGCAGCTACTATTCATCAAGAAAGGGATTACAACTTCAGAAATGTGTTCAAAGTGTATCCATACTTTGAT
     <BLANKLINE>
     """
-    # Check if the blocks are adjacent and easily fusable
-    # return none if not.
-    if len(m1.components) != len(m2.components):
+    if not can_fuse(m1, m2):
         return None
+    return fuse_all([m1, m2])
+
+
+def can_fuse(m1, m2):
+    """
+    Return true if every component of `m2` directly follows the matching
+    component of `m1`.
+    """
+    if len(m1.components) != len(m2.components):
+        return False
     for c1, c2 in zip(m1.components, m2.components):
         if c1.src != c2.src:
-            return None
+            return False
         if c1.strand != c2.strand:
-            return None
+            return False
         if c1.end != c2.start:
-            return None
+            return False
         if c1.empty or c2.empty:
-            return None
-    # Try to fuse:
-    n = deepcopy(m1)
-    for c1, c2 in zip(n.components, m2.components):
-        c1.text += c2.text
-        c1.size += c2.size
+            return False
+    return True
+
+
+def fuse_all(mafs):
+    """
+    Fuse a list of blocks, each of which can be fused with the one before
+    it, into a single new block. The text of each row is joined once.
+    """
+    n = deepcopy(mafs[0])
+    if len(mafs) == 1:
+        return n
+    for i, c1 in enumerate(n.components):
+        c1.text = "".join(m.components[i].text for m in mafs)
+        c1.size = sum(m.components[i].size for m in mafs)
         # Propagate the synteny right
-        c1.synteny_right = c2.synteny_right
+        c1.synteny_right = mafs[-1].components[i].synteny_right
     n.text_size = len(n.components[0].text)
     return n
 
 
 class FusingAlignmentWriter:
     """
-    Wrapper for an alignment Writer which attempts to fuse adjacent blocks
+    Wrapper for an alignment Writer which attempts to fuse adjacent blocks.
+
+    Runs of fusable blocks are collected and fused once when the run ends,
+    so long runs do not repeatedly copy the growing block.
     """
 
     def __init__(self, maf_writer):
         self.maf_writer = maf_writer
-        self.last = None
+        self.pending = []
 
     def write(self, m):
-        if not self.last:
-            self.last = m
-        else:
-            fused = fuse(self.last, m)
-            if fused:
-                self.last = fused
-            else:
-                self.maf_writer.write(self.last)
-                self.last = m
+        if self.pending and not can_fuse(self.pending[-1], m):
+            self.flush_pending()
+        self.pending.append(m)
+
+    def write_all(self, mafs):
+        """Write every block from the iterable `mafs`, such as `thread` output"""
+        for m in mafs:
+            self.write(m)
+
+    def flush_pending(self):
+        if len(self.pending) == 1:
+            self.maf_writer.write(self.pending[0])
+        elif self.pending:
+            self.maf_writer.write(fuse_all(self.pending))
+        self.pending = []
 
     def close(self):
-        if self.last:
-            self.maf_writer.write(self.last)
+        self.flush_pending()
         self.maf_writer.close()
@@ -3,7 +3,14 @@ Tools for "threading" out specific species from alignments (removing other
 species and fixing alignment text).
 """
 
-from copy import deepcopy
+from bx.align import (
+    Alignment,
+    Component,
+    get_text_matrix,
+    set_text_matrix,
+)
+
+GAP = ord("-")
 
 
 def thread(mafs, species):
@@ -55,16 +62,46 @@ def thread(mafs, species):
 
     """
     for m in mafs:
-        new_maf = deepcopy(m)
-        new_components = get_components_for_species(new_maf, species)
-        if new_components:
-            new_maf.components = new_components
-            new_maf.score = 0.0
-            new_maf.text_size = len(new_components[0].text)
-            new_maf.remove_all_gap_columns()
+        new_maf = thread_alignment(m, species)
+        if new_maf is not None:
             yield new_maf
 
 
+def thread_alignment(alignment, species):
+    """
+    Return a new alignment containing only the components of `alignment`
+    for each species in `species` (in that order) with all gap columns
+    removed, or None if some species is missing. Only the selected
+    components are copied, `alignment` is not modified.
+    """
+    components = get_components_for_species(alignment, species)
+    if not components:
+        return None
+    new = Alignment(score=0.0, attributes=dict(alignment.attributes), species_to_lengths=alignment.species_to_lengths)
+    new_components = []
+    with_text = []
+    for c in components:
+        new_component = Component(c.src, c.start, c.size, c.strand, c._src_size, None)
+        new_component.quality = c.quality
+        new_component.synteny_left = c.synteny_left
+        new_component.synteny_right = c.synteny_right
+        new_component.synteny_empty = c.synteny_empty
+        new_component.empty = c.empty
+        if not c.empty and c.text is not None:
+            with_text.append((c, new_component))
+        new_components.append(new_component)
+    if with_text:
+        rows = get_text_matrix([c for c, _ in with_text])
+        keep = (rows != GAP).any(axis=0)
+        if not keep.all():
+            rows = rows[:, keep]
+        set_text_matrix([new_component for _, new_component in with_text], rows)
+    # added once their texts are set, so that the text size is known
+    for new_component in new_components:
+        new.add_component(new_component)
+    return new
+
+
 def get_components_for_species(alignment, species):
     """Return the component for each species in the list `species` or None"""
     # If the number of components in the alignment is less that the requested number
@@ -0,0 +1,58 @@
+"""
+Tests for `bx.align.tools.thread`.
+"""
+
+from copy import deepcopy
+from io import StringIO
+
+import bx.align.maf
+from bx.align.tools import (
+    fuse_list,
+    FusingAlignmentWriter,
+    get_components_for_species,
+)
+from bx.align.tools.thread import thread
+
+MAF_FNAME = "test_data/maf_tests/mm8_chr7_tiny.maf"
+
+
+def deepcopy_thread(mafs, species):
+    for m in mafs:
+        new_maf = deepcopy(m)
+        new_components = get_components_for_species(new_maf, species)
+        if new_components:
+            new_maf.components = new_components
+            new_maf.score = 0.0
+            new_maf.text_size = len(new_components[0].text)
+            new_maf.remove_all_gap_columns()
+            yield new_maf
+
+
+def test_thread_matches_deepcopy():
+    with open(MAF_FNAME) as f:
+        blocks = list(bx.align.maf.Reader(f))
+    original = [str(b) for b in blocks]
+    for species in (["mm8", "rn4"], ["hg18", "mm8", "panTro2"], ["mm8", "nosuch"]):
+        expected = list(deepcopy_thread(blocks, species))
+        actual = list(thread(blocks, species))
+        assert len(actual) == len(expected)
+        for a, b in zip(actual, expected):
+            assert a == b
+            assert a.text_size == b.text_size
+    # Input blocks are left untouched
+    assert [str(b) for b in blocks] == original
+
+
+def test_fusing_writer_stream():
+    with open(MAF_FNAME) as f:
+        blocks = list(bx.align.maf.Reader(f))
+    threaded = list(thread(blocks, ["mm8", "rn4"]))
+    expected = StringIO()
+    writer = bx.align.maf.Writer(expected)
+    for m in fuse_list(threaded):
+        writer.write(m)
+    actual = StringIO()
+    fusing_writer = FusingAlignmentWriter(bx.align.maf.Writer(actual))
+    fusing_writer.write_all(thread(blocks, ["mm8", "rn4"]))
+    fusing_writer.flush_pending()
+    assert actual.getvalue() == expected.getvalue()
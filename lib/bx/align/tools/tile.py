@@ -3,6 +3,67 @@ Tools for tiling / projecting alignments onto an interval of a sequence.
 """
 
 import bx.seq.nib
+from bx import interval_index_file
+
+
+class BlockWindow:
+    """
+    Wraps an indexed alignment file (`maf.Indexed`, `maf.MultiIndexed`, or
+    any other `interval_index_file` based access) and keeps the blocks
+    already read for the current reference sequence, so that queries over a
+    sorted stream of nearby intervals only parse each block once.
+
+    `get` returns the same blocks, in the same order, as the wrapped index.
+    Blocks are shared between queries and must not be modified in place.
+    Cached blocks are dropped when they end before the start of a query or
+    when the query moves to another sequence. If a query starts before the
+    previous one (the input is not sorted) all cached blocks are dropped, so
+    that for unsorted input only the blocks of the last query are kept.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        if isinstance(index, interval_index_file.AbstractMultiIndexedAccess):
+            self.accesses = index.indexes
+        elif isinstance(index, interval_index_file.AbstractIndexedAccess):
+            self.accesses = [index]
+        else:
+            self.accesses = None
+        self.src = None
+        self.start = None
+        self.blocks = {}
+        # Statistics
+        self.queries = 0
+        self.parsed = 0
+
+    def get(self, src, start, end):
+        self.queries += 1
+        if self.accesses is None:
+            blocks = self.index.get(src, start, end)
+            self.parsed += len(blocks)
+            return blocks
+        if src != self.src or start < self.start:
+            self.blocks = {}
+        else:
+            self.blocks = {key: entry for key, entry in self.blocks.items() if entry[0] > start}
+        self.src = src
+        self.start = start
+        rval = []
+        for i, access in enumerate(self.accesses):
+            for _val_start, val_end, offset in access.indexes.find(src, start, end):
+                key = (i, offset)
+                entry = self.blocks.get(key)
+                if entry is None:
+                    entry = self.blocks[key] = [val_end, access.get_at_offset(offset)]
+                    self.parsed += 1
+                elif val_end > entry[0]:
+                    entry[0] = val_end
+                rval.append(entry[1])
+        return rval
+
+    def close(self):
+        self.blocks = {}
+        self.index.close()
 
 
 def tile_interval(sources, index, ref_src, start, end, seq_db=None):
@@ -65,6 +126,19 @@ def tile_interval(sources, index, ref_src, start, end, seq_db=None):
     return ["".join(t) for t in tiled]
 
 
+def tile_intervals(sources, index, intervals, seq_db=None):
+    """
+    Tile maf blocks onto each `(ref_src, start, end)` of `intervals`, yielding
+    the same rows as `tile_interval` would for each of them. Blocks are read
+    through a `BlockWindow`, so when `intervals` are sorted each block is
+    parsed only once no matter how many intervals it overlaps.
+    """
+    if not isinstance(index, BlockWindow):
+        index = BlockWindow(index)
+    for ref_src, start, end in intervals:
+        yield tile_interval(sources, index, ref_src, start, end, seq_db=seq_db)
+
+
 def intervals_from_mask(mask):
     start = 0
     last = mask[0]
@@ -0,0 +1,43 @@
+"""
+Tests for `bx.align.tools.tile`.
+"""
+
+import bx.align.maf
+from bx.align.tools import (
+    BlockWindow,
+    tile_interval,
+    tile_intervals,
+)
+
+MAF_FNAME = "test_data/maf_tests/mm8_chr7_tiny.maf"
+SOURCES = ["mm8", "rn4", "hg18", "panTro2"]
+
+
+def test_tile_intervals():
+    intervals = [("mm8.chr7", start, start + 50) for start in range(80082300, 80083200, 30)]
+    index = bx.align.maf.Indexed(MAF_FNAME)
+    expected = [tile_interval(SOURCES, index, *interval) for interval in intervals]
+
+    window = BlockWindow(bx.align.maf.Indexed(MAF_FNAME))
+    assert list(tile_intervals(SOURCES, window, intervals)) == expected
+    assert window.queries == len(intervals)
+    # Each block is parsed only once
+    assert window.parsed == 8
+
+
+def test_block_window_get():
+    index = bx.align.maf.MultiIndexed([MAF_FNAME])
+    window = BlockWindow(bx.align.maf.MultiIndexed([MAF_FNAME]))
+    for start, end in [(80082300, 80082500), (80082400, 80082800), (80082300, 80082400), (80083100, 80083200)]:
+        assert window.get("mm8.chr7", start, end) == index.get("mm8.chr7", start, end)
+    assert window.get("mm8.chr1", 0, 100) == []
+
+
+def test_block_window_unsorted():
+    index = bx.align.maf.Indexed(MAF_FNAME)
+    window = BlockWindow(bx.align.maf.Indexed(MAF_FNAME))
+    for start in range(80083150, 80082300, -40):
+        blocks = window.get("mm8.chr7", start, start + 20)
+        assert blocks == index.get("mm8.chr7", start, start + 20)
+        # going backwards only the blocks of the last query are kept
+        assert len(window.blocks) == len(blocks)
@@ -8,8 +8,10 @@ pseudo-random acccess.
 read only access to an on disk binned array.
 """
 
+import itertools
 import math
 import sys
+from collections import OrderedDict
 from struct import (
     calcsize,
     pack,
@@ -19,6 +21,7 @@ from struct import (
 from numpy import (
     array,
     concatenate,
+    empty,
     frombuffer,
     nan,
     resize,
@@ -175,10 +178,59 @@ class BinnedArray:
             write_packed(f, ">2I", pos, size)
 
 
+class BinCache:
+    """
+    Least recently used cache of decompressed bins bounded by the number of
+    bytes held, which can be shared by several `FileBinnedArray` instances by
+    passing it as their `cache`. Counts of hits, misses and evictions are kept
+    to help choose a size.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bins = OrderedDict()
+        self.keys = itertools.count()
+
+    def new_key(self):
+        """A key identifying the bins of one array"""
+        return next(self.keys)
+
+    def get(self, key):
+        a = self.bins.get(key)
+        if a is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bins.move_to_end(key)
+        return a
+
+    def put(self, key, a):
+        self.bins[key] = a
+        self.nbytes += a.nbytes
+        # always keep the newest bin, even if it alone is over the limit
+        while self.nbytes > self.max_bytes and len(self.bins) > 1:
+            _, old = self.bins.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bins": len(self.bins),
+            "nbytes": self.nbytes,
+        }
+
+
 class FileBinnedArray:
     def __init__(self, f, cache=32):
-        # If cache=None, then everything is allowed to stay in memory,
-        # this is the default behavior.
+        # cache is the number of bins kept in memory, or a BinCache that
+        # can be shared with other arrays
         self.f = f
         M, V, max_size, bin_size, nbins = read_packed(f, ">5I")
         assert M == MAGIC
@@ -187,7 +239,13 @@ class FileBinnedArray:
         self.max_size = max_size
         self.bin_size = bin_size
         self.nbins = nbins
-        self.bins = LRUCache(size=cache)
+        if isinstance(cache, BinCache):
+            self.bin_cache = cache
+            self.cache_key = cache.new_key()
+            self.bins = None
+        else:
+            self.bin_cache = None
+            self.bins = LRUCache(size=cache)
         # Read typecode
         if V >= 1:
             self.typecode = (unpack("c", f.read(1))[0]).decode()
@@ -216,7 +274,7 @@ class FileBinnedArray:
     def get_bin_offset(self, index):
         return int(index // self.bin_size), int(index % self.bin_size)
 
-    def load_bin(self, index):
+    def read_bin(self, index):
         assert self.bin_pos[index] != 0
         self.f.seek(self.bin_pos[index])
         raw = self.f.read(self.bin_sizes[index])
@@ -224,44 +282,48 @@ class FileBinnedArray:
         if platform_is_little_endian:
             a = a.byteswap()
         assert len(a) == self.bin_size
-        self.bins[index] = a
+        return a
+
+    def load_bin(self, index):
+        self.bins[index] = self.read_bin(index)
+
+    def get_bin(self, index):
+        """Values of bin `index`, None if it only holds the default value"""
+        if self.bin_pos[index] == 0:
+            return None
+        if self.bin_cache is not None:
+            key = (self.cache_key, index)
+            a = self.bin_cache.get(key)
+            if a is None:
+                a = self.read_bin(index)
+                self.bin_cache.put(key, a)
+            return a
+        if index not in self.bins:
+            self.load_bin(index)
+        return self.bins[index]
 
     def get(self, key):
         bin, offset = self.get_bin_offset(key)
-        if bin in self.bins:
-            return self.bins[bin][offset]
-        elif self.bin_pos[bin]:
-            self.load_bin(bin)
-            return self.bins[bin][offset]
-        else:
+        a = self.get_bin(bin)
+        if a is None:
             return self.default
+        return a[offset]
 
     def get_range(self, start, end):
         size = end - start
         assert size >= 0
-        rval = []
-        while size > 0:
-            bin, offset = self.get_bin_offset(start)
-            delta = self.bin_size - offset
-            if bin not in self.bins and self.bin_pos[bin] != 0:
-                self.load_bin(bin)
-            if self.bins[bin] is None:
-                if delta < size:
-                    rval.append(resize(array(self.default, self.typecode), (delta,)))
-                    size -= delta
-                    start += delta
-                else:
-                    rval.append(resize(array(self.default, self.typecode), (size,)))
-                    size = 0
+        rval = empty(size, self.typecode)
+        pos = 0
+        while pos < size:
+            bin, offset = self.get_bin_offset(start + pos)
+            delta = min(self.bin_size - offset, size - pos)
+            a = self.get_bin(bin)
+            if a is None:
+                rval[pos : pos + delta] = self.default
             else:
-                if delta < size:
-                    rval.append(self.bins[bin][offset : offset + delta])
-                    size -= delta
-                    start += delta
-                else:
-                    rval.append(self.bins[bin][offset : offset + size])
-                    size = 0
-        return concatenate(rval)
+                rval[pos : pos + delta] = a[offset : offset + delta]
+            pos += delta
+        return rval
 
     def __getitem__(self, key):
         if isinstance(key, slice):
@@ -2,6 +2,9 @@
 Tests for `bx.binned_array`.
 """
 
+import os
+import tempfile
+
 import pytest
 from numpy import (
     allclose,
@@ -12,6 +15,7 @@ from numpy import (
 from numpy.random import default_rng
 
 from bx.binned_array import (
+    BinCache,
     BinnedArray,
     BinnedArrayWriter,
     FileBinnedArray,
@@ -86,6 +90,47 @@ def test_file(source_target):
         )
 
 
+def test_bin_cache(source_target):
+    source, target = source_target
+    fd, fname = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        with open(fname, "wb") as f:
+            target.to_file(f)
+        # room for two bins of 128 floats, shared by two arrays
+        cache = BinCache(max_bytes=1024)
+        arrays = [FileBinnedArray(open(fname, "rb"), cache=cache) for _ in range(2)]
+        for _ in range(20):
+            a = int(rng.random() * len(source))
+            b = int(rng.random() * len(source))
+            if b < a:
+                a, b = b, a
+            for target2 in arrays:
+                assert allclose(source[a:b], target2[a:b])
+                # the second lookup is served from the cache
+                assert allclose(source[a], target2[a])
+                assert allclose(source[a], target2[a])
+        assert cache.nbytes <= 1024
+        stats = cache.stats()
+        assert stats["hits"] > 0
+        assert stats["misses"] > 0
+        assert stats["evictions"] > 0
+        for target2 in arrays:
+            target2.f.close()
+        # ranges over bins that only hold the default value
+        sparse = BinnedArray(128, 0, 1000, "f")
+        sparse[10] = 1
+        sparse[900] = 2
+        with open(fname, "wb") as f:
+            sparse.to_file(f)
+        with open(fname, "rb") as f:
+            target2 = FileBinnedArray(f, cache=cache)
+            assert allclose(target2[5:905], sparse[5:905])
+            assert target2[500] == 0
+    finally:
+        os.remove(fname)
+
+
 def test_file_lzo(source_target):
     source, target = source_target
     # With a file (lzo)
@@ -3,6 +3,9 @@ Classes for implementing `Pipeline`s composed of `Filter`s (intended to be
 subclassed).
 """
 
+import multiprocessing
+import os
+
 
 class Filter:
     def __init__(self, **kwargs):
@@ -77,3 +80,110 @@ class Pipeline(Filter):
 
     def __contains__(self, item):
         return self.pipeline.__contains__(item)
+
+
+class ParallelPipeline(Pipeline):
+    """
+    A `Pipeline` that processes independent shards of its input in a pool
+    of worker processes.
+
+    Each worker receives a copy of the pipeline, so filters (and anything
+    they reference) must be picklable. Output is written in shard order,
+    which is the order the blocks appear in the input. When all shards are
+    done, any filter that defines a `merge(other)` method is called once
+    for each worker copy, which lets filters that accumulate statistics
+    (like the site maskers) report totals for the whole input. Such filters
+    should also define `reset()`, which is called on each worker copy
+    before it runs so that only the counts of that worker are merged.
+    """
+
+    def __init__(self, processes=None, shards_per_process=4, **kwargs):
+        super().__init__(**kwargs)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.processes = processes
+        self.shards_per_process = shards_per_process
+
+    def run_shards(self, shards, read_shard, format_block=None, out=None):
+        """
+        Run the pipeline over every block yielded by `read_shard(shard)` for
+        each item of `shards`. If `out` is given, blocks that pass through
+        the pipeline are formatted with `format_block` and written to it.
+        `read_shard` and `format_block` must be module level functions.
+        """
+        if out is None:
+            format_block = None
+        tasks = [(self.pipeline, read_shard, format_block, shard) for shard in shards]
+        with multiprocessing.Pool(self.processes) as pool:
+            for text, pipeline in pool.imap(run_shard, tasks):
+                if out is not None:
+                    out.write(text)
+                self.merge_pipeline(pipeline)
+
+    def run_maf(self, filename, out=None, nshards=None, **kwargs):
+        """
+        Run the pipeline over all blocks of the MAF file `filename`, split
+        into byte ranges at block boundaries. Output (if `out` is given) is
+        written in MAF format, starting with the header of the input.
+        """
+        from bx.align import maf
+
+        if nshards is None:
+            nshards = self.processes * self.shards_per_process
+        with open(filename, "rb") as f:
+            ranges = maf.shard_offsets(f, nshards)
+        if out is not None:
+            with open(filename) as f:
+                attributes = maf.Reader(f).attributes
+            maf.Writer(out, attributes)
+        shards = [(filename, start, end, kwargs) for start, end in ranges]
+        self.run_shards(shards, maf.read_shard, maf.format_block, out)
+
+    def run_maf_indexed(self, filename, regions, out=None, index_filename=None, **kwargs):
+        """
+        Run the pipeline over the blocks of the indexed MAF file `filename`
+        that overlap any of the `(src, start, end)` tuples in `regions`,
+        with one shard per region. A block that overlaps several regions is
+        processed (and written) only once, in the shard of the first region
+        it overlaps.
+        """
+        from bx.align import maf
+
+        if out is not None:
+            maf.Writer(out)
+        index = maf.MAFIndexedAccess(filename, index_filename, **kwargs)
+        seen = set()
+        shards = []
+        for src, start, end in regions:
+            offsets = []
+            for _start, _end, offset in index.indexes.find(src, start, end):
+                if offset not in seen:
+                    seen.add(offset)
+                    offsets.append(offset)
+            if offsets:
+                shards.append((filename, index_filename, offsets, kwargs))
+        index.close()
+        self.run_shards(shards, maf.read_indexed_shard, maf.format_block, out)
+
+    def merge_pipeline(self, pipeline):
+        for function, other in zip(self.pipeline, pipeline):
+            merge = getattr(function, "merge", None)
+            if merge is not None:
+                merge(other)
+
+
+def run_shard(task):
+    """Worker for `ParallelPipeline`, returns the output text and the pipeline"""
+    functions, read_shard, format_block, shard = task
+    for function in functions:
+        reset = getattr(function, "reset", None)
+        if reset is not None:
+            reset()
+    pipeline = Pipeline()
+    pipeline.extend(functions)
+    texts = []
+    for block in read_shard(shard):
+        block = pipeline(block)
+        if block and format_block is not None:
+            texts.append(format_block(block))
+    return "".join(texts), functions
@@ -16,6 +16,15 @@ nodes to form a new cluster.
 C source code is in src/cluster.c
 """
 
+import numpy
+
+cimport cython
+from libc.stdint cimport (
+    int32_t,
+    int64_t,
+)
+
+
 cdef extern from "cluster.h":
     
     cdef struct struct_interval:
@@ -31,6 +40,7 @@ cdef extern from "cluster.h":
         int end
         struct_interval *interval_head
         struct_interval *interval_tail
+        int num_ivals
     
     ctypedef struct_clusternode clusternode
     
@@ -48,12 +58,19 @@ cdef extern from "cluster.h":
     
     ctypedef struct_treeitr treeitr
     
-    clusternode* clusternode_insert(clustertree *tree, clusternode *node, int start, int end, int id)
+    clusternode* clusternode_insert(clustertree *tree, clusternode *node, int start, int end, int id) nogil
     clustertree* create_clustertree(int max_dist, int min_intervals)
     treeitr* clusteritr(clustertree *tree)
     void freeclusteritr(treeitr *itr)
     void free_tree(clustertree *tree)
 
+def as_int_array(values):
+    values = numpy.asarray(values, dtype=numpy.int64)
+    if len(values) and (values.min() < -2147483648 or values.max() > 2147483647):
+        raise OverflowError("value too large to convert to int")
+    return values.astype(numpy.int32)
+
+
 cdef class ClusterTree:
     cdef clustertree *tree
     cdef int mincols
@@ -71,7 +88,42 @@ cdef class ClusterTree:
         ''' Insert an interval with start, end, id as parameters'''
         if s > e: raise ValueError("Interval start must be before end")
         self.tree.root = clusternode_insert(self.tree, self.tree.root, s, e, id)
-                
+
+    @cython.boundscheck(False)
+    def insert_many(self, starts, ends, ids=None):
+        ''' Insert many intervals at once from arrays (or sequences) of starts,
+            ends and ids. Without ids the id of an interval is its index in the
+            arrays. The intervals are inserted without holding the GIL, in order
+            of start (which gives the same clusters, with far fewer cache
+            misses). With a negative mincols, where the clusters found depend on
+            the order of insertion, they are inserted in the order given instead.
+
+        >>> tree = ClusterTree(0, 0)
+        >>> tree.insert_many([6, 1, 9, 3, 3], [7, 2, 10, 4, 8], [1, 3, 2, 0, 4])
+        >>> tree.getregions()
+        [(1, 2, [3]), (3, 8, [0, 1, 4]), (9, 10, [2])]
+        '''
+        cdef const int32_t[:] s, e, i
+        s = as_int_array(starts)
+        e = as_int_array(ends)
+        if ids is None:
+            i = numpy.arange(len(s), dtype=numpy.int32)
+        else:
+            i = as_int_array(ids)
+        if s.shape[0] != e.shape[0] or s.shape[0] != i.shape[0]:
+            raise ValueError("starts, ends and ids must have the same length")
+        if (numpy.asarray(s) > numpy.asarray(e)).any():
+            raise ValueError("Interval start must be before end")
+        if self.mincols >= 0:
+            order = numpy.argsort(s, kind="stable")
+            s = numpy.asarray(s)[order]
+            e = numpy.asarray(e)[order]
+            i = numpy.asarray(i)[order]
+        cdef Py_ssize_t k
+        with nogil:
+            for k in range(s.shape[0]):
+                self.tree.root = clusternode_insert(self.tree, self.tree.root, s[k], e[k], i[k])
+
     def getregions(self):
         ''' Returns a list clusters in ascending order of starting position.
             Each cluster is a tuple of (start, end, [sorted ids of intervals in cluster])
@@ -80,11 +132,12 @@ cdef class ClusterTree:
         Insert (6, 7, 1), (1, 2, 3), (9, 10, 2), (3, 4, 0), (3, 8, 4)
         tree.getregions() returns [(1, 2, [3]), (3, 8, [0, 1, 4]), (9, 10, [2])]
         '''
+        cdef treeitr *head
         cdef treeitr *itr
         cdef interval *ival
         
         regions = []
-        itr = clusteritr(self.tree)
+        head = itr = clusteritr(self.tree)
         
         while (itr):
             ids = []
@@ -95,18 +148,66 @@ cdef class ClusterTree:
 
             regions.append( (itr.node.start, itr.node.end, sorted(ids)) )
             itr = itr.next
-        freeclusteritr(itr)
+        freeclusteritr(head)
         return regions
+
+    def getregions_array(self):
+        ''' Same as getregions but returns NumPy arrays (starts, ends, offsets, ids),
+            where the sorted ids of the intervals in cluster k are
+            ids[offsets[k]:offsets[k+1]].
+
+        >>> tree = ClusterTree(0, 0)
+        >>> tree.insert_many([6, 1, 9, 3, 3], [7, 2, 10, 4, 8], [1, 3, 2, 0, 4])
+        >>> starts, ends, offsets, ids = tree.getregions_array()
+        >>> starts.tolist(), ends.tolist(), offsets.tolist(), ids.tolist()
+        ([1, 3, 9], [2, 8, 10], [0, 1, 4, 5], [3, 0, 1, 4, 2])
+        '''
+        cdef treeitr *head
+        cdef treeitr *itr
+        cdef interval *ival
+        cdef Py_ssize_t nclusters = 0, nids = 0, k = 0, j = 0
+
+        head = clusteritr(self.tree)
+        itr = head
+        while itr:
+            nclusters += 1
+            nids += itr.node.num_ivals
+            itr = itr.next
+        starts = numpy.empty(nclusters, dtype=numpy.int32)
+        ends = numpy.empty(nclusters, dtype=numpy.int32)
+        offsets = numpy.empty(nclusters + 1, dtype=numpy.int64)
+        ids = numpy.empty(nids, dtype=numpy.int32)
+        cdef int32_t[:] s = starts, e = ends, i = ids
+        cdef int64_t[:] o = offsets
+        itr = head
+        while itr:
+            s[k] = itr.node.start
+            e[k] = itr.node.end
+            o[k] = j
+            ival = itr.node.interval_head
+            while ival:
+                i[j] = ival.id
+                j += 1
+                ival = ival.next
+            k += 1
+            itr = itr.next
+        o[k] = j
+        freeclusteritr(head)
+        # sort the ids within each cluster
+        cluster = numpy.repeat(numpy.arange(nclusters), numpy.diff(offsets))
+        ids = ids[numpy.lexsort((ids, cluster))]
+        return starts, ends, offsets, ids
         
     def getlines(self):
         ''' Similar to getregions except it just returns a list of ids of intervals
             The above example would return [3, 0, 1, 4, 2]
          '''
+        cdef treeitr *head
         cdef treeitr *itr
         cdef interval *ival
         
         lines = []
-        itr = clusteritr(self.tree)
+        head = itr = clusteritr(self.tree)
         
         while (itr):
             ids = []
@@ -117,6 +218,6 @@ cdef class ClusterTree:
             
             lines.extend(sorted(ids))
             itr = itr.next
-        freeclusteritr(itr)
+        freeclusteritr(head)
         return lines
         
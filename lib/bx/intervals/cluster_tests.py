@@ -1,3 +1,6 @@
+import ctypes
+import random
+import sys
 import unittest
 
 from bx.intervals.cluster import ClusterTree
@@ -124,6 +127,46 @@ class TestCluster(unittest.TestCase):
 
         self.assertEqual([], self.tree.getregions())
 
+    def test_insert_many(self):
+        rng = random.Random(3)
+        for mincols, minregions in ((0, 0), (5, 2), (20, 3)):
+            starts = [rng.randint(0, 10000) for _ in range(2000)]
+            ends = [start + rng.randint(0, 20) for start in starts]
+            tree = ClusterTree(mincols, minregions)
+            for i, (s, e) in enumerate(zip(starts, ends)):
+                tree.insert(s, e, i)
+            bulk = ClusterTree(mincols, minregions)
+            bulk.insert_many(starts, ends)
+            regions = tree.getregions()
+            self.assertEqual(regions, bulk.getregions())
+            starts, ends, offsets, ids = bulk.getregions_array()
+            self.assertEqual(
+                regions,
+                [(s, e, ids[offsets[k] : offsets[k + 1]].tolist()) for k, (s, e) in enumerate(zip(starts, ends))],
+            )
+        self.assertRaises(ValueError, ClusterTree(0, 0).insert_many, [5], [4])
+        self.assertRaises(OverflowError, ClusterTree(0, 0).insert_many, [0], [2**40])
+        self.assertEqual([len(a) for a in ClusterTree(0, 0).getregions_array()], [0, 0, 1, 0])
+
+    @unittest.skipIf(sys.platform == "win32", "needs srand from the C library")
+    def test_insert_many_overlap_required(self):
+        # With a negative mincols the clusters depend on the order of
+        # insertion (and on the random balancing of the tree, seeded here),
+        # so insert_many keeps the order given
+        srand = ctypes.CDLL(None).srand
+        rng = random.Random(4)
+        for _ in range(20):
+            starts = [rng.randint(0, 1000) for _ in range(300)]
+            ends = [start + rng.randint(0, 20) for start in starts]
+            srand(1)
+            tree = ClusterTree(-5, 2)
+            for i, (s, e) in enumerate(zip(starts, ends)):
+                tree.insert(s, e, i)
+            srand(1)
+            bulk = ClusterTree(-5, 2)
+            bulk.insert_many(starts, ends)
+            self.assertEqual(tree.getregions(), bulk.getregions())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -21,6 +21,12 @@ preserves all information about the intervals (unlike bitset projection methods)
 
 import operator
 
+import numpy
+
+from bx.intervals.static_tree import StaticIntervalTree
+
+from libc.stdint cimport int64_t
+
 
 cdef extern from "stdlib.h":
     int ceil(float f)
@@ -202,7 +208,7 @@ cdef class IntervalNode:
             self.cright._seek_left(position, results, n, max_dist)
 
         if -1 < position - self.end < max_dist:
-            results.append(self.interval)
+            results.append(self)
 
         # TODO: can these conditionals be more stringent?
         if self.cleft is not EmptyNode:
@@ -223,7 +229,7 @@ cdef class IntervalNode:
                 self.cleft._seek_right(position, results, n, max_dist)
 
         if -1 < self.start - position < max_dist:
-            results.append(self.interval)
+            results.append(self)
 
         if self.cright is not EmptyNode:
                 self.cright._seek_right(position, results, n, max_dist)
@@ -239,10 +245,10 @@ cdef class IntervalNode:
         cdef list results = []
         # use start - 1 becuase .left() assumes strictly left-of
         self._seek_left( position - 1, results, n, max_dist )
-        if len(results) == n: return results
-        r = results
-        r.sort(key=operator.attrgetter('end'), reverse=True)
-        return r[:n]
+        if len(results) != n:
+            # sort by the node ends, values need not have an end
+            results.sort(key=operator.attrgetter('end'), reverse=True)
+        return [node.interval for node in results[:n]]
 
     cpdef right(self, position, int n=1, int max_dist=2500):
         """
@@ -254,10 +260,9 @@ cdef class IntervalNode:
         cdef list results = []
         # use end + 1 becuase .right() assumes strictly right-of
         self._seek_right(position + 1, results, n, max_dist)
-        if len(results) == n: return results
-        r = results
-        r.sort(key=operator.attrgetter('start'))
-        return r[:n]
+        if len(results) != n:
+            results.sort(key=operator.attrgetter('start'))
+        return [node.interval for node in results[:n]]
 
     def traverse(self, func):
         self._traverse(func)
@@ -267,8 +272,40 @@ cdef class IntervalNode:
         func(self)
         if self.cright is not EmptyNode: self.cright._traverse(func)
 
+    cdef void _collect(IntervalNode self, list starts, list ends, list values):
+        # in order, like _traverse, without a Python call per node
+        if self.cleft is not EmptyNode: self.cleft._collect(starts, ends, values)
+        starts.append(self.start)
+        ends.append(self.end)
+        values.append(self.interval)
+        if self.cright is not EmptyNode: self.cright._collect(starts, ends, values)
+
 cdef IntervalNode EmptyNode = IntervalNode( 0, 0, Interval(0, 0))
 
+cdef IntervalNode build_balanced( int64_t[:] starts, int64_t[:] ends, int64_t[:] order, object values,
+                                  Py_ssize_t lo, Py_ssize_t hi ):
+    """
+    Build a balanced tree from the intervals order[lo:hi], which must be
+    sorted by start. Priorities grow with subtree size so that the tree is
+    a valid treap and later inserts keep it balanced.
+    """
+    cdef Py_ssize_t mid = ( lo + hi ) // 2
+    cdef int64_t i = order[mid]
+    cdef IntervalNode node
+    if values is None:
+        node = IntervalNode( starts[i], ends[i], i )
+    else:
+        node = IntervalNode( starts[i], ends[i], values[i] )
+    node.priority = ceil( nlog * log( hi - lo ) ) + 1
+    if lo < mid:
+        node.cleft = build_balanced( starts, ends, order, values, lo, mid )
+        node.cleft.croot = node
+    if mid + 1 < hi:
+        node.cright = build_balanced( starts, ends, order, values, mid + 1, hi )
+        node.cright.croot = node
+    node.set_ends()
+    return node
+
 ## ---- Wrappers that retain the old interface -------------------------------
 
 cdef class Interval:
@@ -379,20 +416,49 @@ cdef class IntervalTree:
     """
     
     cdef IntervalNode root
+    cdef object static
     
     def __cinit__( self ):
         root = None
     
+    @classmethod
+    def from_arrays( cls, starts, ends, values=None ):
+        """
+        Build a tree from arrays (or sequences) of interval starts and ends,
+        and optionally of the values associated with them. The intervals are
+        sorted once and the tree is built balanced, which is much faster
+        than inserting them one at a time. Without `values` the value of each
+        interval is its index in the arrays.
+
+        >>> tree = IntervalTree.from_arrays( [10, 0, 3], [20, 10, 7] )
+        >>> tree.find( 5, 12 )
+        [1, 2, 0]
+        """
+        cdef IntervalTree tree = cls()
+        starts = numpy.ascontiguousarray( starts, dtype=numpy.int64 )
+        ends = numpy.ascontiguousarray( ends, dtype=numpy.int64 )
+        if starts.ndim != 1 or starts.shape != ends.shape:
+            raise ValueError( "starts and ends must be one dimensional and of the same length" )
+        if values is not None and len( values ) != len( starts ):
+            raise ValueError( "values must be as long as starts and ends" )
+        if len( starts ) > 0:
+            # ties keep their input order, as when inserted one at a time
+            order = numpy.argsort( starts, kind="stable" )
+            tree.root = build_balanced( starts, ends, order, values, 0, len( starts ) )
+        return tree
+
     # ---- Position based interfaces -----------------------------------------
     
     def insert( self, int start, int end, object value=None ):
         """
         Insert the interval [start,end) associated with value `value`.
         """
+        self.materialize()
         if self.root is None:
             self.root = IntervalNode( start, end, value )
         else:
             self.root = self.root.insert( start, end, value )
+        self.static = None
         
     add = insert
 
@@ -402,7 +468,7 @@ cdef class IntervalTree:
         Return a sorted list of all intervals overlapping [start,end).
         """
         if self.root is None:
-            return []
+            return [] if self.static is None else self.static.find( start, end )
         return self.root.find( start, end )
     
     def before( self, position, num_intervals=1, max_dist=2500 ):
@@ -411,7 +477,7 @@ cdef class IntervalTree:
         further than `max_dist` positions away
         """
         if self.root is None:
-            return []
+            return [] if self.static is None else self.static.before( position, num_intervals, max_dist )
         return self.root.left( position, num_intervals, max_dist )
 
     def after( self, position, num_intervals=1, max_dist=2500 ):
@@ -420,9 +486,117 @@ cdef class IntervalTree:
         further than `max_dist` positions away
         """
         if self.root is None:
-            return []
+            return [] if self.static is None else self.static.after( position, num_intervals, max_dist )
         return self.root.right( position, num_intervals, max_dist )
 
+    # ---- Batch interfaces --------------------------------------------------
+
+    def to_static( self ):
+        """
+        Return a `StaticIntervalTree` holding the same intervals and values.
+        """
+        cdef list starts = [], ends = [], values = []
+        if self.root is None:
+            return self.get_static()
+        self.root._collect( starts, ends, values )
+        if values and all( type( value ) is int for value in values ):
+            # plain integer values (as from `from_arrays`) become the ids,
+            # no side table is needed
+            try:
+                return StaticIntervalTree( starts, ends, ids=values )
+            except OverflowError:
+                pass
+        return StaticIntervalTree( starts, ends, values )
+
+    cdef get_static( self ):
+        # batch queries run on a static copy, kept until the next insert
+        if self.static is None:
+            if self.root is None:
+                self.static = StaticIntervalTree( [], [] )
+            else:
+                self.static = self.to_static()
+        return self.static
+
+    def count_many( self, starts, ends ):
+        """
+        Return an array with the number of intervals overlapping each of the
+        queries [starts[i],ends[i]). The queries are answered without holding
+        the GIL, on a static copy of the tree built by the first batch query.
+        `insert` drops that copy, so alternating inserts and batch queries
+        rebuild it every time; insert everything first, or build a
+        `StaticIntervalTree` directly when the intervals are known up front.
+
+        >>> tree = IntervalTree.from_arrays( [10, 0, 3], [20, 10, 7] )
+        >>> tree.count_many( [0, 5, 30], [5, 12, 40] ).tolist()
+        [2, 3, 0]
+        """
+        return self.get_static().count_many( starts, ends )
+
+    def find_many( self, starts, ends ):
+        """
+        Find the intervals overlapping each of the queries [starts[i],ends[i]).
+        Returns `(offsets, values)` where the sorted values for query i, as
+        `find` would return them, are `values[offsets[i]:offsets[i+1]]`.
+        As for `count_many`, the static copy queried here is rebuilt after
+        every `insert`.
+
+        >>> tree = IntervalTree.from_arrays( [10, 0, 3], [20, 10, 7] )
+        >>> offsets, values = tree.find_many( [0, 5, 30], [5, 12, 40] )
+        >>> offsets.tolist(), values
+        ([0, 2, 5, 5], [1, 2, 1, 2, 0])
+        """
+        static = self.get_static()
+        offsets, ids = static.find_many( starts, ends )
+        values = static.values
+        if values is None:
+            return offsets, ids.tolist()
+        return offsets, [values[i] for i in ids.tolist()]
+
+    # ---- Persistence -------------------------------------------------------
+
+    def save( self, filename ):
+        """
+        Write the tree to `filename`, from which `load` can open it again
+        without inserting the intervals one by one. The intervals are stored
+        in the versioned array format of `StaticIntervalTree`. If every value
+        is an integer the values are stored as the interval ids, otherwise
+        they are pickled into a side table at the end of the file (and so
+        must be picklable).
+        """
+        self.to_static().save( filename )
+
+    @classmethod
+    def load( cls, filename ):
+        """
+        Open a tree written by `save`. The interval arrays are memory mapped
+        and queries are answered from them directly, the tree is only
+        rebuilt in memory if intervals are inserted or it is traversed.
+
+        >>> import os, tempfile
+        >>> tree = IntervalTree.from_arrays( [10, 0, 3], [20, 10, 7], values=["c", "a", "b"] )
+        >>> fd, filename = tempfile.mkstemp()
+        >>> os.close( fd )
+        >>> tree.save( filename )
+        >>> IntervalTree.load( filename ).find( 5, 12 )
+        ['a', 'b', 'c']
+        >>> os.remove( filename )
+        """
+        cdef IntervalTree tree = cls()
+        tree.static = StaticIntervalTree.load( filename )
+        return tree
+
+    cdef materialize( self ):
+        # build the nodes of a loaded tree, in the order of the saved arrays
+        cdef Py_ssize_t n
+        if self.root is not None or self.static is None:
+            return
+        n = len( self.static )
+        if n > 0:
+            order = numpy.arange( n, dtype=numpy.int64 )
+            self.root = build_balanced( numpy.array( self.static.starts, dtype=numpy.int64 ),
+                                        numpy.array( self.static.ends, dtype=numpy.int64 ),
+                                        order, self.static.lookup( order ), 0, n )
+
     # ---- Interval-like object based interfaces -----------------------------
 
     def insert_interval( self, interval ):
@@ -439,47 +613,48 @@ cdef class IntervalTree:
         Find `num_intervals` intervals that lie completely before `interval`
         and are no further than `max_dist` positions away
         """
-        if self.root is None:
+        if self.root is None and self.static is None:
             return []
-        return self.root.left( interval.start, num_intervals, max_dist )
+        return self.before( interval.start, num_intervals, max_dist )
 
     def after_interval( self, interval, num_intervals=1, max_dist=2500 ):
         """
         Find `num_intervals` intervals that lie completely after `interval` and
         are no further than `max_dist` positions away
         """
-        if self.root is None:
+        if self.root is None and self.static is None:
             return []
-        return self.root.right( interval.end, num_intervals, max_dist )
+        return self.after( interval.end, num_intervals, max_dist )
 
     def upstream_of_interval( self, interval, num_intervals=1, max_dist=2500 ):
         """
         Find `num_intervals` intervals that lie completely upstream of
         `interval` and are no further than `max_dist` positions away
         """
-        if self.root is None:
+        if self.root is None and self.static is None:
             return []
         if interval.strand == -1 or interval.strand == "-":
-            return self.root.right( interval.end, num_intervals, max_dist )
+            return self.after( interval.end, num_intervals, max_dist )
         else:
-            return self.root.left( interval.start, num_intervals, max_dist )
+            return self.before( interval.start, num_intervals, max_dist )
 
     def downstream_of_interval( self, interval, num_intervals=1, max_dist=2500 ):
         """
         Find `num_intervals` intervals that lie completely downstream of
         `interval` and are no further than `max_dist` positions away
         """
-        if self.root is None:
+        if self.root is None and self.static is None:
             return []
         if interval.strand == -1 or interval.strand == "-":
-            return self.root.left( interval.start, num_intervals, max_dist )
+            return self.before( interval.start, num_intervals, max_dist )
         else:
-            return self.root.right( interval.end, num_intervals, max_dist )
+            return self.after( interval.end, num_intervals, max_dist )
     
     def traverse(self, fn):
         """
         call fn for each element in the tree
         """
+        self.materialize()
         if self.root is None:
             return None
         return self.root.traverse(fn)
@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 import unittest
 
 try:
@@ -8,6 +9,7 @@ except Exception:
     sys.path.insert(0, os.path.dirname(os.path.abspath(".")))
 
 from bx.intervals.intersection import (
+    Intersecter,
     Interval,
     IntervalNode,
     IntervalTree,
@@ -201,5 +203,86 @@ class IntervalTreeTest(unittest.TestCase):
         self.iv.traverse(fn)
 
 
+class FromArraysTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = __import__("random").Random(7)
+        self.starts = [rng.randint(0, 5000) for _ in range(2000)]
+        self.ends = [start + rng.randint(1, 300) for start in self.starts]
+        self.inserted = IntervalTree()
+        for i, (start, end) in enumerate(zip(self.starts, self.ends)):
+            self.inserted.insert(start, end, i)
+        self.tree = IntervalTree.from_arrays(self.starts, self.ends)
+
+    def test_same_as_insert(self):
+        for start in range(-100, 5500, 37):
+            end = start + 50
+            self.assertEqual(self.tree.find(start, end), self.inserted.find(start, end))
+            for n in (1, 3):
+                self.assertEqual(self.tree.before(start, n, 100), self.inserted.before(start, n, 100))
+                self.assertEqual(self.tree.after(start, n, 100), self.inserted.after(start, n, 100))
+
+    def test_values_and_insert(self):
+        tree = IntervalTree.from_arrays(self.starts, self.ends, values=[f"v{i}" for i in range(len(self.starts))])
+        expected = [f"v{i}" for i in self.inserted.find(1000, 1200)]
+        self.assertEqual(tree.find(1000, 1200), expected)
+        # the tree stays usable as a normal tree
+        tree.insert(1100, 1101, "new")
+        self.assertIn("new", tree.find(1000, 1200))
+        self.assertEqual(IntervalTree.from_arrays([], []).find(0, 10), [])
+
+    def test_find_many(self):
+        tree = self.inserted
+        starts = list(range(-100, 5500, 37))
+        ends = [start + 50 for start in starts]
+        offsets, values = tree.find_many(starts, ends)
+        counts = tree.count_many(starts, ends)
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            self.assertEqual(values[offsets[i] : offsets[i + 1]], tree.find(start, end))
+            self.assertEqual(counts[i], len(tree.find(start, end)))
+        # inserting discards the cached batch index
+        tree.insert(-1000, 10000, "all")
+        self.assertTrue((tree.count_many(starts, ends) == counts + 1).all())
+        self.assertEqual(IntervalTree().count_many([0], [10]).tolist(), [0])
+
+
+class PersistenceTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = __import__("random").Random(11)
+        self.tree = Intersecter()
+        for _ in range(500):
+            start = rng.randint(0, 5000)
+            self.tree.add_interval(Interval(start, start + rng.randint(1, 300), strand=rng.choice("+-")))
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_save_and_load(self):
+        self.tree.save(self.filename)
+        loaded = Intersecter.load(self.filename)
+        for start in range(-100, 5500, 37):
+            self.assertEqual(loaded.find(start, start + 50), self.tree.find(start, start + 50))
+            query = Interval(start, start + 50, strand="-")
+            for n in (1, 3):
+                self.assertEqual(loaded.before(start, n, 100), self.tree.before(start, n, 100))
+                self.assertEqual(loaded.after(start, n, 100), self.tree.after(start, n, 100))
+                self.assertEqual(loaded.upstream_of_interval(query, n), self.tree.upstream_of_interval(query, n))
+        # inserting builds the tree in memory
+        loaded.add_interval(Interval(10, 20, "new"))
+        self.tree.add_interval(Interval(10, 20, "new"))
+        self.assertEqual(loaded.find(0, 100), self.tree.find(0, 100))
+
+    def test_integer_values(self):
+        tree = IntervalTree.from_arrays([10, 0, 3], [20, 10, 7])
+        tree.save(self.filename)
+        loaded = IntervalTree.load(self.filename)
+        self.assertIsNone(loaded.to_static().values)
+        self.assertEqual(loaded.find(5, 12), [1, 2, 0])
+        self.assertEqual(loaded.count_many([0], [100]).tolist(), [3])
+        IntervalTree().save(self.filename)
+        self.assertEqual(IntervalTree.load(self.filename).find(0, 100), [])
+
+
 if __name__ == "__main__":
     unittest.main()
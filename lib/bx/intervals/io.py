@@ -2,11 +2,14 @@
 Support for reading and writing genomic intervals from delimited text files.
 """
 
+import numpy
+
 from bx.bitset import (
     BinnedBitSet,
     MAX,
 )
 from bx.tabular.io import (
+    FIRST_LINE_IS_HEADER,
     ParseError,
     TableReader,
     TableRow,
@@ -33,54 +36,86 @@ class StrandFormatError(ParseError):
     pass
 
 
+def parse_fields(fields, chrom_col, start_col, end_col, strand_col, default_strand, fix_strand=False):
+    """
+    Parse and check the chrom, start, end and strand of an interval from a
+    list of fields, returning them as a tuple.
+    """
+    nfields = len(fields)
+    # Parse chrom/source column
+    if chrom_col >= nfields:
+        raise MissingFieldError(f"No field for chrom_col ({chrom_col})")
+    chrom = fields[chrom_col].strip()
+    # Parse start column and ensure it is an integer
+    if start_col >= nfields:
+        raise MissingFieldError(f"No field for start_col ({start_col})")
+    try:
+        start = int(fields[start_col])
+    except ValueError as e:
+        raise FieldFormatError("Could not parse start_col: " + str(e), expected="integer")
+    # Parse end column and ensure it is an integer
+    if end_col >= nfields:
+        raise MissingFieldError(f"No field for end_col ({end_col})")
+    try:
+        end = int(fields[end_col])
+    except ValueError as e:
+        raise FieldFormatError("Could not parse end_col: " + str(e), expected="integer")
+    # Ensure start <= end
+    if end < start:
+        raise ParseError("Start is greater than End. Interval length is < 1.")
+    # Parse strand and ensure it is valid
+    if strand_col >= nfields or strand_col < 0:
+        strand = default_strand
+    else:
+        strand = fields[strand_col]
+        if strand == ".":
+            strand = default_strand
+        elif strand not in ("+", "-"):
+            if fix_strand:
+                strand = "+"
+            else:
+                raise StrandFormatError("Strand must be either '+' or '-'")
+    return chrom, start, end, strand
+
+
+def is_plain_int(field):
+    """True if `field` is a string exactly as str() writes a non-negative int"""
+    return isinstance(field, str) and field.isascii() and field.isdigit() and (field[0] != "0" or len(field) == 1)
+
+
 class GenomicInterval(TableRow):
     """
     A genomic interval stored in a set of fields (a row of a table)
     """
 
     def __init__(self, reader, fields, chrom_col, start_col, end_col, strand_col, default_strand, fix_strand=False):
-        TableRow.__init__(self, reader, fields)
-        self.chrom_col = chrom_col
-        self.start_col = start_col
-        self.end_col = end_col
-        self.strand_col = strand_col
-        self.nfields = nfields = len(fields)
-        # Parse chrom/source column
-        if chrom_col >= nfields:
-            raise MissingFieldError(f"No field for chrom_col ({chrom_col})")
-        self.chrom = fields[chrom_col].strip()
-        # Parse start column and ensure it is an integer
-        if start_col >= nfields:
-            raise MissingFieldError(f"No field for start_col ({start_col})")
-        try:
-            self.start = int(fields[start_col])
-        except ValueError as e:
-            raise FieldFormatError("Could not parse start_col: " + str(e), expected="integer")
-        # Parse end column and ensure it is an integer
-        if end_col >= nfields:
-            raise MissingFieldError(f"No field for end_col ({end_col})")
-        try:
-            self.end = int(fields[end_col])
-        except ValueError as e:
-            raise FieldFormatError("Could not parse end_col: " + str(e), expected="integer")
-        # Ensure start <= end
-        if self.end < self.start:
-            raise ParseError("Start is greater than End. Interval length is < 1.")
-        # Parse strand and ensure it is valid
-        if strand_col >= nfields or strand_col < 0:
-            # This should probable be immutable since the fields are
-            # not updated when it is set
-            self.strand = default_strand
-        else:
-            strand = fields[strand_col]
-            if strand == ".":
-                strand = default_strand
-            elif strand not in ("+", "-"):
-                if fix_strand:
-                    strand = "+"
-                else:
-                    raise StrandFormatError("Strand must be either '+' or '-'")
-            self.strand = strand
+        chrom, start, end, strand = parse_fields(
+            fields, chrom_col, start_col, end_col, strand_col, default_strand, fix_strand
+        )
+        # Set attributes directly rather than through __setattr__, the fields
+        # only need rewriting where the parsed value is not written the same
+        if fields[chrom_col] != chrom:
+            fields[chrom_col] = chrom
+        if not is_plain_int(fields[start_col]):
+            fields[start_col] = str(start)
+        if not is_plain_int(fields[end_col]):
+            fields[end_col] = str(end)
+        nfields = len(fields)
+        if 0 <= strand_col < nfields and fields[strand_col] != strand:
+            fields[strand_col] = str(strand)
+        self.__dict__.update(
+            reader=reader,
+            fields=fields,
+            chrom_col=chrom_col,
+            start_col=start_col,
+            end_col=end_col,
+            strand_col=strand_col,
+            nfields=nfields,
+            chrom=chrom,
+            start=start,
+            end=end,
+            strand=strand,
+        )
 
     def __setattr__(self, name, value):
         if name == "chrom":
@@ -103,6 +138,22 @@ class GenomicInterval(TableRow):
         )
 
 
+class IntervalChunk:
+    """
+    A batch of intervals read by `GenomicIntervalReader.chunks`, as NumPy
+    arrays of chromosome names, starts, ends and strands.
+    """
+
+    def __init__(self, chroms, starts, ends, strands):
+        self.chroms = numpy.array(chroms)
+        self.starts = numpy.array(starts, dtype=numpy.int64)
+        self.ends = numpy.array(ends, dtype=numpy.int64)
+        self.strands = numpy.array(strands)
+
+    def __len__(self):
+        return len(self.starts)
+
+
 class GenomicIntervalReader(TableReader):
     """
     Reader for iterating a set of intervals in a tab separated file. Can
@@ -165,9 +216,18 @@ class GenomicIntervalReader(TableReader):
         # Try multiple separators. First tab, our expected splitter, than
         # just whitespace in the case of problematic files with space instead of
         # tab separation
-        seps = ["\t"]
-        if self.allow_spaces:
-            seps.append(None)
+        if not self.allow_spaces:
+            return GenomicInterval(
+                self,
+                line.split("\t"),
+                self.chrom_col,
+                self.start_col,
+                self.end_col,
+                self.strand_col,
+                self.default_strand,
+                fix_strand=self.fix_strand,
+            )
+        seps = ["\t", None]
         for i, sep in enumerate(seps):
             try:
                 return GenomicInterval(
@@ -187,6 +247,74 @@ class GenomicIntervalReader(TableReader):
         # Ran out of separators and still have errors, raise our problem
         raise err
 
+    def chunks(self, size=100000):
+        """
+        Read the remaining intervals in batches of up to `size`, as
+        `IntervalChunk`s of NumPy columns, without creating an object per
+        interval. Headers, comments and blank lines are skipped (a header on
+        the first line is still stored as `header`).
+
+        >>> r = GenomicIntervalReader(["#chrom\\tstart\\tend", "chr1\\t1\\t100", "chr2\\t20\\t300", "chr2\\t40\\t50"])
+        >>> chunks = list(r.chunks(2))
+        >>> [len(chunk) for chunk in chunks]
+        [2, 1]
+        >>> chunks[0].chroms.tolist(), chunks[0].starts.tolist(), chunks[0].ends.tolist(), chunks[0].strands.tolist()
+        (['chr1', 'chr2'], [1, 20], [100, 300], ['+', '+'])
+        >>> r.header.fields
+        ['chrom', 'start', 'end']
+        """
+        comment_starts = tuple(self.comment_lines_startswith)
+        chrom_col, start_col, end_col, strand_col = self.chrom_col, self.start_col, self.end_col, self.strand_col
+        default_strand = self.default_strand
+        columns = (chrom_col, start_col, end_col, strand_col, default_strand, self.fix_strand)
+        seps = ["\t", None] if self.allow_spaces else ["\t"]
+        chroms, starts, ends, strands = [], [], [], []
+        for line in self.input_iter:
+            self.linenum += 1
+            line = line.rstrip("\r\n")
+            if line == "":
+                continue
+            if self.linenum == 1 and (
+                self.header is FIRST_LINE_IS_HEADER or (self.header is None and line.startswith(comment_starts))
+            ):
+                self.header = self.parse_header(line)
+                continue
+            if line.startswith(comment_starts):
+                continue
+            # Fast path for well formed rows, anything unusual goes through parse_fields
+            fields = line.split("\t")
+            try:
+                row = (
+                    fields[chrom_col].strip(),
+                    int(fields[start_col]),
+                    int(fields[end_col]),
+                    fields[strand_col] if 0 <= strand_col < len(fields) else default_strand,
+                )
+            except (IndexError, ValueError):
+                row = None
+            if row is None or row[2] < row[1] or row[3] not in ("+", "-"):
+                for i, sep in enumerate(seps):
+                    try:
+                        row = parse_fields(line.split(sep), *columns)
+                        break
+                    except Exception as e:
+                        # Keep the error for the first separator
+                        if i == 0:
+                            err = e
+                else:
+                    if isinstance(err, ParseError):
+                        err.linenum = self.linenum
+                    raise err
+            chroms.append(row[0])
+            starts.append(row[1])
+            ends.append(row[2])
+            strands.append(row[3])
+            if len(starts) == size:
+                yield IntervalChunk(chroms, starts, ends, strands)
+                chroms, starts, ends, strands = [], [], [], []
+        if starts:
+            yield IntervalChunk(chroms, starts, ends, strands)
+
     def binned_bitsets(self, upstream_pad=0, downstream_pad=0, lens=None):
         # The incoming lens dictionary is a dictionary of chromosome lengths
         # which are used to initialize the bitsets.
@@ -0,0 +1,62 @@
+"""
+Tests for `bx.intervals.io`.
+"""
+
+import pytest
+
+from bx.intervals.io import (
+    GenomicInterval,
+    GenomicIntervalReader,
+)
+from bx.tabular.io import ParseError
+
+LINES = [
+    "#chrom\tstart\tend\tname\tscore\tstrand",
+    "chr1\t 10\t020\tx\t0\t.",
+    " chr2 \t+5\t7\ty\t0\t-",
+    "chr3\t5\t7\tz\t0\t?",
+    "",
+    "track name=foo",
+    "chr3\t5\t7",
+    "chr4\t1\t2\tq\t0\t+",
+]
+
+
+def test_fields_normalized():
+    intervals = [row for row in GenomicIntervalReader(LINES, fix_strand=True) if isinstance(row, GenomicInterval)]
+    assert [str(interval) for interval in intervals] == [
+        "chr1\t10\t20\tx\t0\t+",
+        "chr2\t5\t7\ty\t0\t-",
+        "chr3\t5\t7\tz\t0\t+",
+        "chr3\t5\t7",
+        "chr4\t1\t2\tq\t0\t+",
+    ]
+    intervals[0].end = 30
+    intervals[0].strand = "-"
+    assert str(intervals[0]) == "chr1\t10\t30\tx\t0\t-"
+    # fields given as numbers (as some operations build them) end up as text
+    interval = GenomicInterval(None, ["chr1", 5, 10], 0, 1, 2, 5, "+")
+    assert interval.fields == ["chr1", "5", "10"]
+
+
+def test_chunks():
+    for kwargs in ({"fix_strand": True}, {"fix_strand": True, "default_strand": "-"}, {"strand_col": -1}):
+        expected = [
+            (row.chrom, row.start, row.end, row.strand)
+            for row in GenomicIntervalReader(LINES, **kwargs)
+            if isinstance(row, GenomicInterval)
+        ]
+        reader = GenomicIntervalReader(LINES, **kwargs)
+        chunks = list(reader.chunks(2))
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        rows = []
+        for chunk in chunks:
+            rows.extend(zip(chunk.chroms.tolist(), chunk.starts.tolist(), chunk.ends.tolist(), chunk.strands.tolist()))
+        assert rows == expected
+        assert reader.header.fields[0] == "chrom"
+
+
+def test_chunks_errors():
+    with pytest.raises(ParseError) as e:
+        list(GenomicIntervalReader(["chr1\t1\t5", "chr1\t5\t1"]).chunks())
+    assert e.value.linenum == 2
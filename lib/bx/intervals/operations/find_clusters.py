@@ -16,6 +16,9 @@ import random
 from bx.intervals.cluster import ClusterTree
 from bx.intervals.io import GenomicInterval
 
+INT_MIN = -(2**31)
+INT_MAX = 2**31 - 1
+
 
 def find_clusters(reader, mincols=1, minregions=2):
     extra = {}
@@ -26,20 +29,29 @@ def find_clusters(reader, mincols=1, minregions=2):
         if not isinstance(interval, GenomicInterval):
             extra[linenum] = interval
         else:
-            if interval.chrom not in chroms:
-                chroms[interval.chrom] = ClusterTree(mincols, minregions)
-            try:
-                chroms[interval.chrom].insert(interval.start, interval.end, linenum)
-            except OverflowError as e:
+            if not (INT_MIN <= interval.start <= INT_MAX and INT_MIN <= interval.end <= INT_MAX):
                 try:
                     # This will work only if reader is a NiceReaderWrapper
                     reader.skipped += 1
                     if reader.skipped < 10:
-                        reader.skipped_lines.append((reader.linenum, reader.current_line, str(e)))
+                        reader.skipped_lines.append(
+                            (reader.linenum, reader.current_line, "value too large to convert to int")
+                        )
                 except Exception:
                     pass
                 continue
-    return chroms, extra
+            if interval.chrom not in chroms:
+                chroms[interval.chrom] = ([], [], [])
+            starts, ends, linenums = chroms[interval.chrom]
+            starts.append(interval.start)
+            ends.append(interval.end)
+            linenums.append(linenum)
+    # Cluster each chromosome with one call into the C tree
+    trees = {}
+    for chrom, (starts, ends, linenums) in chroms.items():
+        trees[chrom] = ClusterTree(mincols, minregions)
+        trees[chrom].insert_many(starts, ends, linenums)
+    return trees, extra
 
 
 # DEPRECATED: Use the ClusterTree in bx.intervals.cluster for this.
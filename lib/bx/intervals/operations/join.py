@@ -7,20 +7,31 @@ walking through the inputs in O(n) time.
 
 import math
 
+import numpy
+
 from bx.intervals.io import GenomicInterval
-from .quicksect import IntervalTree
+from bx.intervals.static_tree import StaticIntervalTree
 
 
 def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True):
-    # Read rightSet into memory:
+    # Read rightSet into memory, as coordinate arrays per chromosome
     rightlen = 0
     leftlen = 0
-    rightTree = IntervalTree()
+    rights = {}
     for item in rightSet:
         if isinstance(item, GenomicInterval):
-            rightTree.insert(item, rightSet.linenum, item.fields)
+            if item.chrom not in rights:
+                rights[item.chrom] = ([], [], [])
+            starts, ends, fields = rights[item.chrom]
+            starts.append(item.start)
+            ends.append(item.end)
+            fields.append(item.fields)
             if rightlen == 0:
                 rightlen = item.nfields
+    # Each tree finds indexes into the lists for its chromosome, a right
+    # interval is visited once it has been joined to a left interval
+    trees = {chrom: StaticIntervalTree(starts, ends) for chrom, (starts, ends, _) in rights.items()}
+    visited = {chrom: bytearray(len(starts)) for chrom, (starts, _, _) in rights.items()}
 
     for interval in leftSet:
         if leftlen == 0 and isinstance(interval, GenomicInterval):
@@ -29,29 +40,19 @@ def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True):
             yield interval
         else:
             result = []
-            rightTree.intersect(interval, lambda node: result.append(node))
+            if interval.chrom in trees:
+                result = trees[interval.chrom].find_ids(interval.start, interval.end).tolist()
+                starts, ends, fields = rights[interval.chrom]
+                chrom_visited = visited[interval.chrom]
             overlap_not_met = 0
-            for item in result:
-                if item.start in range(interval.start, interval.end + 1) and item.end not in range(
-                    interval.start, interval.end + 1
-                ):
-                    overlap = interval.end - item.start
-                elif item.end in range(interval.start, interval.end + 1) and item.start not in range(
-                    interval.start, interval.end + 1
-                ):
-                    overlap = item.end - interval.start
-                elif item.start in range(interval.start, interval.end + 1) and item.end in range(
-                    interval.start, interval.end + 1
-                ):
-                    overlap = item.end - item.start
-                else:  # the intersecting item's start and end are outside the interval range
-                    overlap = interval.end - interval.start
+            for i in result:
+                overlap = min(interval.end, ends[i]) - max(interval.start, starts[i])
                 if overlap < mincols:
                     overlap_not_met += 1
                     continue
                 outfields = list(interval)
-                outfields.extend(item.other)
-                setattr(item, "visited", True)
+                outfields.extend(fields[i])
+                chrom_visited[i] = 1
                 yield outfields
             if (len(result) == 0 or overlap_not_met == len(result)) and rightfill:
                 outfields = list(interval)
@@ -60,19 +61,16 @@ def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True):
                 yield outfields
 
     if leftfill:
-
-        def report_unvisited(node, results):
-            if not hasattr(node, "visited"):
-                results.append(node)
-
-        results = []
-        rightTree.traverse(lambda x: report_unvisited(x, results))
-        for item in results:
-            outfields = []
-            for x in range(leftlen):
-                outfields.append(".")
-            outfields.extend(item.other)
-            yield outfields
+        for chrom, (starts, _, fields) in rights.items():
+            unvisited = numpy.frombuffer(visited[chrom], dtype=numpy.uint8) == 0
+            # in order of start, as a traversal of the tree would give them
+            for i in numpy.argsort(starts, kind="stable"):
+                if unvisited[i]:
+                    outfields = []
+                    for x in range(leftlen):
+                        outfields.append(".")
+                    outfields.extend(fields[i])
+                    yield outfields
 
 
 def interval_cmp(a, b):
@@ -0,0 +1,43 @@
+"""
+Tests for `bx.intervals.operations.join`.
+"""
+
+from bx.intervals.io import NiceReaderWrapper
+from bx.intervals.operations.join import join
+
+LEFT = ["chr1\t10\t20\ta", "chr1\t100\t200\tb", "chr2\t0\t50\tc"]
+RIGHT = ["chr1\t15\t120\tx", "chr1\t150\t160\ty", "chr1\t0\t5\tz", "chr3\t0\t10\tw"]
+
+
+def reader(lines):
+    return NiceReaderWrapper(iter(lines), chrom_col=0, start_col=1, end_col=2, strand_col=-1)
+
+
+def run(**kwargs):
+    return ["\t".join(map(str, fields)) for fields in join(reader(LEFT), reader(RIGHT), **kwargs)]
+
+
+def test_join():
+    assert run() == [
+        "chr1\t10\t20\ta\tchr1\t15\t120\tx",
+        "chr1\t100\t200\tb\tchr1\t15\t120\tx",
+        "chr1\t100\t200\tb\tchr1\t150\t160\ty",
+        "chr2\t0\t50\tc\t.\t.\t.\t.",
+        ".\t.\t.\t.\tchr1\t0\t5\tz",
+        ".\t.\t.\t.\tchr3\t0\t10\tw",
+    ]
+
+
+def test_mincols():
+    assert run(mincols=10, leftfill=False) == [
+        "chr1\t10\t20\ta\t.\t.\t.\t.",
+        "chr1\t100\t200\tb\tchr1\t15\t120\tx",
+        "chr1\t100\t200\tb\tchr1\t150\t160\ty",
+        "chr2\t0\t50\tc\t.\t.\t.\t.",
+    ]
+    assert run(mincols=10, rightfill=False) == [
+        "chr1\t100\t200\tb\tchr1\t15\t120\tx",
+        "chr1\t100\t200\tb\tchr1\t150\t160\ty",
+        ".\t.\t.\t.\tchr1\t0\t5\tz",
+        ".\t.\t.\t.\tchr3\t0\t10\tw",
+    ]
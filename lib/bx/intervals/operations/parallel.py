@@ -0,0 +1,132 @@
+"""
+Run interval operations one chromosome at a time in a pool of processes.
+
+Operations such as `intersect`, `subtract`, `complement`, `coverage`,
+`merge` and `base_coverage` treat every chromosome independently. Their
+input files can therefore be split by chromosome, with one pass over each
+file, and each chromosome handed to a worker process. The operation runs
+unchanged on readers over the split files. The results come back in a
+fixed chromosome order: the order in which chromosomes first appear in the
+inputs, first file first.
+
+>>> from bx.intervals.operations.base_coverage import base_coverage
+>>> import os, tempfile
+>>> fd, filename = tempfile.mkstemp()
+>>> with os.fdopen(fd, "w") as f:
+...     _ = f.write("chr2\\t10\\t20\\nchr1\\t0\\t5\\nchr2\\t15\\t30\\n")
+>>> list(run_by_chrom(base_coverage, [filename], processes=1))
+[('chr2', 20), ('chr1', 5)]
+>>> os.remove(filename)
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+from bx.intervals.io import NiceReaderWrapper
+from bx.tabular.io import (
+    Comment,
+    Header,
+)
+
+# Lines held in memory while splitting a file before they are written out
+SPLIT_BUFFER_LINES = 100000
+
+
+def run_by_chrom(operation, filenames, args=(), kwargs=None, processes=None, reader_kwargs=None, tmp_dir=None):
+    """
+    Run `operation` separately for each chromosome of the interval files
+    `filenames`, in a pool of `processes` processes (default: one per CPU,
+    1 runs everything in this process). Yields `(chrom, result)` pairs in
+    deterministic chromosome order.
+
+    The operation is called as `operation(readers, *args, **kwargs)` with
+    one `NiceReaderWrapper` per file (created with `reader_kwargs`), or with
+    a single reader if only one file is given. If it returns an iterable,
+    the result is the list of its output lines: intervals as their text,
+    lists of fields joined by tabs. Headers and comments are left out.
+    Otherwise, as for `base_coverage`, the result is the returned value.
+    The operation and its arguments must be picklable to use more than one
+    process.
+    """
+    if kwargs is None:
+        kwargs = {}
+    if reader_kwargs is None:
+        reader_kwargs = {}
+    chrom_col = reader_kwargs.get("chrom_col", 0)
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        splits = [
+            split_by_chrom(filename, os.path.join(directory, str(i)), chrom_col) for i, filename in enumerate(filenames)
+        ]
+        chroms = list({chrom: None for split in splits for chrom in split})
+        empty = os.path.join(directory, "empty")
+        open(empty, "w").close()
+        tasks = [
+            (operation, [split.get(chrom, empty) for split in splits], args, kwargs, reader_kwargs) for chrom in chroms
+        ]
+        if processes == 1:
+            results = map(run_chrom, tasks)
+            yield from zip(chroms, results)
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                yield from zip(chroms, pool.imap(run_chrom, tasks))
+
+
+def run_chrom(task):
+    """Run one operation on the split files of one chromosome"""
+    operation, paths, args, kwargs, reader_kwargs = task
+    files = [open(path) for path in paths]
+    try:
+        readers = [NiceReaderWrapper(f, **reader_kwargs) for f in files]
+        result = operation(readers[0] if len(readers) == 1 else readers, *args, **kwargs)
+        if not hasattr(result, "__iter__"):
+            return result
+        lines = []
+        for item in result:
+            if isinstance(item, (Header, Comment)):
+                continue
+            if isinstance(item, (list, tuple)):
+                lines.append("\t".join(map(str, item)))
+            else:
+                lines.append(str(item))
+        return lines
+    finally:
+        for f in files:
+            f.close()
+
+
+def split_by_chrom(filename, prefix, chrom_col=0):
+    """
+    Copy the interval lines of `filename` into one file per chromosome,
+    named `prefix` plus a number, in a single pass. Comments, track lines
+    and blank lines are dropped. Returns a dict from chromosome to the name
+    of its file, in order of first appearance.
+    """
+    paths = {}
+    buffers = {}
+    buffered = 0
+    with open(filename) as f:
+        for line in f:
+            if line.startswith(("#", "track ")) or line.isspace():
+                continue
+            fields = line.split("\t")
+            chrom = fields[chrom_col].strip() if chrom_col < len(fields) else ""
+            if chrom not in paths:
+                paths[chrom] = f"{prefix}.{len(paths)}"
+                buffers[chrom] = []
+            buffers[chrom].append(line if line.endswith("\n") else line + "\n")
+            buffered += 1
+            if buffered >= SPLIT_BUFFER_LINES:
+                flush_buffers(paths, buffers)
+                buffered = 0
+    flush_buffers(paths, buffers)
+    return paths
+
+
+def flush_buffers(paths, buffers):
+    for chrom, lines in buffers.items():
+        if not lines:
+            continue
+        with open(paths[chrom], "a") as out:
+            out.writelines(lines)
+        lines.clear()
@@ -0,0 +1,66 @@
+"""
+Tests for `bx.intervals.operations.parallel`.
+"""
+
+import os
+import random
+
+import pytest
+
+from bx.intervals.io import NiceReaderWrapper
+from bx.intervals.operations.base_coverage import base_coverage
+from bx.intervals.operations.intersect import intersect
+from bx.intervals.operations.merge import merge
+from bx.intervals.operations.parallel import run_by_chrom
+from bx.intervals.operations.subtract import subtract
+from bx.tabular.io import (
+    Comment,
+    Header,
+)
+
+READER_KWARGS = {"chrom_col": 0, "start_col": 1, "end_col": 2, "strand_col": 5}
+
+
+@pytest.fixture
+def beds(tmp_path):
+    rng = random.Random(4)
+    filenames = []
+    for i in range(2):
+        filename = os.path.join(tmp_path, f"{i}.bed")
+        with open(filename, "w") as f:
+            f.write("track name=test\n")
+            for chrom in ("chr3", "chr1", "chr2"):
+                for _ in range(rng.randint(50, 200)):
+                    start = rng.randint(0, 10000)
+                    f.write(f"{chrom}\t{start}\t{start + rng.randint(1, 300)}\tn\t0\t{rng.choice('+-')}\n")
+        filenames.append(filename)
+    return filenames
+
+
+def serial(operation, filenames, **kwargs):
+    files = [open(filename) for filename in filenames]
+    readers = [NiceReaderWrapper(f, **READER_KWARGS) for f in files]
+    lines = []
+    for item in operation(readers[0] if len(readers) == 1 else readers, **kwargs):
+        if isinstance(item, list):
+            lines.append("\t".join(map(str, item)))
+        elif not isinstance(item, (Header, Comment)):
+            lines.append(str(item))
+    for f in files:
+        f.close()
+    return lines
+
+
+@pytest.mark.parametrize("operation", [intersect, subtract])
+def test_same_as_serial(beds, operation):
+    results = list(run_by_chrom(operation, beds, processes=2, reader_kwargs=READER_KWARGS))
+    assert [chrom for chrom, _ in results] == ["chr3", "chr1", "chr2"]
+    assert [line for _, lines in results for line in lines] == serial(operation, beds)
+
+
+def test_single_reader(beds):
+    results = run_by_chrom(merge, beds[:1], processes=1, reader_kwargs=READER_KWARGS)
+    assert [line for _, lines in results for line in lines] == serial(merge, beds[:1])
+    total = sum(result for _, result in run_by_chrom(base_coverage, beds[:1], processes=1))
+    with open(beds[0]) as f:
+        assert total == base_coverage(NiceReaderWrapper(f, **READER_KWARGS))
@@ -13,13 +13,24 @@ from bx.intervals.io import (
     GenomicInterval,
 )
 from bx.intervals.operations import bits_clear_in_range
+from bx.intervals.operations.sweep import (
+    reader_intervals,
+    sorted_coverage,
+    SortedStream,
+    union_runs,
+)
 from bx.tabular.io import (
     Comment,
     Header,
 )
 
 
-def subtract(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True):
+def subtract(
+    readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True, sorted_input=False
+):
+    if sorted_input:
+        yield from subtract_sorted(readers, mincols, upstream_pad, downstream_pad, pieces, lens, comments)
+        return
     # The incoming lens dictionary is a dictionary of chromosome lengths which are used to initialize the bitsets.
     # Read all but first into bitsets and union to one (if confused, read DeMorgan's...)
     primary = readers[0]
@@ -77,3 +88,46 @@ def subtract(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True,
                     except Exception:
                         pass
                     continue
+
+
+def subtract_sorted(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True):
+    """
+    Same as `subtract` for readers that are all sorted by chromosome name
+    (in the C locale) and start, streaming them together in one pass instead
+    of loading the secondary readers into bitsets. Padding is not supported:
+    the bitset path ignores `upstream_pad` and `downstream_pad`, so rather
+    than give different output they must be 0.
+    """
+    if upstream_pad or downstream_pad:
+        raise Exception("upstream_pad and downstream_pad are not supported with sorted input")
+    primary = readers[0]
+    secondary = [BitsetSafeReaderWrapper(readers[1], lens=lens)] + list(readers[2:])
+    streams = [
+        SortedStream(reader_intervals(reader, lens=lens), f"input {i + 2}") for i, reader in enumerate(secondary)
+    ]
+
+    def combine(runs):
+        return union_runs([r for r in runs if r is not None])
+
+    for interval, coverage in sorted_coverage(primary, streams, combine):
+        if isinstance(interval, Header):
+            yield interval
+        if isinstance(interval, Comment) and comments:
+            yield interval
+        elif isinstance(interval, GenomicInterval):
+            if coverage is None:
+                yield interval
+                continue
+            start = int(interval.start)
+            end = int(interval.end)
+            if start > end:
+                warn("Interval start after end!")
+            if coverage.count(start, end) >= mincols:
+                out_intervals = coverage.gaps(start, end) if pieces else []
+            else:
+                out_intervals = [(start, end)]
+            for start, end in out_intervals:
+                new_interval = interval.copy()
+                new_interval.start = start
+                new_interval.end = end
+                yield new_interval
@@ -0,0 +1,281 @@
+"""
+Building blocks for streaming operations over interval files that are sorted
+by chromosome name and then by start (as produced by
+`LC_ALL=C sort -k1,1 -k2,2n`). Chromosome names are compared as plain
+strings, character by character, so files must be sorted in the C locale:
+other locales order names differently, and such files are rejected as
+unsorted.
+
+Instead of reading whole files into bitsets, sorted inputs are swept
+together in a single pass, keeping in memory only the intervals that can
+still overlap what is being read. Intervals are handled as `(chrom, start,
+end)` tuples, and the coverage of a set of intervals as sorted, disjoint
+"runs" (maximal covered ranges) per chromosome.
+
+>>> runs = merge_runs([("chr1", 0, 10), ("chr1", 5, 20), ("chr1", 20, 25), ("chr2", 3, 4)])
+>>> list(runs)
+[('chr1', 0, 25), ('chr2', 3, 4)]
+>>> coverage = Coverage(iter([(0, 10), (20, 30)]))
+>>> coverage.pieces(5, 25)
+[(5, 10), (20, 25)]
+>>> coverage.gaps(5, 25)
+[(10, 20)]
+"""
+
+import heapq
+from collections import deque
+
+from bx.bitset import MAX
+from bx.intervals.io import GenomicInterval
+
+
+class SortedStream:
+    """
+    Wraps an iterator of `(chrom, start, end)` tuples, checking that it is
+    sorted, and allows peeking at the next tuple as `head`.
+    """
+
+    def __init__(self, intervals, name="input"):
+        self.intervals = iter(intervals)
+        self.name = name
+        self.head = None
+        self.advance()
+
+    def advance(self):
+        head = next(self.intervals, None)
+        if head is not None and self.head is not None and head[:2] < self.head[:2]:
+            raise Exception(
+                f"Intervals in {self.name} are not sorted: {head[0]}:{head[1]} after {self.head[0]}:{self.head[1]}"
+                " (sort with LC_ALL=C sort -k1,1 -k2,2n)"
+            )
+        self.head = head
+
+    def __iter__(self):
+        while self.head is not None:
+            head = self.head
+            self.advance()
+            yield head
+
+    def chrom_intervals(self, chrom):
+        """Yield (and consume) the intervals at the head that are on `chrom`"""
+        while self.head is not None and self.head[0] == chrom:
+            head = self.head
+            self.advance()
+            yield head
+
+
+def reader_intervals(reader, upstream_pad=0, downstream_pad=0, lens=None):
+    """
+    Yield `(chrom, start, end)` for the `GenomicInterval`s in `reader`,
+    extended by `upstream_pad` and `downstream_pad` according to their
+    strand and clipped to [0, lens[chrom]). Padding can move starts by
+    different amounts, a small buffer keeps the output sorted.
+    """
+    if lens is None:
+        lens = {}
+    max_pad = max(upstream_pad, downstream_pad)
+    pending = []
+    chrom = None
+    for interval in reader:
+        if not isinstance(interval, GenomicInterval):
+            continue
+        if interval.chrom != chrom:
+            while pending:
+                yield heapq.heappop(pending)
+            chrom = interval.chrom
+            size = lens.get(chrom, MAX)
+        if interval.strand == "-":
+            start, end = interval.start - downstream_pad, interval.end + upstream_pad
+        else:
+            start, end = interval.start - upstream_pad, interval.end + downstream_pad
+        start, end = max(start, 0), min(end, size)
+        if start >= end:
+            continue
+        heapq.heappush(pending, (chrom, start, end))
+        # nothing read later can start before interval.start - max_pad
+        while pending[0][1] < interval.start - max_pad:
+            yield heapq.heappop(pending)
+    while pending:
+        yield heapq.heappop(pending)
+
+
+def merge_runs(intervals):
+    """
+    Merge sorted `(chrom, start, end)` tuples into the runs they cover,
+    joining intervals that overlap or touch.
+    """
+    run = None
+    for chrom, start, end in intervals:
+        if run is not None and chrom == run[0] and start <= run[2]:
+            if end > run[2]:
+                run = (chrom, run[1], end)
+            continue
+        if run is not None:
+            yield run
+        run = (chrom, start, end)
+    if run is not None:
+        yield run
+
+
+def union_runs(run_iters):
+    """Runs covered by any of the sorted run iterators in `run_iters`"""
+    return merge_runs(heapq.merge(*run_iters))
+
+
+def intersect_runs(run_iters):
+    """Runs covered by all of the sorted run iterators in `run_iters`"""
+    runs = run_iters[0]
+    for other in run_iters[1:]:
+        runs = intersect_two(runs, other)
+    return runs
+
+
+def intersect_two(a, b):
+    x, y = next(a, None), next(b, None)
+    while x is not None and y is not None:
+        if x[0] != y[0]:
+            if x[0] < y[0]:
+                x = next(a, None)
+            else:
+                y = next(b, None)
+            continue
+        start, end = max(x[1], y[1]), min(x[2], y[2])
+        if start < end:
+            yield (x[0], start, end)
+        if x[2] < y[2]:
+            x = next(a, None)
+        else:
+            y = next(b, None)
+
+
+def chrom_groups(streams):
+    """
+    Walk several `SortedStream`s in step, one chromosome at a time. Yields
+    `(chrom, runs)` for every chromosome in any stream, in sorted order,
+    where `runs[i]` iterates over the runs of stream i on that chromosome or
+    is None if the stream has no intervals on it. The runs must be consumed
+    (or abandoned) before the next chromosome is requested.
+    """
+    while True:
+        heads = [stream.head[0] for stream in streams if stream.head is not None]
+        if not heads:
+            return
+        chrom = min(heads)
+        runs = [
+            merge_runs(stream.chrom_intervals(chrom)) if stream.head is not None and stream.head[0] == chrom else None
+            for stream in streams
+        ]
+        yield chrom, runs
+        for stream in streams:
+            for _ in stream.chrom_intervals(chrom):
+                pass
+
+
+class Coverage:
+    """
+    The runs covered on one chromosome, read lazily from an iterator of
+    sorted, disjoint `(start, end)` pairs. Queries must come in order of
+    non-decreasing start, runs that end before the last query are dropped.
+    """
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.window = deque()
+        self.next = next(self.runs, None)
+
+    def advance(self, start, end):
+        window = self.window
+        while window and window[0][1] <= start:
+            window.popleft()
+        while self.next is not None and self.next[0] < end:
+            if self.next[1] > start:
+                window.append(self.next)
+            self.next = next(self.runs, None)
+
+    def pieces(self, start, end):
+        """Covered pieces of [start,end)"""
+        self.advance(start, end)
+        pieces = []
+        for run_start, run_end in self.window:
+            if run_start >= end:
+                break
+            pieces.append((max(run_start, start), min(run_end, end)))
+        return pieces
+
+    def gaps(self, start, end):
+        """Pieces of [start,end) that are not covered"""
+        gaps = []
+        for piece_start, piece_end in self.pieces(start, end):
+            if piece_start > start:
+                gaps.append((start, piece_start))
+            start = piece_end
+        if start < end:
+            gaps.append((start, end))
+        return gaps
+
+    def count(self, start, end):
+        """Number of covered positions in [start,end)"""
+        return sum(piece_end - piece_start for piece_start, piece_end in self.pieces(start, end))
+
+
+class ChromCoverage:
+    """
+    The `Coverage` of several `SortedStream`s, one chromosome at a time, as
+    computed by `combine` from the runs of each stream on it (see
+    `chrom_groups`). Queries must be sorted by chromosome and start.
+    """
+
+    def __init__(self, streams, combine):
+        self.groups = chrom_groups(streams)
+        self.group = next(self.groups, None)
+        self.combine = combine
+        self.last = None
+        self.coverage = None
+
+    def get(self, chrom, start):
+        """
+        The `Coverage` of chromosome `chrom` for a query starting at
+        `start`, None if `combine` returns None or there are no intervals
+        on `chrom`.
+        """
+        if self.last is not None and (chrom, start) < self.last:
+            raise Exception(
+                f"Queries are not sorted: {chrom}:{start} after {self.last[0]}:{self.last[1]}"
+                " (sort with LC_ALL=C sort -k1,1 -k2,2n)"
+            )
+        if self.last is None or chrom != self.last[0]:
+            while self.group is not None and self.group[0] < chrom:
+                self.group = next(self.groups, None)
+            self.coverage = None
+            if self.group is not None and self.group[0] == chrom:
+                runs = self.combine(self.group[1])
+                if runs is not None:
+                    self.coverage = Coverage((run_start, run_end) for _, run_start, run_end in runs)
+        self.last = (chrom, start)
+        return self.coverage
+
+
+def sorted_coverage(primary, streams, combine):
+    """
+    Pair each item of the sorted `primary` reader with its `Coverage` from
+    a `ChromCoverage` of `streams`. Items that are not intervals are paired
+    with None.
+    """
+    coverage = ChromCoverage(streams, combine)
+    for interval in primary:
+        if isinstance(interval, GenomicInterval):
+            yield interval, coverage.get(interval.chrom, interval.start)
+        else:
+            yield interval, None
+
+
+def bed_intervals(f, chrom_col=0, start_col=1, end_col=2):
+    """
+    Yield `(chrom, start, end)` for the lines of a BED (or similar) file,
+    skipping comments and blank lines.
+    """
+    for line in f:
+        if line.startswith("#") or line.isspace():
+            continue
+        fields = line.split()
+        yield fields[chrom_col], int(fields[start_col]), int(fields[end_col])
@@ -0,0 +1,77 @@
+"""
+Tests for `bx.intervals.operations.sweep`, checking the sorted input modes of
+`intersect` and `subtract` against their bitset implementations.
+"""
+
+import random
+
+import pytest
+
+from bx.intervals.io import NiceReaderWrapper
+from bx.intervals.operations.intersect import intersect
+from bx.intervals.operations.subtract import subtract
+from bx.intervals.operations.sweep import (
+    reader_intervals,
+    SortedStream,
+)
+
+
+def random_bed(rng, n, chroms):
+    rows = []
+    for i in range(n):
+        start = rng.randint(0, 3000)
+        rows.append((rng.choice(chroms), start, start + rng.randint(0, 200), f"n{i}", 0, rng.choice("+-")))
+    rows.sort(key=lambda row: row[:2])
+    return ["\t".join(map(str, row)) for row in rows]
+
+
+def reader(lines):
+    return NiceReaderWrapper(iter(lines), chrom_col=0, start_col=1, end_col=2, strand_col=5, fix_strand=True)
+
+
+def run(operation, beds, **kwargs):
+    return [str(interval) for interval in operation([reader(bed) for bed in beds], **kwargs)]
+
+
+@pytest.mark.parametrize("operation", [intersect, subtract])
+def test_same_as_bitsets(operation):
+    rng = random.Random(5)
+    for _ in range(50):
+        chroms = rng.sample(["chr1", "chr10", "chr2", "chrX"], rng.randint(1, 4))
+        beds = [random_bed(rng, rng.randint(0, 80), chroms) for _ in range(rng.randint(2, 4))]
+        kwargs = {"mincols": rng.choice([1, 5, 50]), "pieces": rng.random() < 0.5}
+        assert run(operation, beds, sorted_input=True, **kwargs) == run(operation, beds, **kwargs)
+
+
+def test_padding():
+    rng = random.Random(9)
+    for _ in range(20):
+        bed = random_bed(rng, 60, ["chr1", "chr2"])
+        upstream_pad, downstream_pad = rng.randint(0, 300), rng.randint(0, 300)
+        expected = []
+        for line in bed:
+            chrom, start, end, name, score, strand = line.split("\t")
+            if strand == "-":
+                start, end = int(start) - downstream_pad, int(end) + upstream_pad
+            else:
+                start, end = int(start) - upstream_pad, int(end) + downstream_pad
+            expected.append((chrom, max(start, 0), end))
+        expected.sort()
+        intervals = list(reader_intervals(reader(bed), upstream_pad, downstream_pad))
+        assert sorted(intervals) == expected
+        # still sorted after padding
+        assert list(SortedStream(intervals)) == intervals
+
+
+@pytest.mark.parametrize("operation", [intersect, subtract])
+def test_padding_rejected(operation):
+    # the bitset path ignores padding, so sorted input does not allow it
+    beds = [["chr1\t10\t20"], ["chr1\t0\t100"]]
+    with pytest.raises(Exception, match="not supported"):
+        run(operation, beds, upstream_pad=5, sorted_input=True)
+
+
+def test_unsorted():
+    beds = [["chr1\t10\t20", "chr1\t5\t8"], ["chr1\t0\t100"]]
+    with pytest.raises(Exception, match="LC_ALL=C"):
+        run(intersect, beds, sorted_input=True)
@@ -3,6 +3,9 @@ Classes for generating random sets of intervals over larger regions.
 """
 
 import bisect
+import multiprocessing
+
+import numpy
 
 from bx.bitset import BitSet
 
@@ -45,15 +48,7 @@ def throw_random_gap_list(lengths, mask, save_interval_func, allow_overlap=False
     # Use mask to find the gaps;  gaps is a list of (length,start,end)
     lengths = [length for length in lengths if length > 0]
     min_length = min(lengths)
-    gaps = []
-    start = end = 0
-    while True:
-        start = mask.next_clear(end)
-        if start == mask.size:
-            break
-        end = mask.next_set(start)
-        if end - start >= min_length:
-            gaps.append((end - start, start, None))
+    gaps = [(end - start, start, None) for start, end in mask_regions(mask) if end - start >= min_length]
     # Sort (long regions first)
     gaps.sort()
     gaps.reverse()
@@ -61,6 +56,22 @@ def throw_random_gap_list(lengths, mask, save_interval_func, allow_overlap=False
     throw_random_private(lengths, gaps, save_interval_func, allow_overlap, three_args=False)
 
 
+def mask_regions(mask):
+    """
+    Returns the runs of clear bits in the BitSet `mask` (the regions where
+    intervals may be placed) as a list of (start, end) pairs.
+    """
+    regions = []
+    start = end = 0
+    while end < mask.size:
+        start = mask.next_clear(end)
+        if start == mask.size:
+            break
+        end = mask.next_set(start)
+        regions.append((start, end))
+    return regions
+
+
 def throw_random_intervals(lengths, regions, save_interval_func=None, allow_overlap=False):
     """
     Generates a set of non-overlapping random intervals from a length
@@ -106,7 +117,7 @@ def overwrite_start_end(s, e, rgn):
     return tuple(rgn)
 
 
-def throw_random_private(lengths, regions, save_interval_func, allow_overlap=False, three_args=True):
+def throw_random_private(lengths, regions, save_interval_func, allow_overlap=False, three_args=True, randrange=None):
     """
     (Internal function;  we expect calls only through the interface functions
     above)
@@ -118,6 +129,8 @@ def throw_random_private(lengths, regions, save_interval_func, allow_overlap=Fal
     `save_interval_func`: A function accepting three arguments which will be
                           passed the (start,stop,extra) for each generated
                           interval.
+    `randrange`: A function returning a random integer in range(n) for n,
+                 `random.randrange` by default.
     """
 
     # Implementation:
@@ -159,6 +172,8 @@ def throw_random_private(lengths, regions, save_interval_func, allow_overlap=Fal
     #   then the desired region is region 2 or lower.  Otherwise it is region 3 or
     #   higher.
 
+    if randrange is None:
+        randrange = random.randrange
     min_length = min(lengths)
     prev_length = None  # (force initial cc array construction)
     cc = [0] * (len(regions) + len(lengths) - 1)
@@ -184,7 +199,7 @@ def throw_random_private(lengths, regions, save_interval_func, allow_overlap=Fal
                 )
             hi_rgn -= 1
         # Select a candidate
-        s = random.randrange(candidates)
+        s = randrange(candidates)
         # ..
         # ..for ix in range( len( regions ) ):
         # ..    region = regions[ix]
@@ -195,7 +210,7 @@ def throw_random_private(lengths, regions, save_interval_func, allow_overlap=Fal
         lo = 0
         hi = hi_rgn
         while hi > lo:
-            mid = (lo + hi + 1) / 2  # (we round up to prevent infinite loop)
+            mid = (lo + hi + 1) // 2  # (we round up to prevent infinite loop)
             if s < cc[mid]:
                 hi = mid - 1  # (s <  num candidates from 0..mid-1)
             else:
@@ -226,3 +241,217 @@ def throw_random_private(lengths, regions, save_interval_func, allow_overlap=Fal
         else:
             save_interval_func(rgn_start + s, rgn_start + s + length)
         num_thrown += 1
+
+
+def throw_random_batch(lengths, regions, replicates, allow_overlap=False, rng=None, max_rounds=50):
+    """
+    Generates `replicates` random sets of intervals from a length
+    distribution at once, with numpy. Each interval is placed uniformly
+    among the positions where it fits entirely inside one region, as by
+    `throw_random_intervals`.
+
+    `lengths`: the length of each interval to be generated (all positive).
+    `regions`: A list of regions in which intervals can be placed.  Elements
+               are tuples or lists of the form (start, end, ...); use
+               `mask_regions` to get them from a mask.
+    `rng`: a `numpy.random.Generator`, or a seed for one.
+
+    Returns two int64 arrays of shape (replicates, len(lengths)): the start
+    of interval j in replicate i is `starts[i, j]`, inside region
+    `region_ids[i, j]`.
+
+    Unless `allow_overlap` is set, the intervals of a replicate must not
+    overlap. All intervals are first placed independently. Then, for up to
+    `max_rounds` rounds, the intervals of the last round that overlap
+    another interval are placed again, keeping the others. Any replicate still
+    overlapping after that is thrown again one interval at a time by
+    `throw_random_private`.
+
+    >>> starts, region_ids = throw_random_batch([5, 3], [(0, 10), (100, 110)], 4, rng=1)
+    >>> starts.shape
+    (4, 2)
+    >>> bool(((starts >= 0) & (starts + [5, 3] <= 10) | (starts >= 100) & (starts + [5, 3] <= 110)).all())
+    True
+    """
+    rng = numpy.random.default_rng(rng)
+    lengths = numpy.asarray(lengths, dtype=numpy.int64)
+    if (lengths <= 0).any():
+        raise Exception("Interval lengths must be positive")
+    region_starts = numpy.array([region[0] for region in regions], dtype=numpy.int64)
+    region_lengths = numpy.array([region[1] - region[0] for region in regions], dtype=numpy.int64)
+    region_lengths = numpy.maximum(region_lengths, 0)
+    # Regions are laid end to end in a "virtual" coordinate space, where
+    # offsets[r] is the position of the start of region r
+    offsets = numpy.zeros(len(region_lengths) + 1, dtype=numpy.int64)
+    numpy.cumsum(region_lengths, out=offsets[1:])
+    if len(lengths) and (len(region_lengths) == 0 or lengths.max() > region_lengths.max()):
+        raise MaxtriesException(f"No region can fit an interval of length {lengths.max()}")
+    shape = (replicates, len(lengths))
+    positions = draw_positions(numpy.broadcast_to(lengths, shape).ravel(), offsets, rng).reshape(shape)
+    if not allow_overlap and len(lengths) > 1:
+        # Rows still to check, and the intervals of those rows drawn last round
+        rows = numpy.arange(replicates)
+        fresh = numpy.ones(shape, dtype=bool)
+        for _ in range(max_rounds):
+            redraw = overlapping(positions[rows], lengths) & fresh
+            conflicted = redraw.any(axis=1)
+            rows, redraw = rows[conflicted], redraw[conflicted]
+            if len(rows) == 0:
+                break
+            which_rows, cols = numpy.nonzero(redraw)
+            positions[rows[which_rows], cols] = draw_positions(lengths[cols], offsets, rng)
+            fresh = redraw
+        else:
+            for row in rows[overlapping(positions[rows], lengths).any(axis=1)]:
+                positions[row] = throw_row(lengths, offsets, rng)
+    region_ids = numpy.searchsorted(offsets, positions, side="right") - 1
+    return region_starts[region_ids] + positions - offsets[region_ids], region_ids
+
+
+def draw_positions(lengths, offsets, rng, tries=20):
+    """
+    Draws a virtual position for each of `lengths`, uniformly among the
+    positions where it fits inside one of the regions laid out at
+    `offsets`.
+    """
+    positions = numpy.empty(len(lengths), dtype=numpy.int64)
+    todo = numpy.arange(len(lengths))
+    # Draw anywhere and retry the intervals that run past the end of their region
+    for _ in range(tries):
+        if len(todo) == 0:
+            return positions
+        drawn = rng.integers(offsets[-1], size=len(todo))
+        region_ids = numpy.searchsorted(offsets, drawn, side="right")
+        fits = drawn + lengths[todo] <= offsets[region_ids]
+        positions[todo[fits]] = drawn[fits]
+        todo = todo[~fits]
+    # Long intervals fit in few places: choose among their candidates directly
+    region_lengths = numpy.diff(offsets)
+    for length in numpy.unique(lengths[todo]):
+        which = todo[lengths[todo] == length]
+        candidates = numpy.maximum(region_lengths - length + 1, 0)
+        cumulative = numpy.cumsum(candidates)
+        drawn = rng.integers(cumulative[-1], size=len(which))
+        region_ids = numpy.searchsorted(cumulative, drawn, side="right")
+        positions[which] = offsets[region_ids] + drawn - (cumulative[region_ids] - candidates[region_ids])
+    return positions
+
+
+def overlapping(positions, lengths):
+    """
+    Marks the intervals in each row of `positions` that overlap another
+    interval of the same row.
+    """
+    order = numpy.argsort(positions, axis=1, kind="stable")
+    starts = numpy.take_along_axis(positions, order, axis=1)
+    ends = starts + lengths[order]
+    marked = numpy.zeros(positions.shape, dtype=bool)
+    # Sorted by start, an interval overlaps a later one only if it overlaps
+    # the next, and an earlier one if it starts before the furthest end so far
+    marked[:, :-1] = starts[:, 1:] < ends[:, :-1]
+    marked[:, 1:] |= starts[:, 1:] < numpy.maximum.accumulate(ends, axis=1)[:, :-1]
+    result = numpy.empty_like(marked)
+    numpy.put_along_axis(result, order, marked, axis=1)
+    return result
+
+
+def throw_row(lengths, offsets, rng, tries=10):
+    """
+    Places one set of non-overlapping intervals with `throw_random_private`
+    (longest first), returning their virtual positions. Gives up with a
+    MaxtriesException after failing `tries` times.
+    """
+    order = numpy.argsort(-lengths, kind="stable")
+    for i in range(tries):
+        regions = [(int(end - start), int(start), None) for start, end in zip(offsets[:-1], offsets[1:])]
+        regions.sort(reverse=True)
+        placed = []
+        try:
+            throw_random_private(
+                lengths[order].tolist(),
+                regions,
+                lambda s, e, extra: placed.append(s),
+                randrange=lambda n: int(rng.integers(n)),
+            )
+        except MaxtriesException:
+            if i == tries - 1:
+                raise
+            continue
+        positions = numpy.empty(len(lengths), dtype=numpy.int64)
+        positions[order] = placed
+        return positions
+
+
+def covered_bases(starts, ends, targets):
+    """
+    Counts, for each interval [starts, ends) (arrays of any shape), the
+    number of its bases covered by the intervals `targets`, a list of
+    (start, end, ...) tuples that may overlap each other.
+
+    >>> covered_bases(numpy.array([0, 10, 3]), numpy.array([10, 20, 4]), [(5, 12), (8, 15), (30, 40)]).tolist()
+    [5, 5, 0]
+    """
+    target_starts = numpy.array([target[0] for target in targets], dtype=numpy.int64)
+    target_ends = numpy.array([target[1] for target in targets], dtype=numpy.int64)
+    keep = target_ends > target_starts
+    target_starts, target_ends = target_starts[keep], target_ends[keep]
+    if len(target_starts) == 0:
+        return numpy.zeros(numpy.shape(starts), dtype=numpy.int64)
+    # Merge the targets into disjoint blocks
+    order = numpy.argsort(target_starts, kind="stable")
+    target_starts = target_starts[order]
+    furthest = numpy.maximum.accumulate(target_ends[order])
+    first = numpy.ones(len(target_starts), dtype=bool)
+    first[1:] = target_starts[1:] > furthest[:-1]
+    block_starts = target_starts[first]
+    block_lengths = furthest[numpy.append(first[1:], True)] - block_starts
+    before = numpy.concatenate(([0], numpy.cumsum(block_lengths)[:-1]))
+
+    def covered_before(positions):
+        # Number of covered bases before each position
+        blocks = numpy.maximum(numpy.searchsorted(block_starts, positions, side="right") - 1, 0)
+        return before[blocks] + numpy.clip(positions - block_starts[blocks], 0, block_lengths[blocks])
+
+    return covered_before(numpy.asarray(ends)) - covered_before(numpy.asarray(starts))
+
+
+def random_overlaps(
+    lengths, regions, targets, replicates, allow_overlap=False, seed=None, processes=1, batch_size=1000, max_rounds=50
+):
+    """
+    Throws `replicates` random sets of intervals of the given `lengths` into
+    `regions` (see `throw_random_batch`) and returns, for each replicate,
+    the number of bases of its intervals covered by `targets`. This is the
+    null distribution of a permutation test of the overlap between two sets
+    of intervals. If `allow_overlap` is set, bases covered by several random
+    intervals are counted once for each.
+
+    Replicates are thrown in batches of `batch_size`, in a pool of
+    `processes` processes (None: one per CPU). Each batch has its own random
+    stream spawned from `seed`, so a given seed gives the same result
+    whatever the number of processes.
+
+    >>> a = random_overlaps([10, 20], [(0, 1000)], [(0, 500)], 50, seed=7, batch_size=20)
+    >>> b = random_overlaps([10, 20], [(0, 1000)], [(0, 500)], 50, seed=7, processes=2, batch_size=20)
+    >>> len(a), bool((a == b).all()), bool(((a >= 0) & (a <= 30)).all())
+    (50, True, True)
+    """
+    streams = numpy.random.SeedSequence(seed).spawn((replicates + batch_size - 1) // batch_size)
+    tasks = [
+        (lengths, regions, targets, min(batch_size, replicates - i * batch_size), allow_overlap, stream, max_rounds)
+        for i, stream in enumerate(streams)
+    ]
+    if processes == 1 or len(tasks) <= 1:
+        results = list(map(overlap_batch, tasks))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(overlap_batch, tasks)
+    return numpy.concatenate(results) if results else numpy.zeros(0, dtype=numpy.int64)
+
+
+def overlap_batch(task):
+    """Throws one batch of replicates and counts their overlap with the targets"""
+    lengths, regions, targets, replicates, allow_overlap, stream, max_rounds = task
+    rng = numpy.random.default_rng(stream)
+    starts, _ = throw_random_batch(lengths, regions, replicates, allow_overlap, rng, max_rounds)
+    return covered_bases(starts, starts + numpy.asarray(lengths, dtype=numpy.int64), targets).sum(axis=1)
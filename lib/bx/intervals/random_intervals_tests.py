@@ -0,0 +1,116 @@
+"""
+Tests for `bx.intervals.random_intervals`.
+"""
+
+import random
+
+import numpy
+import pytest
+
+from bx.bitset import BitSet
+from bx.intervals.random_intervals import (
+    covered_bases,
+    mask_regions,
+    MaxtriesException,
+    random_overlaps,
+    throw_random_batch,
+    throw_random_intervals,
+)
+
+LENGTHS = [300, 200, 200, 50, 10, 10, 1]
+
+
+def make_mask():
+    mask = BitSet(2000)
+    mask.set_range(0, 100)
+    mask.set_range(700, 300)
+    mask.set_range(1500, 50)
+    return mask
+
+
+def check_placement(starts, region_ids, lengths, regions, allow_overlap=False):
+    regions = numpy.array(regions)
+    ends = starts + lengths
+    assert (starts >= regions[region_ids, 0]).all()
+    assert (ends <= regions[region_ids, 1]).all()
+    if not allow_overlap:
+        order = numpy.argsort(starts, axis=1)
+        starts = numpy.take_along_axis(starts, order, axis=1)
+        ends = numpy.take_along_axis(ends, order, axis=1)
+        assert (ends[:, :-1] <= starts[:, 1:]).all()
+
+
+def test_throw_random_intervals():
+    random.seed(1)
+    regions = [(0, 100, "a"), (500, 520, "b")]
+    for _ in range(20):
+        intervals = throw_random_intervals([50, 20, 10], regions)
+        assert sorted(end - start for start, end, _ in intervals) == [10, 20, 50]
+        for start, end, name in intervals:
+            assert (0 <= start and end <= 100) if name == "a" else (500 <= start and end <= 520)
+
+
+def test_mask_regions():
+    assert mask_regions(make_mask()) == [(100, 700), (1000, 1500), (1550, 2000)]
+
+
+@pytest.mark.parametrize("allow_overlap", [False, True])
+def test_throw_random_batch(allow_overlap):
+    regions = mask_regions(make_mask())
+    starts, region_ids = throw_random_batch(LENGTHS, regions, 500, allow_overlap=allow_overlap, rng=2)
+    assert starts.shape == region_ids.shape == (500, len(LENGTHS))
+    check_placement(starts, region_ids, LENGTHS, regions, allow_overlap)
+    # the same seed gives the same intervals
+    assert (throw_random_batch(LENGTHS, regions, 500, allow_overlap=allow_overlap, rng=2)[0] == starts).all()
+
+
+def test_uniform():
+    # an interval of length 3 has 3 + 2 places to go
+    starts, _ = throw_random_batch([3], [(0, 5), (10, 14)], 50000, rng=3)
+    positions, counts = numpy.unique(starts, return_counts=True)
+    assert positions.tolist() == [0, 1, 2, 10, 11]
+    assert (abs(counts - 10000) < 500).all()
+
+
+def test_tight():
+    regions = [(0, 100), (200, 300)]
+    lengths = [60, 50, 30, 30]
+    # with no rounds of redrawing, rows are thrown again one interval at a time
+    for max_rounds in (50, 0):
+        starts, region_ids = throw_random_batch(lengths, regions, 200, rng=4, max_rounds=max_rounds)
+        check_placement(starts, region_ids, lengths, regions)
+    with pytest.raises(MaxtriesException):
+        throw_random_batch([101], regions, 1)
+
+
+def test_covered_bases():
+    rng = random.Random(5)
+    targets = [(s, s + rng.randint(0, 50)) for s in (rng.randint(0, 1000) for _ in range(30))]
+    covered = numpy.zeros(1100, dtype=bool)
+    for start, end in targets:
+        covered[start:end] = True
+    starts = numpy.array([rng.randint(0, 1000) for _ in range(200)]).reshape(20, 10)
+    ends = starts + numpy.array([rng.randint(0, 100) for _ in range(200)]).reshape(20, 10)
+    expected = [[covered[s:e].sum() for s, e in zip(*row)] for row in zip(starts, ends)]
+    assert covered_bases(starts, ends, targets).tolist() == expected
+    assert covered_bases(starts, ends, []).tolist() == [[0] * 10] * 20
+
+
+def test_random_overlaps():
+    mask = make_mask()
+    regions = mask_regions(mask)
+    targets = [(150, 400), (1200, 1300)]
+    overlaps = random_overlaps(LENGTHS, regions, targets, 250, seed=6, batch_size=100)
+    assert overlaps.shape == (250,)
+    assert (random_overlaps(LENGTHS, regions, targets, 250, seed=6, processes=2, batch_size=100) == overlaps).all()
+    # compare with throwing into bitsets
+    target_bits = BitSet(mask.size)
+    for start, end in targets:
+        target_bits.set_range(start, end - start)
+    starts, _ = throw_random_batch(LENGTHS, regions, 20, rng=7)
+    for row in starts:
+        bits = BitSet(mask.size)
+        for start, length in zip(row, LENGTHS):
+            bits.set_range(int(start), length)
+        bits &= target_bits
+        assert covered_bases(row, row + LENGTHS, targets).sum() == bits.count_range(0, bits.size)
@@ -0,0 +1,399 @@
+"""
+A read-only interval index stored in a few contiguous arrays, for sets of
+intervals too large to keep in an `IntervalTree`.
+
+The intervals are sorted by start and arranged as an implicit augmented
+binary tree (as in Heng Li's cgranges): the node at index i of the sorted
+arrays sits at the level given by the number of trailing 1 bits of i, and
+for every node the largest end in its subtree is kept in a third array. No
+pointers or Python objects are stored, an index takes 12 bytes per interval
+for coordinates that fit in 32 bits (24 bytes otherwise) plus 8 bytes for
+the original position of each interval.
+
+A `StaticIntervalTree` answers the same `find`, `before` and `after`
+queries as an `IntervalTree` holding the same intervals, with results in
+the same order. It can be saved to a file and loaded again by memory
+mapping the arrays, so opening a large index is nearly free.
+
+>>> tree = StaticIntervalTree( [10, 0, 3], [20, 10, 7], values=["c", "a", "b"] )
+>>> tree.find( 5, 12 )
+['a', 'b', 'c']
+>>> tree.before( 10 )
+['b']
+>>> tree.after( 5 )
+['c']
+
+Many queries can be answered at once, without holding the GIL, as
+per-query counts or as offsets into a flat array of interval ids:
+
+>>> tree.count_many( [0, 20], [5, 30] ).tolist()
+[2, 0]
+>>> offsets, ids = tree.find_many( [0, 20], [5, 30] )
+>>> offsets.tolist(), ids.tolist()
+([0, 2, 2], [1, 2])
+"""
+
+import pickle
+import struct
+
+import numpy
+
+cimport cython
+from libc.stdint cimport (
+    int32_t,
+    int64_t,
+)
+
+ctypedef fused coord_t:
+    int32_t
+    int64_t
+
+MAGIC = b"BXSTREE1"
+VERSION = 1
+# magic, version, coordinate size, number of intervals, root level, size of the pickled values
+HEADER = struct.Struct( "<8sIIqiq" )
+
+cdef int64_t INT32_MIN = -2147483648
+cdef int64_t INT32_MAX = 2147483647
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int index_core( const coord_t[:] starts, const coord_t[:] ends, coord_t[:] maxends ) noexcept nogil:
+    """
+    Fill `maxends` with the largest end in the subtree of each node, returns
+    the level of the root (-1 if there are no intervals).
+    """
+    cdef int64_t n = starts.shape[0], i, i0, step, x, last_i = 0
+    cdef coord_t last = 0, el, er, e
+    cdef int k
+    if n == 0:
+        return -1
+    # leaves, at level 0
+    i = 0
+    while i < n:
+        last_i = i
+        last = ends[i]
+        maxends[i] = last
+        i += 2
+    # internal nodes, bottom up
+    k = 1
+    while ( <int64_t> 1 << k ) <= n:
+        x = <int64_t> 1 << ( k - 1 )
+        i0 = ( x << 1 ) - 1
+        step = x << 2
+        i = i0
+        while i < n:
+            el = maxends[i - x]
+            er = maxends[i + x] if i + x < n else last
+            e = ends[i]
+            if el > e:
+                e = el
+            if er > e:
+                e = er
+            maxends[i] = e
+            i += step
+        # move last_i up to its parent, the rightmost node at this level
+        last_i = last_i - x if ( last_i >> k ) & 1 else last_i + x
+        if last_i < n and maxends[last_i] > last:
+            last = maxends[last_i]
+        k += 1
+    return k - 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int64_t overlap( const coord_t[:] starts, const coord_t[:] ends, const coord_t[:] maxends, int root_k,
+                  int64_t start, int64_t end, int64_t *hits, int64_t capacity ) noexcept nogil:
+    """
+    Find the intervals overlapping [start,end), in sorted order. The first
+    `capacity` of their positions are written to `hits`, the total number
+    found is returned.
+    """
+    cdef int64_t n = starts.shape[0], i, i0, i1, x, y
+    cdef int64_t count = 0
+    cdef int t = 0, k, w
+    cdef int64_t stack_x[64]
+    cdef int stack_k[64]
+    cdef int stack_w[64]
+    if root_k < 0:
+        return 0
+    stack_x[0] = ( <int64_t> 1 << root_k ) - 1
+    stack_k[0] = root_k
+    stack_w[0] = 0
+    t = 1
+    while t > 0:
+        t -= 1
+        x = stack_x[t]
+        k = stack_k[t]
+        w = stack_w[t]
+        if k <= 3:
+            # small subtree, scan it
+            i0 = x >> k << k
+            i1 = i0 + ( <int64_t> 1 << ( k + 1 ) ) - 1
+            if i1 > n:
+                i1 = n
+            i = i0
+            while i < i1 and starts[i] < end:
+                if start < ends[i]:
+                    if count < capacity:
+                        hits[count] = i
+                    count += 1
+                i += 1
+        elif w == 0:
+            # revisit this node once its left subtree is done
+            stack_x[t] = x
+            stack_k[t] = k
+            stack_w[t] = 1
+            t += 1
+            y = x - ( <int64_t> 1 << ( k - 1 ) )
+            # the left child may be past the end, but have nodes in its subtree
+            if y >= n or maxends[y] > start:
+                stack_x[t] = y
+                stack_k[t] = k - 1
+                stack_w[t] = 0
+                t += 1
+        elif x < n and starts[x] < end:
+            if start < ends[x]:
+                if count < capacity:
+                    hits[count] = x
+                count += 1
+            stack_x[t] = x + ( <int64_t> 1 << ( k - 1 ) )
+            stack_k[t] = k - 1
+            stack_w[t] = 0
+            t += 1
+    return count
+
+
+def as_queries( starts, ends ):
+    starts = numpy.ascontiguousarray( starts, dtype=numpy.int64 )
+    ends = numpy.ascontiguousarray( ends, dtype=numpy.int64 )
+    if starts.ndim != 1 or starts.shape != ends.shape:
+        raise ValueError( "starts and ends must be one dimensional and of the same length" )
+    return starts, ends
+
+
+cdef class StaticIntervalTree:
+    """
+    Read-only index of the intervals [starts[i],ends[i]), associated with
+    `values[i]`. Without `values` the value of an interval is its position
+    in `starts` and `ends`. `ids` can give other integer ids for the
+    intervals, which are then used to look up values.
+    """
+
+    cdef readonly object starts, ends, maxends, ids, values
+    cdef readonly int root_k
+    cdef bint wide
+    cdef const int32_t[:] starts32
+    cdef const int32_t[:] ends32
+    cdef const int32_t[:] maxends32
+    cdef const int64_t[:] starts64
+    cdef const int64_t[:] ends64
+    cdef const int64_t[:] maxends64
+    cdef const int64_t[:] ids64
+
+    def __init__( self, starts, ends, values=None, ids=None ):
+        starts = numpy.ascontiguousarray( starts, dtype=numpy.int64 )
+        ends = numpy.ascontiguousarray( ends, dtype=numpy.int64 )
+        if starts.ndim != 1 or starts.shape != ends.shape:
+            raise ValueError( "starts and ends must be one dimensional and of the same length" )
+        if values is not None and ids is None and len( values ) != len( starts ):
+            raise ValueError( "values must be as long as starts and ends" )
+        # ties keep their input order, as in an IntervalTree
+        order = numpy.argsort( starts, kind="stable" )
+        if ids is None:
+            ids = order
+        else:
+            ids = numpy.ascontiguousarray( ids, dtype=numpy.int64 )[order]
+        dtype = numpy.int64
+        if len( starts ) == 0 or ( starts.min() >= INT32_MIN and ends.max() <= INT32_MAX
+                                   and ends.min() >= INT32_MIN and starts.max() <= INT32_MAX ):
+            dtype = numpy.int32
+        starts = starts[order].astype( dtype )
+        ends = ends[order].astype( dtype )
+        maxends = numpy.empty_like( ends )
+        if dtype == numpy.int32:
+            root_k = index_core[int32_t]( starts, ends, maxends )
+        else:
+            root_k = index_core[int64_t]( starts, ends, maxends )
+        self.set_arrays( starts, ends, maxends, ids, root_k, values )
+
+    cdef set_arrays( self, starts, ends, maxends, ids, int root_k, values ):
+        self.starts = starts
+        self.ends = ends
+        self.maxends = maxends
+        self.ids = ids
+        self.root_k = root_k
+        self.values = values
+        self.ids64 = ids
+        self.wide = starts.dtype == numpy.int64
+        if self.wide:
+            self.starts64 = starts
+            self.ends64 = ends
+            self.maxends64 = maxends
+        else:
+            self.starts32 = starts
+            self.ends32 = ends
+            self.maxends32 = maxends
+
+    def __len__( self ):
+        return len( self.starts )
+
+    def __reduce__( self ):
+        return ( StaticIntervalTree, ( self.starts, self.ends, self.values, self.ids ) )
+
+    cdef int64_t _overlap( self, int64_t start, int64_t end, int64_t *hits, int64_t capacity ) noexcept nogil:
+        if self.wide:
+            return overlap( self.starts64, self.ends64, self.maxends64, self.root_k, start, end, hits, capacity )
+        return overlap( self.starts32, self.ends32, self.maxends32, self.root_k, start, end, hits, capacity )
+
+    def find_positions( self, int64_t start, int64_t end ):
+        """
+        Positions in the sorted arrays (`starts`, `ends`, `ids`) of the
+        intervals overlapping [start,end), in sorted order.
+        """
+        cdef int64_t count
+        positions = numpy.empty( 16, dtype=numpy.int64 )
+        cdef int64_t[:] hits = positions
+        count = self._overlap( start, end, &hits[0], len( positions ) )
+        if count > len( positions ):
+            positions = numpy.empty( count, dtype=numpy.int64 )
+            hits = positions
+            self._overlap( start, end, &hits[0], count )
+        return positions[:count]
+
+    def find_ids( self, start, end ):
+        """
+        Ids (by default positions in the input arrays) of the intervals
+        overlapping [start,end), in sorted order.
+        """
+        return self.ids[self.find_positions( start, end )]
+
+    def find( self, start, end ):
+        """
+        Return a sorted list of the values of all intervals overlapping
+        [start,end).
+        """
+        return self.lookup( self.find_positions( start, end ) )
+
+    def before( self, position, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie before `position` and are no
+        further than `max_dist` positions away
+        """
+        # as IntervalNode.left, which looks strictly left of position - 1
+        position -= 1
+        positions = self.find_positions( position - max_dist, position + 1 )
+        positions = positions[self.ends[positions] <= position][::-1]
+        if len( positions ) != num_intervals:
+            positions = positions[numpy.argsort( -self.ends[positions].astype( numpy.int64 ), kind="stable" )]
+        return self.lookup( positions[:num_intervals] )
+
+    def after( self, position, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie after `position` and are no
+        further than `max_dist` positions away
+        """
+        # as IntervalNode.right, which looks strictly right of position + 1
+        position += 1
+        if max_dist <= 0:
+            return []
+        lo, hi = numpy.searchsorted( self.starts, [position, position + max_dist] )
+        return self.lookup( numpy.arange( lo, min( hi, lo + num_intervals ) ) )
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def count_many( self, starts, ends ):
+        """
+        Number of intervals overlapping each of the queries
+        [starts[i],ends[i]), as an array.
+        """
+        cdef const int64_t[:] qstarts, qends
+        qstarts, qends = as_queries( starts, ends )
+        counts = numpy.empty( len( qstarts ), dtype=numpy.int64 )
+        cdef int64_t[:] c = counts
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range( qstarts.shape[0] ):
+                c[i] = self._overlap( qstarts[i], qends[i], NULL, 0 )
+        return counts
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def find_many( self, starts, ends ):
+        """
+        Find the intervals overlapping each of the queries [starts[i],ends[i]).
+        Returns `(offsets, ids)` where the ids of the intervals overlapping
+        query i, in sorted order, are `ids[offsets[i]:offsets[i+1]]`.
+        """
+        counts = self.count_many( starts, ends )
+        offsets = numpy.zeros( len( counts ) + 1, dtype=numpy.int64 )
+        numpy.cumsum( counts, out=offsets[1:] )
+        ids = numpy.empty( offsets[len( counts )], dtype=numpy.int64 )
+        cdef const int64_t[:] qstarts, qends
+        qstarts, qends = as_queries( starts, ends )
+        cdef const int64_t[:] o = offsets
+        cdef int64_t[:] hits = ids
+        cdef Py_ssize_t i
+        cdef int64_t j
+        with nogil:
+            for i in range( qstarts.shape[0] ):
+                if o[i + 1] > o[i]:
+                    self._overlap( qstarts[i], qends[i], &hits[o[i]], o[i + 1] - o[i] )
+                    for j in range( o[i], o[i + 1] ):
+                        hits[j] = self.ids64[hits[j]]
+        return offsets, ids
+
+    def lookup( self, positions ):
+        """Values of the intervals at `positions` in the sorted arrays"""
+        ids = self.ids[positions].tolist()
+        if self.values is None:
+            return ids
+        values = self.values
+        return [values[i] for i in ids]
+
+    # ---- Persistence -------------------------------------------------------
+
+    def save( self, filename ):
+        """
+        Write the index to `filename`. Values are pickled into the file,
+        everything else is stored as arrays that `load` memory maps.
+        """
+        values = b"" if self.values is None else pickle.dumps( self.values, pickle.HIGHEST_PROTOCOL )
+        with open( filename, "wb" ) as f:
+            f.write( HEADER.pack( MAGIC, VERSION, self.starts.dtype.itemsize, len( self ), self.root_k, len( values ) ) )
+            for a in ( self.starts, self.ends, self.maxends, self.ids ):
+                f.write( a.tobytes() )
+                f.write( b"\0" * ( -f.tell() % 8 ) )
+            f.write( values )
+
+    @classmethod
+    def load( cls, filename ):
+        """Open an index written by `save`, memory mapping its arrays"""
+        with open( filename, "rb" ) as f:
+            header = f.read( HEADER.size )
+        if len( header ) != HEADER.size:
+            raise Exception( f"{filename} is not a static interval tree file" )
+        magic, version, itemsize, n, root_k, values_size = HEADER.unpack( header )
+        if magic != MAGIC:
+            raise Exception( f"{filename} is not a static interval tree file" )
+        if version > VERSION:
+            raise Exception( f"Unsupported static interval tree version {version}" )
+        dtype = numpy.int32 if itemsize == 4 else numpy.int64
+        offset = HEADER.size
+        arrays = []
+        for a_dtype in ( dtype, dtype, dtype, numpy.int64 ):
+            if n > 0:
+                arrays.append( numpy.memmap( filename, dtype=a_dtype, mode="r", offset=offset, shape=( n, ) ) )
+            else:
+                arrays.append( numpy.empty( 0, dtype=a_dtype ) )
+            offset += n * numpy.dtype( a_dtype ).itemsize
+            offset += -offset % 8
+        values = None
+        if values_size > 0:
+            with open( filename, "rb" ) as f:
+                f.seek( offset )
+                values = pickle.loads( f.read( values_size ) )
+        cdef StaticIntervalTree tree = cls.__new__( cls )
+        tree.set_arrays( arrays[0], arrays[1], arrays[2], arrays[3], root_k, values )
+        return tree
@@ -0,0 +1,99 @@
+"""
+Tests for `bx.intervals.static_tree`.
+"""
+
+import os
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from bx.intervals.intersection import IntervalTree
+from bx.intervals.static_tree import StaticIntervalTree
+
+
+def random_intervals(rng, n, offset=0):
+    starts = [offset + rng.randint(0, 2000) for _ in range(n)]
+    ends = [s + rng.randint(1, 200) for s in starts]
+    return starts, ends
+
+
+def test_same_as_interval_tree():
+    rng = random.Random(7)
+    for n in (0, 1, 2, 7, 100, 1000):
+        starts, ends = random_intervals(rng, n)
+        tree = IntervalTree()
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            tree.insert(start, end, i)
+        static = StaticIntervalTree(starts, ends)
+        assert len(static) == n
+        for _ in range(50):
+            start = rng.randint(-100, 2300)
+            end = start + rng.randint(0, 300)
+            assert static.find(start, end) == tree.find(start, end)
+            for num_intervals in (1, 3):
+                max_dist = rng.randint(0, 400)
+                assert static.before(start, num_intervals, max_dist) == tree.before(start, num_intervals, max_dist)
+                assert static.after(start, num_intervals, max_dist) == tree.after(start, num_intervals, max_dist)
+
+
+def test_values_and_ids():
+    tree = StaticIntervalTree([10, 0, 3], [20, 10, 7], ids=[5, 6, 7], values={5: "c", 6: "a", 7: "b"})
+    assert tree.find(0, 100) == ["a", "b", "c"]
+    assert tree.find_ids(0, 100).tolist() == [6, 7, 5]
+    assert tree.find_positions(4, 9).tolist() == [0, 1]
+
+
+def test_wide_coordinates():
+    rng = random.Random(11)
+    starts, ends = random_intervals(rng, 500, offset=1 << 33)
+    tree = StaticIntervalTree(starts, ends)
+    assert tree.starts.dtype == numpy.int64
+    for _ in range(50):
+        start = (1 << 33) + rng.randint(-100, 2300)
+        end = start + rng.randint(0, 300)
+        expected = [i for i in sorted(range(500), key=lambda i: starts[i]) if starts[i] < end and ends[i] > start]
+        assert tree.find(start, end) == expected
+
+
+def test_save_and_load():
+    rng = random.Random(13)
+    starts, ends = random_intervals(rng, 300)
+    values = [f"feature{i}" for i in range(300)]
+    tree = StaticIntervalTree(starts, ends, values=values)
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        tree.save(filename)
+        loaded = StaticIntervalTree.load(filename)
+        assert isinstance(loaded.starts, numpy.memmap)
+        assert len(loaded) == 300
+        for _ in range(50):
+            start = rng.randint(-100, 2300)
+            end = start + rng.randint(0, 300)
+            assert loaded.find(start, end) == tree.find(start, end)
+            assert loaded.before(start, 2) == tree.before(start, 2)
+        StaticIntervalTree([], []).save(filename)
+        assert StaticIntervalTree.load(filename).find(0, 100) == []
+    finally:
+        os.remove(filename)
+
+
+def test_find_many():
+    rng = random.Random(17)
+    starts, ends = random_intervals(rng, 1000)
+    tree = StaticIntervalTree(starts, ends)
+    qstarts = numpy.array([rng.randint(-100, 2300) for _ in range(500)])
+    qends = qstarts + numpy.array([rng.randint(0, 300) for _ in range(500)])
+    offsets, ids = tree.find_many(qstarts, qends)
+    counts = tree.count_many(qstarts, qends)
+    assert len(offsets) == 501
+    assert (numpy.diff(offsets) == counts).all()
+    for i, (start, end) in enumerate(zip(qstarts, qends)):
+        assert ids[offsets[i] : offsets[i + 1]].tolist() == tree.find(start, end)
+    with ThreadPoolExecutor(4) as pool:
+        for result in pool.map(lambda _: tree.count_many(qstarts, qends), range(8)):
+            assert (result == counts).all()
+    offsets, ids = tree.find_many([], [])
+    assert offsets.tolist() == [0] and len(ids) == 0
@@ -4,6 +4,7 @@ complete file-like interface.
 """
 
 from cpython.version cimport PY_MAJOR_VERSION
+from libc.string cimport memchr
 
 ctypedef unsigned long long int64_t
 
@@ -12,7 +13,11 @@ cdef extern from "Python.h":
     object PyBytes_FromStringAndSize( char *, Py_ssize_t )
 
 cdef extern from "bgzf.h":
-    ctypedef struct BGZF
+    ctypedef struct BGZF:
+        # the block being read, decompressed
+        void * uncompressed_block
+        int block_length
+        int block_offset
     BGZF * bgzf_open( const char * path, const char * mode )
     int bgzf_close( BGZF * fp )
     int bgzf_read( BGZF * fp, void * data, int length )
@@ -33,11 +38,46 @@ cdef class BGZFFile( object ):
     def close( self ):
         if self.bgzf:
             bgzf_close( self.bgzf )
+            self.bgzf = NULL
     def read( self, int length ):
         cdef object rval
+        cdef int n
         rval = PyBytes_FromStringAndSize( NULL, length )
-        bgzf_read( self.bgzf, PyBytes_AsString( rval ), length )
+        n = bgzf_read( self.bgzf, PyBytes_AsString( rval ), length )
+        if n < 0:
+            raise IOError( "Error reading BGZF file" )
+        # Fewer bytes are returned at the end of the file
+        if n < length:
+            return rval[:n]
         return rval
+    def readline( self ):
+        """Read a line, including the newline, empty at the end of the file"""
+        cdef char c
+        cdef char * block
+        cdef char * newline
+        cdef int n, available
+        parts = []
+        while True:
+            available = self.bgzf.block_length - self.bgzf.block_offset
+            if available <= 0:
+                # Let bgzf_read load the next block
+                n = bgzf_read( self.bgzf, &c, 1 )
+                if n < 0:
+                    raise IOError( "Error reading BGZF file" )
+                if n == 0:
+                    break
+                parts.append( PyBytes_FromStringAndSize( &c, 1 ) )
+                if c == 10:
+                    break
+                continue
+            # Find the end of the line in the current block, then read up to it
+            block = <char *> self.bgzf.uncompressed_block + self.bgzf.block_offset
+            newline = <char *> memchr( block, 10, available )
+            n = available if newline == NULL else newline - block + 1
+            parts.append( self.read( n ) )
+            if newline != NULL:
+                break
+        return b"".join( parts )
     def tell( self ):
         return bgzf_tell( self.bgzf )
     def seek( self, int64_t pos, int where=0 ):
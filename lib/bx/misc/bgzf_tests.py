@@ -6,3 +6,16 @@ def test_bgzf():
     assert f.read(10) == b"begin 644 "
     f.seek(0)
     assert f.read(10) == b"begin 644 "
+
+
+def test_readline():
+    f = bx.misc.bgzf.BGZFFile("test_data/bgzf_tests/test.txt.gz", "r")
+    with open("test_data/bgzf_tests/test.txt", "rb") as plain:
+        lines = plain.readlines()
+    offsets = []
+    for line in lines:
+        offsets.append(f.tell())
+        assert f.readline() == line
+    assert f.readline() == b""
+    f.seek(offsets[5])
+    assert f.readline() == lines[5]
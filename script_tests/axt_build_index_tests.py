@@ -0,0 +1,21 @@
+import unittest
+
+import base
+
+
+class Test1(base.BaseScriptTest, unittest.TestCase):
+    command_line = "./scripts/axt_build_index.py -1 mm8 -2 oryCun1 -l ${lengths} ${axt} ${axt_index}"
+    input_lengths = base.TestFile(filename="./test_data/axt_tests/oryCun1.sizes")
+    input_axt = base.TestFile(filename="./test_data/axt_tests/mm8_oryCun1_tiny.axt")
+    output_axt_index = base.TestFile(filename="./test_data/axt_tests/mm8_oryCun1_tiny.axt.index")
+
+
+class Test2(base.BaseScriptTest, unittest.TestCase):
+    command_line = "./scripts/axt_build_index.py -p 2 -1 mm8 -2 oryCun1 -l ${lengths} ${axt} ${axt_index}"
+    input_lengths = base.TestFile(filename="./test_data/axt_tests/oryCun1.sizes")
+    input_axt = base.TestFile(filename="./test_data/axt_tests/mm8_oryCun1_tiny.axt")
+    output_axt_index = base.TestFile(filename="./test_data/axt_tests/mm8_oryCun1_tiny.axt.index")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -41,5 +41,10 @@ class Test7(base.BaseScriptTest, unittest.TestCase):
     output_stdout = base.TestFile(filename="./test_data/epo_tests/hg19_one_peak.mapped.bed")
 
 
+class Test8(base.BaseScriptTest, unittest.TestCase):
+    command_line = "./scripts/bnMapper.py -p2 -fBED12 ./test_data/epo_tests/hpeaks.bed ./test_data/epo_tests/epo_547_hs_mm_12way_mammals_65.chain"
+    output_stdout = base.TestFile(filename="./test_data/epo_tests/hpeaks.mapped.bed12")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,13 @@
+import unittest
+
+import base
+
+
+class Test1(base.BaseScriptTest, unittest.TestCase):
+    command_line = "./scripts/chain_build_index.py ${chain} ${chain_index}"
+    input_chain = base.TestFile(filename="./test_data/epo_tests/epo_547_hs_mm_12way_mammals_65.chain")
+    output_chain_index = base.TestFile(filename="./test_data/epo_tests/epo_547_hs_mm_12way_mammals_65.chain.index")
+
+
+if __name__ == "__main__":
+    unittest.main()
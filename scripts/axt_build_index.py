@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""
+Build an index file for the blocks of an AXT pairwise alignment file, for use
+with `bx.align.axt.Indexed`. Blocks are indexed by the position of both
+components. Files ending in ".gz" must be BGZF compressed (as written by
+bgzip).
+
+If index_file is not provided axt_file.index is used.
+
+usage: %prog axt_file [index_file]
+    -1, --species1=name: name of the first species (default species1)
+    -2, --species2=name: name of the second species (default species2)
+    -l, --lengths=file: chromosome lengths of the second species, without them its minus strand blocks are not indexed
+    -p, --processes=N: scan an uncompressed file in N pieces in parallel
+"""
+
+from bx.align import axt
+from bx.cookbook import doc_optparse
+
+
+def main():
+    options, args = doc_optparse.parse(__doc__)
+
+    try:
+        axt_file = args[0]
+        # Determine the name of the index file
+        if len(args) > 1:
+            index_file = args[1]
+        else:
+            index_file = axt_file + ".index"
+        species1 = options.species1 or "species1"
+        species2 = options.species2 or "species2"
+        species_to_lengths = None
+        if options.lengths:
+            species_to_lengths = {species2: read_lengths(options.lengths)}
+        processes = int(options.processes or 1)
+    except Exception:
+        doc_optparse.exception()
+
+    indexes = axt.build_index(axt_file, species1, species2, species_to_lengths, processes=processes)
+
+    with open(index_file, "wb") as out:
+        indexes.write(out)
+
+
+def read_lengths(filename):
+    chrom_to_length = {}
+    with open(filename) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            chrom_to_length[fields[0]] = int(fields[1])
+    return chrom_to_length
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,7 @@ usage: %prog bed1 bed2
 
 import sys
 
-from bx.intervals import (
-    Intersecter,
-    Interval,
-)
+from bx.intervals.static_tree import StaticIntervalTree
 
 bed1, bed2 = sys.argv[1:3]
 
@@ -21,15 +18,30 @@ for line in open(bed2):
     start = int(fields[1])
     end = int(fields[2])
     if chrom not in ranges:
-        ranges[chrom] = Intersecter()
-    ranges[chrom].add_interval(Interval(start, end))
+        ranges[chrom] = ([], [])
+    ranges[chrom][0].append(start)
+    ranges[chrom][1].append(end)
+trees = {chrom: StaticIntervalTree(starts, ends) for chrom, (starts, ends) in ranges.items()}
 
+# Gather the queries for each chromosome so they can be counted in one call
+lines = []
+queries = {}
 for line in open(bed1):
     fields = line.strip().split()
     chrom, start, end = fields[0], int(fields[1]), int(fields[2])
     other = " ".join(fields[3:])
-    out = " ".join(fields[:3] + [other])
-    if chrom in ranges:
-        print(out, len(ranges[chrom].find(start, end)))
-    else:
-        print(out, 0)
+    lines.append(" ".join(fields[:3] + [other]))
+    if chrom in trees:
+        if chrom not in queries:
+            queries[chrom] = ([], [], [])
+        queries[chrom][0].append(len(lines) - 1)
+        queries[chrom][1].append(start)
+        queries[chrom][2].append(end)
+
+counts = [0] * len(lines)
+for chrom, (indexes, starts, ends) in queries.items():
+    for i, count in zip(indexes, trees[chrom].count_many(starts, ends).tolist()):
+        counts[i] = count
+
+for out, count in zip(lines, counts):
+    print(out, count)
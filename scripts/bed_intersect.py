@@ -12,12 +12,18 @@ usage: %prog bed_file_1 bed_file_2
     -d, --downstream_pad=N: downstream interval padding (default 0bp)
     -v, --reverse: Print regions that DO NOT overlap
     -b, --booleans: Just print '1' if interval overlaps or '0' otherwise
+    -s, --sorted: Inputs are sorted by chrom and start (LC_ALL=C sort -k1,1 -k2,2n), stream them
 """
 
 from warnings import warn
 
 from bx.bitset_builders import binned_bitsets_from_file
 from bx.cookbook import doc_optparse
+from bx.intervals.operations.sweep import (
+    bed_intervals,
+    ChromCoverage,
+    SortedStream,
+)
 
 mincols = 1
 upstream_pad = 0
@@ -33,15 +39,31 @@ try:
         downstream_pad = int(options.downstream_pad)
     reverse = bool(options.reverse)
     booleans = bool(options.booleans)
+    sorted_input = bool(options.sorted)
     in_fname, in2_fname = args
 except Exception:
     doc_optparse.exit()
 
-# Read first bed into some bitsets
 
-bitsets = binned_bitsets_from_file(open(in2_fname))
+def overlaps_bitsets(chrom, start, end):
+    return chrom in bitsets and bitsets[chrom].count_range(start, end - start) >= mincols
 
-# Read second BED and intersect
+
+def overlaps_sorted(chrom, start, end):
+    chrom_coverage = coverage.get(chrom, start)
+    return chrom_coverage is not None and chrom_coverage.count(start, end) >= mincols
+
+
+if sorted_input:
+    # Sweep along the second bed, keeping only the regions that can still overlap
+    coverage = ChromCoverage([SortedStream(bed_intervals(open(in2_fname)), in2_fname)], lambda runs: runs[0])
+    overlaps = overlaps_sorted
+else:
+    # Read second bed into some bitsets
+    bitsets = binned_bitsets_from_file(open(in2_fname))
+    overlaps = overlaps_bitsets
+
+# Read first BED and intersect
 
 for line in open(in_fname):
     if line.startswith("#") or line.isspace():
@@ -50,7 +72,7 @@ for line in open(in_fname):
     start, end = int(fields[1]), int(fields[2])
     if start > end:
         warn("Bed interval start after end!")
-    if fields[0] in bitsets and bitsets[fields[0]].count_range(start, end - start) >= mincols:
+    if overlaps(fields[0], start, end):
         if booleans:
             if reverse:
                 print(0)
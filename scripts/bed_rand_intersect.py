@@ -21,14 +21,10 @@ import sys
 from numpy import zeros
 
 from bx.bitset import BitSet
-from bx.intervals.random_intervals import throw_random_bits
-from bx_extras import stats
-
-maxtries = 10
-
-
-class MaxtriesException(Exception):
-    pass
+from bx.intervals.random_intervals import (
+    mask_regions,
+    random_overlaps,
+)
 
 
 def bit_clone(bits):
@@ -40,20 +36,6 @@ def bit_clone(bits):
     return new
 
 
-def throw_random(lengths, mask):
-    """
-    Try multiple times to run 'throw_random'
-    """
-    saved = None
-    for i in range(maxtries):
-        try:
-            return throw_random_bits(lengths, mask)
-        except MaxtriesException as e:
-            saved = e
-            continue
-    raise saved
-
-
 def as_bits(region_start, region_length, intervals):
     """
     Convert a set of intervals overlapping a region of a chromosome into
@@ -66,16 +48,24 @@ def as_bits(region_start, region_length, intervals):
     return bits
 
 
-def interval_lengths(bits):
+def runs(bits):
     """
-    Get the length distribution of all contiguous runs of set bits from
+    Get all contiguous runs of set bits as (start, end) pairs
     """
     end = 0
-    while True:
+    while end < bits.size:
         start = bits.next_set(end)
         if start == bits.size:
             break
         end = bits.next_clear(start)
+        yield start, end
+
+
+def interval_lengths(bits):
+    """
+    Get the length distribution of all contiguous runs of set bits from
+    """
+    for start, end in runs(bits):
         yield end - start
 
 
@@ -134,6 +124,8 @@ def main():
         bits1.iand(bits_not_masked)
         # Sanity checks
         assert count_overlap(bits1, bits_mask) == 0
+        regions = mask_regions(bits_mask)
+        targets = list(runs(bits1))
         # For each data set
         for featnum, intervals2_fname in enumerate(intervals2_fnames):
             print(intervals2_fname, file=sys.stderr)
@@ -147,23 +139,18 @@ def main():
             # Sample
             lengths2 = list(interval_lengths(bits2))
             total_lengths2[featnum] += sum(lengths2)
-            for i in range(nsamples):
-                # Build randomly covered bitmask for second set
-                random2 = throw_random(lengths2, bits_mask)
-                # Find intersection
-                random2 &= bits1
-                # Print amount intersecting
-                total_samples[i, featnum] += random2.count_range(0, random2.size)
-                print(total_samples[i, featnum], file=sys.stderr)
+            # Overlap of randomly placed intervals of the same lengths, all
+            # samples at once
+            total_samples[:, featnum] += random_overlaps(lengths2, regions, targets, nsamples, processes=None)
     fraction_overlap = total_samples / total_lengths2
     print("\t".join(intervals2_fnames))
     print("\t".join(map(str, total_actual / total_lengths2)))
     for row in fraction_overlap:
         print("\t".join(map(str, row)))
-    print(
-        f"observed overlap: {total_actual}, sample mean: {stats.amean(total_samples)}, sample stdev: {stats.asamplestdev(total_samples)}"
-    )
-    print("z-score:", (total_actual - stats.amean(total_samples)) / stats.asamplestdev(total_samples))
+    sample_mean = total_samples.mean(axis=0)
+    sample_stdev = total_samples.std(axis=0, ddof=1)
+    print(f"observed overlap: {total_actual}, sample mean: {sample_mean}, sample stdev: {sample_stdev}")
+    print("z-score:", (total_actual - sample_mean) / sample_stdev)
     print("percentile:", sum(total_actual > total_samples) / nsamples)
 
 
@@ -5,10 +5,17 @@ Find continuous regions that are covered by the first bed file (`bed_file_1`)
 but not by the second bed file (`bed_file_2`)
 
 usage: %prog bed_file_1 bed_file_2
+    -s, --sorted: Inputs are sorted by chrom and start (LC_ALL=C sort -k1,1 -k2,2n), stream them
 """
 
 from bx.bitset_builders import binned_bitsets_from_file
 from bx.cookbook import doc_optparse
+from bx.intervals.operations.sweep import (
+    bed_intervals,
+    ChromCoverage,
+    merge_runs,
+    SortedStream,
+)
 
 
 def print_bits_as_bed(bits):
@@ -27,17 +34,25 @@ try:
 except ValueError:
     doc_optparse.exit()
 
-# Read first bed into some bitsets
-
-bitsets1 = binned_bitsets_from_file(open(in_fname))
-bitsets2 = binned_bitsets_from_file(open(in2_fname))
-
-for chrom in bitsets1:
-    if chrom not in bitsets1:
-        continue
-    bits1 = bitsets1[chrom]
-    if chrom in bitsets2:
-        bits2 = bitsets2[chrom]
-        bits2.invert()
-        bits1.iand(bits2)
-    print_bits_as_bed(bits1)
+if options.sorted:
+    # Sweep along both beds, printing the gaps the second leaves in the runs of the first
+    coverage = ChromCoverage([SortedStream(bed_intervals(open(in2_fname)), in2_fname)], lambda runs: runs[0])
+    for chrom, run_start, run_end in merge_runs(SortedStream(bed_intervals(open(in_fname)), in_fname)):
+        chrom_coverage = coverage.get(chrom, run_start)
+        gaps = [(run_start, run_end)] if chrom_coverage is None else chrom_coverage.gaps(run_start, run_end)
+        for start, end in gaps:
+            print(f"{chrom}\t{start}\t{end}")
+else:
+    # Read first bed into some bitsets
+    bitsets1 = binned_bitsets_from_file(open(in_fname))
+    bitsets2 = binned_bitsets_from_file(open(in2_fname))
+
+    for chrom in bitsets1:
+        if chrom not in bitsets1:
+            continue
+        bits1 = bitsets1[chrom]
+        if chrom in bitsets2:
+            bits2 = bitsets2[chrom]
+            bits2.invert()
+            bits1.iand(bits2)
+        print_bits_as_bed(bits1)
@@ -9,23 +9,13 @@ span multiple chains or multiple chromosomes are silently filtered out. TODO:
 
 import argparse
 import logging
+import multiprocessing
 import os
-import sys
-from functools import reduce
-from itertools import groupby
-from operator import (
-    attrgetter,
-    itemgetter,
-)
+from io import StringIO
 
 import numpy as np
 
 from bx.align import epo
-from bx.align.epo import bed_union as elem_u  # type: ignore[attr-defined]
-from bx.intervals.intersection import (
-    Interval,
-    IntervalTree,
-)
 
 elem_t = np.dtype([("chrom", np.str_, 30), ("start", np.int64), ("end", np.int64), ("id", np.str_, 100)])
 narrowPeak_t = np.dtype(
@@ -48,264 +38,143 @@ logging.basicConfig()
 log = logging.getLogger()
 
 
-class GIntervalTree(IntervalTree):
-    """a set of IntervalTrees that is indexed by chromosomes"""
-
-    def __init__(self):
-        self._trees = {}
-
-    def add(self, chrom, element):
-        """insert an element. use this method as the IntervalTree one.
-        this will simply call the IntervalTree.add method on the right tree
-
-        :param chrom: chromosome
-        :param element: the argument of IntervalTree.insert_interval
-        :return: None
-        """
-
-        self._trees.setdefault(chrom, IntervalTree()).insert_interval(element)
-
-    def find(self, chrom, start, end):
-        """find the intersecting elements
-
-        :param chrom: chromosome
-        :param start: start
-        :param end: end
-        :return: a list of intersecting elements"""
-
-        tree = self._trees.get(chrom, None)
-        if tree:
-            return tree.find(start, end)
-        # return always a list
-        return []
-
-
-def transform(elem, chain_CT_CQ, max_gap):
-    """transform the coordinates of this elem into the other species.
-
-    elem intersects this chain's ginterval.
-    :return: a list of the type [(to_chr, start, end, elem[id]) ... ]"""
-    chain, CT, CQ = chain_CT_CQ
-    start, end = max(elem["start"], chain.tStart) - chain.tStart, min(elem["end"], chain.tEnd) - chain.tStart
-
-    assert np.all((CT[:, 1] - CT[:, 0]) == (CQ[:, 1] - CQ[:, 0]))
-    to_chrom = chain.qName
-    to_gab_start = chain.qStart
-
-    start_idx = np.where(CT[:, 1] > start)[0][0]
-    end_idx = np.where(CT[:, 0] < end)[0][-1]
-
-    if start_idx > end_idx:  # maps to a gap region on the other species
-        return []
-
-    # apply the gap threshold
-    if max_gap >= 0 and start_idx < end_idx - 1:
-        if (
-            np.max(CT[(start_idx + 1) : end_idx, 0] - CT[start_idx : (end_idx - 1), 1]) > max_gap
-            or np.max(CQ[(start_idx + 1) : end_idx, 0] - CQ[start_idx : (end_idx - 1), 1]) > max_gap
-        ):
-            return []
-
-    assert start < CT[start_idx, 1]
-    assert CT[end_idx, 0] < end
-    to_start = CQ[start_idx, 0] + max(0, start - CT[start_idx, 0])  # correct if on middle of interval
-    to_end = CQ[end_idx, 1] - max(0, CT[end_idx, 1] - end)  # idem
-
-    if start_idx == end_idx:  # elem falls in a single run of matches
-        slices = [(to_start, to_end)]
-    else:
-        slices = [(to_start, CQ[start_idx, 1])]
-        slices += [(CQ[i, 0], CQ[i, 1]) for i in range(start_idx + 1, end_idx)]
-        slices.append((CQ[end_idx, 0], to_end))
-    if chain.qStrand == "-":
-        Sz = chain.qEnd - chain.qStart
-        slices = [(Sz - t[1], Sz - t[0]) for t in slices]
-    return [(to_chrom, to_gab_start + t[0], to_gab_start + t[1], elem["id"]) for t in slices]
-
-
-def union_elements(elements):
-    """elements = [(chr, s, e, id), ...], this is to join elements that have a
-    deletion in the 'to' species
-    """
-
-    if len(elements) < 2:
-        return elements
-    assert {e[3] for e in elements} == {elements[0][3]}, "more than one id"
-    el_id = elements[0][3]
-
-    unioned_elements = []
-    for ch, chgrp in groupby(elements, key=itemgetter(0)):
-        for s, e in elem_u(np.array([itemgetter(1, 2)(_) for _ in chgrp], dtype=np.uint)):
-            if s < e:
-                unioned_elements.append((ch, s, e, el_id))
-    assert len(unioned_elements) <= len(elements)
-    return unioned_elements
-
-
-def transform_by_chrom(all_epo, from_elem_list, tree, chrom, opt, out_fd):
+def transform_by_chrom(lift, from_elem_list, chrom, opt, out_fd):
     BED4_FRM = "%s\t%d\t%d\t%s\n"
     BED12_FRM = "%s\t%d\t%d\t%s\t1000\t+\t%d\t%d\t0,0,0\t%d\t%s\t%s\n"
     NPEAK_FRM = "%s\t%d\t%d\t%s\t%d\t%s\t%f\t%f\t%f\t%d\n"
     assert len(set(from_elem_list["chrom"])) <= 1
 
-    mapped_elem_count = 0
+    # Elements that span multiple chains are discarded, unless opt.keep_split
+    # is given, in which case the longest alignment is kept (liftOver-like
+    # behavior, added by Adam Diehl (adadiehl@umich.edu))
+    mapped = lift.map(
+        chrom,
+        from_elem_list["start"],
+        from_elem_list["end"],
+        max_gap=opt.gap,
+        keep_split=opt.keep_split,
+        threshold=opt.threshold,
+    )
     mapped_summit_count = 0
-    for from_elem in from_elem_list:
-        matching_block_ids = [attrgetter("value")(_) for _ in tree.find(chrom, from_elem["start"], from_elem["end"])]
-
-        # do the actual mapping
-        to_elem_slices = [_ for _ in (transform(from_elem, all_epo[i], opt.gap) for i in matching_block_ids) if _]
-        """ # Original version: silently discard split alignments
-        if len(to_elem_slices) > 1 or len(to_elem_slices) == 0:
-            log.debug("%s no match or in different chain/chromosomes" % (str(from_elem)))
-            continue
-        to_elem_slices = to_elem_slices[0]
-        """
-        """ Modified version below allows liftOver-like behavior of
-        keeping the longest alignment when alignments are split across
-        multiple chains. Added by Adam Diehl (adadiehl@umich.edu)
-        """
-        max_elem_idx = 0
-        if len(to_elem_slices) == 0:
-            log.debug("%s: no match in target: discarding.", from_elem)
-            continue
-        elif len(to_elem_slices) > 1 and opt.keep_split:
-            log.debug("%s spans multiple chains/chromosomes. Using longest alignment.", from_elem)
-            max_elem_len = 0
-            for i in range(len(to_elem_slices)):
-                elem_len = to_elem_slices[i][-1][2] - to_elem_slices[i][0][2]
-                if elem_len > max_elem_len:
-                    max_elem_len = elem_len
-                    max_elem_idx = i
-        elif len(to_elem_slices) > 1:
-            log.debug("%s spans multiple chains/chromosomes: discarding.", from_elem)
-            continue
-        to_elem_slices = to_elem_slices[max_elem_idx]
-        """ End AGD modifications """
-
-        # apply threshold
-        if (from_elem[2] - from_elem[1]) * opt.threshold > reduce(lambda b, a: a[2] - a[1] + b, to_elem_slices, 0):
-            log.debug("%s did not pass threshold", from_elem)
-            continue
-
-        # if to_species had insertions you can join elements
-        to_elem_list = sorted(union_elements(to_elem_slices), key=lambda a: a[1])
-        if to_elem_list:
-            mapped_elem_count += 1
-            log.debug("\tjoined to %d elements", len(to_elem_list))
-            start = to_elem_list[0][1]
-            end = to_elem_list[-1][2]
-            if opt.format == "BED4":
-                for tel in to_elem_list:
-                    out_fd.write(BED4_FRM % tel)
-            elif opt.format == "BED12":
-                out_fd.write(
-                    BED12_FRM
-                    % (
-                        to_elem_list[0][0],
-                        start,
-                        end,
-                        from_elem["id"],
-                        start,
-                        end,
-                        len(to_elem_list),
-                        ",".join(f"{e[2] - e[1]}" for e in to_elem_list),
-                        ",".join(f"{e[1] - start}" for e in to_elem_list),
-                    )
+    if opt.format == "narrowPeak" and opt.in_format == "narrowPeak":
+        # Map the peak location
+        _, peaks = lift.map_points(chrom, from_elem_list["peak"][mapped.index])
+    for i, elem_idx in enumerate(mapped.index):
+        from_elem = from_elem_list[elem_idx]
+        to_chrom = mapped.chroms[i]
+        starts = mapped.starts[mapped.offsets[i] : mapped.offsets[i + 1]]
+        ends = mapped.ends[mapped.offsets[i] : mapped.offsets[i + 1]]
+        start = starts[0]
+        end = ends[-1]
+        if opt.format == "BED4":
+            for s, e in zip(starts, ends):
+                out_fd.write(BED4_FRM % (to_chrom, s, e, from_elem["id"]))
+        elif opt.format == "BED12":
+            out_fd.write(
+                BED12_FRM
+                % (
+                    to_chrom,
+                    start,
+                    end,
+                    from_elem["id"],
+                    start,
+                    end,
+                    len(starts),
+                    ",".join(f"{e - s}" for s, e in zip(starts, ends)),
+                    ",".join(f"{s - start}" for s in starts),
                 )
-            else:
-                # narrowPeak convention is to report the peak location relative to start
-                peak = int((start + end) / 2) - start
-                if opt.in_format == "narrowPeak":
-                    # Map the peak location
-                    # sys.stderr.write("{}\n".format(from_elem))
-                    matching_block_ids = [
-                        attrgetter("value")(_) for _ in tree.find(chrom, from_elem["peak"], from_elem["peak"])
-                    ]
-                    p_elem_slices = [
-                        _
-                        for _ in (
-                            transform(
-                                np.array((chrom, from_elem["peak"], from_elem["peak"], "."), dtype=elem_t),
-                                all_epo[i],
-                                opt.gap,
-                            )
-                            for i in matching_block_ids
-                        )
-                        if _
-                    ]
-                    if len(p_elem_slices) >= 1:
-                        mapped_summit_count += 1
-                        sys.stderr.write(f"{p_elem_slices}\n")
-                        # Make sure the peak is between the start and end positions
-                        if p_elem_slices[0][0][1] >= start and p_elem_slices[0][0][1] <= end:
-                            peak = p_elem_slices[0][0][1] - start
-                        else:
-                            mapped_summit_count -= 1
-                            log.debug(
-                                "Warning: elem %s summit mapped location falls outside the mapped element start and end. Using the mapped elem midpoint instead.",
-                                from_elem,
-                            )
-
-                    else:
-                        log.debug(
-                            "Warning: elem %s summit maps to a gap region in the target alignment. Using the mapped elem midpoint instead.",
-                            from_elem,
-                        )
-                out_fd.write(
-                    NPEAK_FRM
-                    % (
-                        to_elem_list[0][0],
-                        start,
-                        end,
-                        from_elem["id"],
-                        from_elem["score"],
-                        from_elem["strand"],
-                        from_elem["signalValue"],
-                        from_elem["pValue"],
-                        from_elem["qValue"],
-                        peak,
+            )
+        else:
+            # narrowPeak convention is to report the peak location relative to start
+            peak = int((start + end) / 2) - start
+            if opt.in_format == "narrowPeak":
+                if peaks[i] < 0:
+                    log.debug(
+                        "Warning: elem %s summit maps to a gap region in the target alignment. Using the mapped elem midpoint instead.",
+                        from_elem,
                     )
+                elif start <= peaks[i] <= end:
+                    # Make sure the peak is between the start and end positions
+                    mapped_summit_count += 1
+                    peak = peaks[i] - start
+                else:
+                    log.debug(
+                        "Warning: elem %s summit mapped location falls outside the mapped element start and end. Using the mapped elem midpoint instead.",
+                        from_elem,
+                    )
+            out_fd.write(
+                NPEAK_FRM
+                % (
+                    to_chrom,
+                    start,
+                    end,
+                    from_elem["id"],
+                    from_elem["score"],
+                    from_elem["strand"],
+                    from_elem["signalValue"],
+                    from_elem["pValue"],
+                    from_elem["qValue"],
+                    peak,
                 )
-    log.info("%s: %d of %d elements mapped", chrom, mapped_elem_count, from_elem_list.shape[0])
+            )
+    log.info("%s: %d of %d elements mapped", chrom, len(mapped), from_elem_list.shape[0])
     if opt.format == "narrowPeak" and opt.in_format == "narrowPeak":
-        log.info("%s: %d peak summits from %d mapped elements mapped", chrom, mapped_summit_count, mapped_elem_count)
+        log.info("%s: %d peak summits from %d mapped elements mapped", chrom, mapped_summit_count, len(mapped))
+
+
+# chains used by worker processes, see init_worker
+WORKER_LIFT = None
+
+
+def init_worker(lift, path):
+    """set the chains of a worker process. With the fork start method `lift`
+    is inherited from the parent, otherwise chains are loaded again from
+    `path` (which memory maps the chain cache written by the parent)"""
 
+    global WORKER_LIFT
+    WORKER_LIFT = lift if lift is not None else loadChains(path)
 
-def transform_file(ELEMS, ofname, EPO, TREE, opt):
-    "transform/map the elements of this file and dump the output on 'ofname'"
+
+def transform_chrom(task):
+    "map the elements of one chromosome in a worker process, return the output text"
+
+    chrom, elems, opt = task
+    out_fd = StringIO()
+    transform_by_chrom(WORKER_LIFT, elems, chrom, opt, out_fd)
+    return out_fd.getvalue()
+
+
+def transform_file(ELEMS, ofname, lift, opt, pool=None):
+    """transform/map the elements of this file and dump the output on 'ofname'.
+    If a `pool` of workers (see init_worker) is given, chromosomes are mapped in parallel"""
 
     BED4_FRM = "%s\t%d\t%d\t%s\n"
     log.info("%s (%d) elements ...", opt.screen and "screening" or "transforming", ELEMS.shape[0])
     with open(ofname, "w") as out_fd:
         if opt.screen:
-            for elem in ELEMS.flat:
-                matching_blocks = [attrgetter("value")(_) for _ in TREE.find(elem["chrom"], elem["start"], elem["end"])]
-                assert set(matching_blocks) <= set(EPO.keys())
-                if matching_blocks:
-                    out_fd.write(BED4_FRM % elem)
+            matching = np.zeros(ELEMS.shape[0], dtype=bool)
+            for chrom in set(ELEMS["chrom"]):
+                on_chrom = ELEMS["chrom"] == chrom
+                matching[on_chrom] = lift.overlaps(chrom, ELEMS["start"][on_chrom], ELEMS["end"][on_chrom]) > 0
+            for elem in ELEMS[matching]:
+                out_fd.write(BED4_FRM % tuple(elem)[:4])
+        elif pool is not None:
+            tasks = ((chrom, ELEMS[ELEMS["chrom"] == chrom], opt) for chrom in set(ELEMS["chrom"]))
+            # imap hands results back in the order of the tasks
+            for text in pool.imap(transform_chrom, tasks):
+                out_fd.write(text)
         else:
             for chrom in set(ELEMS["chrom"]):
-                transform_by_chrom(EPO, ELEMS[ELEMS["chrom"] == chrom], TREE, chrom, opt, out_fd)
+                transform_by_chrom(lift, ELEMS[ELEMS["chrom"] == chrom], chrom, opt, out_fd)
     log.info("DONE!")
 
 
 def loadChains(path):
     "name says it."
 
-    EPO = epo.Chain._parse_file(path, True)
-    # convert coordinates w.r.t the forward strand (into slices)
-    # compute cummulative intervals
-    for i in range(len(EPO)):
-        ch, S, T, Q = EPO[i]
-        if ch.tStrand == "-":
-            ch = ch._replace(tEnd=ch.tSize - ch.tStart, tStart=ch.tSize - ch.tEnd)
-        if ch.qStrand == "-":
-            ch = ch._replace(qEnd=ch.qSize - ch.qStart, qStart=ch.qSize - ch.qEnd)
-        EPO[i] = (ch, epo.cummulative_intervals(S, T), epo.cummulative_intervals(S, Q))
-    # now each element of epo is (chain_header, target_intervals, query_intervals)
-    assert all(t[0].tStrand == "+" for t in EPO), "all target strands should be +"
-    return EPO
+    # chains are keyed by id, as the last chain with a given id wins
+    chains = {ch[0].id: ch for ch in epo.Chain._parse_file(path, True)}
+    return epo.LiftOver(chains.values())
 
 
 def loadFeatures(path, opt):
@@ -354,7 +223,7 @@ if __name__ == "__main__":
         nargs="+",
         help="Input to process. If more than a file is specified, all files will be mapped and placed on --output, which should be a directory.",
     )
-    parser.add_argument("alignment", help="Alignment file (.chain or .pkl)")
+    parser.add_argument("alignment", help="Alignment file (.chain, .chain.bin or .pkl)")
 
     parser.add_argument(
         "-f",
@@ -400,6 +269,14 @@ if __name__ == "__main__":
         help="If elements span multiple chains, report the segment with the longest overlap instead of silently dropping them. (This is the default behavior for liftOver.)",
     )
     parser.add_argument("-i", "--in_format", choices=["BED", "narrowPeak"], default="BED", help="Input file format.")
+    parser.add_argument(
+        "-p",
+        "--processes",
+        metavar="N",
+        type=int,
+        default=1,
+        help="Map chromosomes in parallel on this many processes. Output is the same as with a single process.",
+    )
 
     opt = parser.parse_args()
     log.setLevel(LOG_LEVELS[opt.verbose])
@@ -409,15 +286,17 @@ if __name__ == "__main__":
         parser.error("For multiple inputs, output is mandatory and should be a dir.")
 
     # loading alignments from opt.alignment
-    EPO = {ch[0].id: ch for ch in loadChains(opt.alignment)}
-
-    # create an interval tree based on chain headers (from_species side)
-    # for fast feature-to-chain_header searching
-    log.info("indexing %d chains ...", len(EPO))
-    TREE = GIntervalTree()
-    for gabid in EPO:
-        chain, t, q = EPO[gabid]
-        TREE.add(chain.tName, Interval(chain.tStart, chain.tEnd, chain.id))
+    LIFT = loadChains(opt.alignment)
+    log.info("indexed %d chains ...", len(LIFT))
+
+    pool = None
+    if opt.processes > 1 and not opt.screen:
+        # workers share the chains of this process when they can be forked
+        if "fork" in multiprocessing.get_all_start_methods():
+            context, initargs = multiprocessing.get_context("fork"), (LIFT, None)
+        else:
+            context, initargs = multiprocessing.get_context("spawn"), (None, opt.alignment)
+        pool = context.Pool(opt.processes, initializer=init_worker, initargs=initargs)
 
     # transform elements
     if len(opt.input) > 1:
@@ -428,6 +307,10 @@ if __name__ == "__main__":
             outpath = os.path.join(opt.output, os.path.basename(inpath))
             if os.path.isfile(outpath):
                 log.warning("overwriting %s ...", outpath)
-            transform_file(loadFeatures(inpath, opt), outpath, EPO, TREE, opt)
+            transform_file(loadFeatures(inpath, opt), outpath, LIFT, opt, pool)
     else:
-        transform_file(loadFeatures(opt.input[0], opt), opt.output, EPO, TREE, opt)
+        transform_file(loadFeatures(opt.input[0], opt), opt.output, LIFT, opt, pool)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
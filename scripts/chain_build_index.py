@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+Build an index file for the chains of a chain alignment file, for use with
+`bx.align.epo.IndexedChainFile`. Chains are indexed by their target range and
+by their query range.
+
+If index_file is not provided chain_file.index is used.
+
+usage: %prog chain_file [index_file]
+"""
+
+import os.path
+
+from bx.align import epo
+from bx.cookbook import doc_optparse
+from bx.misc.seekbzip2 import SeekableBzip2File
+from bx.misc.seeklzop import SeekableLzopFile
+
+
+def main():
+    options, args = doc_optparse.parse(__doc__)
+
+    try:
+        chain_file = args[0]
+        # If it appears to be a bz2 file, attempt to open with table
+        if chain_file.endswith(".bz2"):
+            table_file = chain_file + "t"
+            if not os.path.exists(table_file):
+                doc_optparse.exit("To index bz2 compressed files first create a bz2t file with bzip-table.")
+            chain_in = SeekableBzip2File(chain_file, table_file)
+            # Strip .bz2 from the filename before adding ".index"
+            chain_file = chain_file[:-4]
+        elif chain_file.endswith(".lzo"):
+            table_file = chain_file + "t"
+            if not os.path.exists(table_file):
+                doc_optparse.exit(
+                    "To index lzo compressed files first create a lzot file with lzop_build_offset_table."
+                )
+            chain_in = SeekableLzopFile(chain_file, table_file)
+            # Strip .lzo from the filename before adding ".index"
+            chain_file = chain_file[:-4]
+        elif chain_file.endswith(".gz"):
+            doc_optparse.exit("gzip compressed chain files can not be indexed, uncompress them first.")
+        else:
+            chain_in = open(chain_file, "rb")
+        # Determine the name of the index file
+        if len(args) > 1:
+            index_file = args[1]
+        else:
+            index_file = chain_file + ".index"
+    except Exception:
+        doc_optparse.exception()
+
+    indexes = epo.build_chain_index(chain_in)
+    chain_in.close()
+
+    with open(index_file, "wb") as out:
+        indexes.write(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,31 +12,37 @@ usage: %prog bed1 bed2 > out
 
 import sys
 
-from bx import (
-    intervals,
-    misc,
-)
+import numpy
+
+from bx import misc
+from bx.intervals.static_tree import StaticIntervalTree
 
 
 def main():
-    intersecters = {}
+    ranges = {}
 
     # Read ranges
 
     for chr, start, end in read_intervals(misc.open_compressed(sys.argv[1])):
-        if chr not in intersecters:
-            intersecters[chr] = intervals.Intersecter()
-        intersecters[chr].add_interval(intervals.Interval(start, end))
-
-    # Count intersection
+        if chr not in ranges:
+            ranges[chr] = ([], [])
+        ranges[chr][0].append(start)
+        ranges[chr][1].append(end)
+    intersecters = {chr: StaticIntervalTree(starts, ends) for chr, (starts, ends) in ranges.items()}
 
-    total = 0
+    # Count intersection, all queries for a chromosome at once
 
+    queries = {}
     for chr, start, end in read_intervals(misc.open_compressed(sys.argv[2])):
         if chr in intersecters:
-            intersection = intersecters[chr].find(start, end)
-            if intersection:
-                total += 1
+            if chr not in queries:
+                queries[chr] = ([], [])
+            queries[chr][0].append(start)
+            queries[chr][1].append(end)
+
+    total = 0
+    for chr, (starts, ends) in queries.items():
+        total += int(numpy.count_nonzero(intersecters[chr].count_many(starts, ends)))
 
     print(total)
 
@@ -9,18 +9,26 @@ usage: %prog bed1 bed2
 
 import sys
 
-import bx.intervals.intersection
 import bx.intervals.io
+from bx.intervals.static_tree import StaticIntervalTree
 
 
 def main():
-    intersecters = {}
+    intervals = {}
 
-    # Read second set into intersecter
+    # Read second set into intersecters, built in one go per chromosome
     for interval in bx.intervals.io.GenomicIntervalReader(open(sys.argv[2])):
-        if interval.chrom not in intersecters:
-            intersecters[interval.chrom] = bx.intervals.Intersecter()
-        intersecters[interval.chrom].add_interval(interval)
+        if interval.chrom not in intervals:
+            intervals[interval.chrom] = []
+        intervals[interval.chrom].append(interval)
+    intersecters = {
+        chrom: StaticIntervalTree(
+            [interval.start for interval in chrom_intervals],
+            [interval.end for interval in chrom_intervals],
+            chrom_intervals,
+        )
+        for chrom, chrom_intervals in intervals.items()
+    }
 
     # Join with first set
     for interval in bx.intervals.io.GenomicIntervalReader(open(sys.argv[1])):
@@ -37,7 +37,7 @@ def __main__():
         expr = compile(expr, "<expr arg>", "eval")
 
     maf_reader = maf.Reader(sys.stdin, parse_e_rows=True)
-    maf_writer = maf.Writer(sys.stdout)
+    maf_writer = maf.BufferedWriter(sys.stdout)
 
     for m in maf_reader:
         if component_count and len(m.components) != component_count:
@@ -49,6 +49,8 @@ def __main__():
 
         maf_writer.write(m)
 
+    maf_writer.flush()
+
 
 if __name__ == "__main__":
     __main__()
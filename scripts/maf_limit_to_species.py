@@ -17,7 +17,7 @@ def main():
     species = sys.argv[1].split(",")
 
     maf_reader = bx.align.maf.Reader(sys.stdin, parse_e_rows=True)
-    maf_writer = bx.align.maf.Writer(sys.stdout)
+    maf_writer = bx.align.maf.BufferedWriter(sys.stdout)
 
     for m in maf_reader:
         new_components = []
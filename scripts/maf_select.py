@@ -23,7 +23,7 @@ def __main__():
     feature_vector = [int(line) for line in open(feature_file)]
 
     maf_reader = bx.align.maf.Reader(sys.stdin, parse_e_rows=True)
-    maf_writer = bx.align.maf.Writer(sys.stdout)
+    maf_writer = bx.align.maf.BufferedWriter(sys.stdout)
 
     index = 0
 
@@ -32,6 +32,8 @@ def __main__():
             maf_writer.write(m)
         index += 1
 
+    maf_writer.flush()
+
 
 if __name__ == "__main__":
     __main__()
@@ -14,7 +14,7 @@ import sys
 
 import bx.align.maf
 from bx.align.tools.fuse import FusingAlignmentWriter
-from bx.align.tools.thread import get_components_for_species
+from bx.align.tools.thread import thread
 from bx.cookbook import doc_optparse
 
 
@@ -36,13 +36,8 @@ def main():
     if fuse:
         maf_writer = FusingAlignmentWriter(maf_writer)
 
-    for m in maf_reader:
-        new_components = get_components_for_species(m, species)
-        if new_components:
-            m.components = new_components
-            m.score = 0.0
-            m.remove_all_gap_columns()
-            maf_writer.write(m)
+    for m in thread(maf_reader, species):
+        maf_writer.write(m)
 
     maf_reader.close()
     maf_writer.close()
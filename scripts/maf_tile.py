@@ -20,6 +20,7 @@ import sys
 import bx.align as align
 import bx.align.maf
 import bx.seq.nib
+from bx.align.tools import BlockWindow
 from bx.cookbook import doc_optparse
 
 tree_tx = str.maketrans("(),", "   ")
@@ -30,7 +31,7 @@ def main():
     try:
         sources = args[0].translate(tree_tx).split()
         seq_db = load_seq_db(args[1])
-        index = bx.align.maf.MultiIndexed(args[2:])
+        index = BlockWindow(bx.align.maf.MultiIndexed(args[2:]))
 
         out = bx.align.maf.Writer(sys.stdout)
         missing_data = bool(options.missingData)
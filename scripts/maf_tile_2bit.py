@@ -33,6 +33,7 @@ import bx.align as align
 import bx.align.maf as maf
 import bx.seq.nib
 import bx.seq.twobit
+from bx.align.tools import BlockWindow
 from bx.cookbook import doc_optparse
 
 tree_tx = str.maketrans("(),", "   ")
@@ -43,7 +44,7 @@ def main():
     try:
         sources = args[0].translate(tree_tx).split()
         ref_2bit = bx.seq.twobit.TwoBitFile(open(args[1], "rb"))
-        index = maf.MultiIndexed(args[2:])
+        index = BlockWindow(maf.MultiIndexed(args[2:]))
 
         out = maf.Writer(sys.stdout)
         missing_data = bool(options.missingData)
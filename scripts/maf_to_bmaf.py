@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Convert a MAF file to the binary MAF format (see `bx.align.bmaf`), and
+optionally build an index of the binary file at the same time.
+
+If index_file is not provided bmaf_file.index is used when indexing.
+
+usage: %prog maf_file bmaf_file [index_file]
+    -i, --index: also build an index for bmaf_file
+    -s, --species=a,b,c: only index the position of the block in the listed species
+"""
+
+from bx import interval_index_file
+from bx.align import bmaf
+from bx.cookbook import doc_optparse
+
+
+def main():
+    options, args = doc_optparse.parse(__doc__)
+
+    try:
+        maf_file = args[0]
+        bmaf_file = args[1]
+        if len(args) > 2:
+            index_file = args[2]
+            build_index = True
+        else:
+            index_file = bmaf_file + ".index"
+            build_index = bool(options.index)
+        if options.species:
+            species = options.species.split(",")
+        else:
+            species = None
+    except Exception:
+        doc_optparse.exception()
+
+    if build_index:
+        indexes = interval_index_file.Indexes()
+    else:
+        indexes = None
+
+    with open(maf_file) as maf_in, open(bmaf_file, "wb") as bmaf_out:
+        bmaf.convert(maf_in, bmaf_out, indexes=indexes, species=species)
+
+    if indexes is not None:
+        with open(index_file, "wb") as out:
+            indexes.write(out)
+
+
+if __name__ == "__main__":
+    main()
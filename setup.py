@@ -73,8 +73,13 @@ def get_extension_modules(numpy_include=None):
     )
     # Interval intersection
     extensions.append(Extension("bx.intervals.intersection", ["lib/bx/intervals/intersection.pyx"]))
+    extensions.append(Extension("bx.intervals.static_tree", ["lib/bx/intervals/static_tree.pyx"]))
     # Alignment object speedups
     extensions.append(Extension("bx.align._core", ["lib/bx/align/_core.pyx"]))
+    # AXT scanning speedups
+    extensions.append(Extension("bx.align._axt", ["lib/bx/align/_axt.pyx"], include_dirs=[numpy_include]))
+    # Binary MAF reading speedups
+    extensions.append(Extension("bx.align._bmaf", ["lib/bx/align/_bmaf.pyx"]))
     # NIB reading speedups
     extensions.append(Extension("bx.seq._nib", ["lib/bx/seq/_nib.pyx"]))
     # 2bit reading speedups